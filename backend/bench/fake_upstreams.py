@@ -0,0 +1,318 @@
+"""Local stand-ins for the upstream APIs server.py calls, for offline benchmarks.
+
+One app serves all three upstreams:
+
+    OpenAI           /v1/chat/completions (JSON + streaming), /v1/audio/transcriptions
+    USDA FDC         /fdc/v1/foods/search, /fdc/v1/food/{fdc_id}
+    Open Food Facts  /api/v2/product/{code}.json
+
+Point the backend at it with:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8012/v1
+    USDA_API_BASE_URL=http://127.0.0.1:8012/fdc/v1
+    OPENFOODFACTS_BASE_URL=http://127.0.0.1:8012
+
+Each upstream has its own latency/error profile (see --help), so slow-vision or
+rate-limited-provider scenarios can be reproduced without network access.
+
+    python bench/fake_upstreams.py --port 8012 --openai-latency-ms 900 --openai-error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+UPSTREAMS = ("openai", "usda", "off")
+
+# Mostly catalog-style names, plus a few odd ones so unknown-food validation gets exercised
+FOODS = [
+    ("Dal", 180), ("Rice", 150), ("Roti", 80), ("Paneer Butter Masala", 160), ("Chicken Curry", 200),
+    ("Idli", 120), ("Sambar", 150), ("Dosa", 100), ("Curd", 100), ("Poha", 150), ("Egg", 50),
+]
+ODD_FOODS = ["Grandma's Special Chutney", "Street Corner Chaat", "Mystery Kofta", "Leftover Pulao"]
+TRANSCRIPTS = [
+    "2 rotis and dal",
+    "one bowl of rice with sambar",
+    "I had 3 idlis and a cup of curd for breakfast",
+    "chicken curry with rice and a salad my friend made",
+]
+
+
+@dataclass
+class Profile:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+    async def delay(self, scale: float = 1.0) -> None:
+        ms = max(0.0, random.gauss(self.latency_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms)
+        if ms:
+            await asyncio.sleep(ms * scale / 1000)
+
+    def failure(self) -> JSONResponse | None:
+        if self.error_rate and random.random() < self.error_rate:
+            headers = {"retry-after": "1"} if self.error_status == 429 else {}
+            return JSONResponse(
+                {"error": {"message": "injected failure", "type": "bench_fault", "code": self.error_status}},
+                status_code=self.error_status,
+                headers=headers,
+            )
+        return None
+
+
+def _system_prompt(messages: List[Dict[str, Any]]) -> str:
+    for m in messages:
+        if m.get("role") == "system" and isinstance(m.get("content"), str):
+            return m["content"].lower()
+    return ""
+
+
+def _user_text(messages: List[Dict[str, Any]]) -> str:
+    for m in reversed(messages):
+        if m.get("role") != "user":
+            continue
+        content = m.get("content")
+        if isinstance(content, str):
+            return content
+        return " ".join(p.get("text", "") for p in content or [] if isinstance(p, dict))
+    return ""
+
+
+def _food_estimate() -> Dict[str, Any]:
+    return {
+        "is_food": True,
+        "reason": "bench estimate",
+        "calories_per_100g": round(random.uniform(80, 350), 1),
+        "protein_per_100g": round(random.uniform(2, 20), 1),
+        "carbs_per_100g": round(random.uniform(5, 50), 1),
+        "fat_per_100g": round(random.uniform(1, 20), 1),
+    }
+
+
+def _chat_answer(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Canned answer shaped like what each server.py prompt asks for."""
+    system = _system_prompt(messages)
+    if "analyzing food images" in system:
+        picks = random.sample(FOODS, k=random.randint(1, 3))
+        foods = [{"name": n, "estimated_quantity_grams": g, "confidence": "high"} for n, g in picks]
+        if random.random() < 0.2:
+            foods.append({"name": random.choice(ODD_FOODS), "estimated_quantity_grams": 120, "confidence": "low"})
+        return {"coin_detected": False, "coin_type": None, "foods": foods, "notes": "bench"}
+    if "binary classifier" in system:
+        return {"has_food": True, "confidence": 0.97, "reason": "bench"}
+    if "validate if the text is a food" in system:
+        text = _user_text(messages)
+        if text.startswith("For each text in this JSON array"):
+            queries = json.loads(text.splitlines()[1])
+            return {"foods": [{"query": q, **_food_estimate()} for q in queries]}
+        return _food_estimate()
+    if "extract structured food items" in system:
+        words = [w.strip(" .") for w in _user_text(messages).replace(",", " and ").split(" and ")]
+        return {"foods": [{"name": w or "Rice", "quantity_grams": 150} for w in words if w]}
+    if "chef" in system:
+        return {
+            "name": "Bench Khichdi",
+            "ingredients": [{"item": "Rice", "quantity": "1 cup"}, {"item": "Moong Dal", "quantity": "1/2 cup"}],
+            "instructions": ["Rinse", "Pressure cook with spices", "Serve hot"],
+            "nutrition": {"calories": 420, "protein": 16, "carbs": 70, "fat": 8},
+        }
+    return {}
+
+
+def _usage(messages: List[Dict[str, Any]], completion: str) -> Dict[str, int]:
+    prompt_tokens = max(1, len(json.dumps(messages)) // 4)
+    completion_tokens = max(1, len(completion) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _usda_food(fdc_id: int, name: str) -> Dict[str, Any]:
+    def nutrient(n: str, unit: str, amount: float) -> Dict[str, Any]:
+        return {"nutrient": {"name": n, "unitName": unit}, "amount": amount}
+
+    return {
+        "fdcId": fdc_id,
+        "description": name,
+        "dataType": "SR Legacy",
+        "foodNutrients": [
+            nutrient("Energy", "KCAL", 150.0),
+            nutrient("Protein", "G", 6.0),
+            nutrient("Carbohydrate, by difference", "G", 20.0),
+            nutrient("Total lipid (fat)", "G", 5.0),
+            nutrient("Fiber, total dietary", "G", 2.0),
+            nutrient("Sodium, Na", "MG", 200.0),
+        ],
+    }
+
+
+def create_app(profiles: Dict[str, Profile]) -> FastAPI:
+    app = FastAPI(title="NutriSnap bench upstreams")
+    counters: Dict[str, int] = {}
+
+    def _count(name: str) -> None:
+        counters[name] = counters.get(name, 0) + 1
+
+    @app.get("/_stats")
+    async def stats():
+        return counters
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        _count("openai.chat")
+        profile = profiles["openai"]
+        # Vision calls are the slow ones in production
+        has_image = "image_url" in json.dumps(body.get("messages", []))[:200000]
+        await profile.delay(2.0 if has_image else 1.0)
+        if (failed := profile.failure()) is not None:
+            return failed
+
+        messages = body.get("messages", [])
+        content = json.dumps(_chat_answer(messages))
+        model = body.get("model", "gpt-4o")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if body.get("stream"):
+            async def chunks():
+                step = 24
+                for i in range(0, len(content), step):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(0.005)
+                done = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }
+                yield f"data: {json.dumps(done)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    usage = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [], "usage": _usage(messages, content),
+                    }
+                    yield f"data: {json.dumps(usage)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": _usage(messages, content),
+        }
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        body = await request.body()
+        _count("openai.transcription")
+        profile = profiles["openai"]
+        # Whisper latency grows with upload size
+        await profile.delay(1.0 + len(body) / (1024 * 1024))
+        if (failed := profile.failure()) is not None:
+            return failed
+        return {"text": random.choice(TRANSCRIPTS)}
+
+    @app.post("/fdc/v1/foods/search")
+    async def usda_search(request: Request):
+        body = await request.json()
+        _count("usda.search")
+        await profiles["usda"].delay()
+        if (failed := profiles["usda"].failure()) is not None:
+            return failed
+        query = str(body.get("query", "food"))
+        size = int(body.get("pageSize", 25) or 25)
+        base = abs(hash(query)) % 1_000_000
+        return {"totalHits": size, "foods": [_usda_food(base + i, f"{query.title()} {i}") for i in range(size)]}
+
+    @app.get("/fdc/v1/food/{fdc_id}")
+    async def usda_food(fdc_id: int):
+        _count("usda.food")
+        await profiles["usda"].delay()
+        if (failed := profiles["usda"].failure()) is not None:
+            return failed
+        return _usda_food(fdc_id, f"Food {fdc_id}")
+
+    @app.get("/api/v2/product/{code}.json")
+    async def off_product(code: str):
+        _count("off.product")
+        await profiles["off"].delay()
+        if (failed := profiles["off"].failure()) is not None:
+            return failed
+        return {
+            "code": code,
+            "status": 1,
+            "product": {
+                "product_name": f"Bench Product {code}",
+                "brands": "Bench",
+                "nutriments": {
+                    "energy-kcal_100g": 450, "proteins_100g": 8, "carbohydrates_100g": 60, "fat_100g": 20,
+                    "sodium_100g": 0.4, "sodium_unit": "g",
+                },
+            },
+        }
+
+    return app
+
+
+def add_profile_args(parser: argparse.ArgumentParser) -> None:
+    defaults = {"openai": 400.0, "usda": 150.0, "off": 150.0}
+    for name in UPSTREAMS:
+        parser.add_argument(f"--{name}-latency-ms", type=float, default=defaults[name])
+        parser.add_argument(f"--{name}-jitter-ms", type=float, default=defaults[name] / 4)
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+        parser.add_argument(f"--{name}-error-status", type=int, default=500, help="e.g. 429 to simulate rate limits")
+
+
+def profile_argv(args: argparse.Namespace) -> List[str]:
+    """Re-serialize profile options so a parent process can forward them."""
+    argv: List[str] = []
+    for name in UPSTREAMS:
+        for field in ("latency_ms", "jitter_ms", "error_rate", "error_status"):
+            argv += [f"--{name}-{field.replace('_', '-')}", str(getattr(args, f"{name}_{field}"))]
+    return argv
+
+
+def profiles_from_args(args: argparse.Namespace) -> Dict[str, Profile]:
+    return {
+        name: Profile(
+            latency_ms=getattr(args, f"{name}_latency_ms"),
+            jitter_ms=getattr(args, f"{name}_jitter_ms"),
+            error_rate=getattr(args, f"{name}_error_rate"),
+            error_status=getattr(args, f"{name}_error_status"),
+        )
+        for name in UPSTREAMS
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8012)
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(profiles_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+-- Migration 008: Trigram food search
+-- btree indexes on lower(name)/lower(brand) cannot serve LIKE '%..%' or fuzzy matching,
+-- so /api/foods/search degraded to a sequential scan as the catalog grew.
+-- Safe to run multiple times.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- GIN trigram indexes serve LIKE '%term%', similarity (%) and word_similarity (<%) operators
+CREATE INDEX IF NOT EXISTS idx_foods_name_trgm
+  ON public.foods USING gin (lower(name) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_foods_brand_trgm
+  ON public.foods USING gin (lower(brand) gin_trgm_ops)
+  WHERE brand IS NOT NULL;
+
+COMMENT ON INDEX public.idx_foods_name_trgm IS 'Trigram index for substring/fuzzy food name search';
+COMMENT ON INDEX public.idx_foods_brand_trgm IS 'Trigram index for substring/fuzzy brand search';
@@ -0,0 +1,12 @@
+-- Migration 009: foods.updated_at change tracking
+-- The backend keeps an in-process name index of foods and refreshes it incrementally
+-- by polling rows whose updated_at moved since the last refresh.
+-- Safe to run multiple times.
+
+ALTER TABLE public.foods
+  ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS idx_foods_updated_at
+  ON public.foods (updated_at);
+
+COMMENT ON COLUMN public.foods.updated_at IS 'Bumped on insert, rename and sync; drives incremental name index refresh';
@@ -0,0 +1,26 @@
+-- Migration 010: AI food estimate cache
+-- Memoizes _validate_foods_concurrently results per normalized query so repeated unknown
+-- (or non-food) queries across users cost one lookup instead of an LLM call.
+-- Safe to run multiple times.
+
+CREATE TABLE IF NOT EXISTS public.food_estimate_cache (
+    query_key text PRIMARY KEY,
+    is_food boolean NOT NULL,
+    reason text NULL,
+    calories_per_100g double precision NOT NULL DEFAULT 0,
+    protein_per_100g double precision NOT NULL DEFAULT 0,
+    carbs_per_100g double precision NOT NULL DEFAULT 0,
+    fat_per_100g double precision NOT NULL DEFAULT 0,
+    model text NULL,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    expires_at timestamptz NOT NULL
+);
+
+-- Expired rows are ignored on read and purged by the admin sync
+CREATE INDEX IF NOT EXISTS idx_food_estimate_cache_expires_at
+  ON public.food_estimate_cache (expires_at);
+
+COMMENT ON TABLE public.food_estimate_cache IS 'Memoized AI food validation + per-100g nutrition estimates';
+COMMENT ON COLUMN public.food_estimate_cache.query_key IS 'Lower-cased, whitespace-collapsed normalized food name';
+COMMENT ON COLUMN public.food_estimate_cache.is_food IS 'false = negative entry (query rejected as non-food)';
+COMMENT ON COLUMN public.food_estimate_cache.expires_at IS 'Positive and negative entries use separate TTLs';
@@ -0,0 +1,53 @@
+-- Migration 011: Learned per-food portion sizes
+-- Quantities users confirm in finalized meals are sampled into food_portion_samples and
+-- summarised per (food_id, unit) in food_portion_stats, so voice and manual logging can
+-- default portions without asking the model. Refreshed incrementally by finalized_at.
+-- Safe to run multiple times.
+
+-- When a meal reached review_status = 'finalized' (the refresh watermark). Backfilled once
+-- from the meal timestamp when the column is first added.
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = 'meals' AND column_name = 'finalized_at'
+  ) THEN
+    ALTER TABLE public.meals ADD COLUMN finalized_at timestamptz NULL;
+    UPDATE public.meals SET finalized_at = timestamp WHERE review_status = 'finalized';
+  END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_meals_finalized_at
+  ON public.meals (finalized_at)
+  WHERE review_status = 'finalized';
+
+CREATE TABLE IF NOT EXISTS public.food_portion_samples (
+    meal_id uuid NOT NULL REFERENCES public.meals(id) ON DELETE CASCADE,
+    item int NOT NULL,
+    unit text NOT NULL,
+    food_id uuid NOT NULL,
+    grams double precision NOT NULL,
+    finalized_at timestamptz NOT NULL,
+    PRIMARY KEY (meal_id, item, unit)
+);
+
+CREATE INDEX IF NOT EXISTS idx_food_portion_samples_food_unit
+  ON public.food_portion_samples (food_id, unit);
+CREATE INDEX IF NOT EXISTS idx_food_portion_samples_finalized_at
+  ON public.food_portion_samples (finalized_at);
+
+CREATE TABLE IF NOT EXISTS public.food_portion_stats (
+    food_id uuid NOT NULL REFERENCES public.foods(id) ON DELETE CASCADE,
+    unit text NOT NULL,
+    samples int NOT NULL,
+    median_grams double precision NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (food_id, unit)
+);
+
+CREATE INDEX IF NOT EXISTS idx_food_portion_stats_updated_at
+  ON public.food_portion_stats (updated_at);
+
+COMMENT ON TABLE public.food_portion_samples IS 'One row per confirmed meal item and unit; source for food_portion_stats';
+COMMENT ON COLUMN public.food_portion_samples.unit IS '''serving'' = whole logged portion; otherwise grams per one displayUnit (bowl, piece, ...)';
+COMMENT ON TABLE public.food_portion_stats IS 'Median confirmed grams per food and unit, recomputed only for keys with new samples';
@@ -0,0 +1,26 @@
+-- Migration 012: Idempotency keys for meal writes
+-- Clients send an Idempotency-Key header on /meals/log, /meals/log/bulk and
+-- /meals/pending/finalize. The first request with a key stores its response here in the
+-- same transaction as its writes; retries with the same key replay that response instead
+-- of writing again.
+-- Safe to run multiple times.
+
+CREATE TABLE IF NOT EXISTS public.idempotency_keys (
+    user_id uuid NOT NULL,
+    key text NOT NULL,
+    route text NOT NULL,
+    request_hash text NOT NULL,
+    status_code int NULL,
+    response jsonb NULL,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    expires_at timestamptz NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+
+-- Expired keys can be reclaimed on conflict and are purged by the admin sync
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at
+  ON public.idempotency_keys (expires_at);
+
+COMMENT ON TABLE public.idempotency_keys IS 'Stored responses for retried meal writes, keyed by (user, Idempotency-Key)';
+COMMENT ON COLUMN public.idempotency_keys.request_hash IS 'sha256 of the request body; a key reused with a different body is rejected';
+COMMENT ON COLUMN public.idempotency_keys.response IS 'JSON body replayed to retries with the same key';
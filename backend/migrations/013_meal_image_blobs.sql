@@ -0,0 +1,16 @@
+-- Migration 013: Meal photos in the blob store
+-- New meals store their photo in the content-addressed blob store (BLOB_STORE_BACKEND) and
+-- keep only its sha256 here; image_base64 is left NULL. Existing inline photos are moved
+-- out in batches by POST /api/admin/meals/images/backfill (the blob store is not reachable
+-- from SQL), which clears image_base64 as each row is moved.
+-- Safe to run multiple times.
+
+ALTER TABLE public.meals ADD COLUMN IF NOT EXISTS image_sha256 text NULL;
+
+-- Ownership check when serving /api/meals/images/{sha256}
+CREATE INDEX IF NOT EXISTS idx_meals_user_image_sha256
+  ON public.meals (user_id, image_sha256)
+  WHERE image_sha256 IS NOT NULL;
+
+COMMENT ON COLUMN public.meals.image_sha256 IS 'Blob store key (sha256 hex) of the meal photo; thumbnail is its "thumb" variant';
+COMMENT ON COLUMN public.meals.image_base64 IS 'Legacy inline photo; NULL once moved to the blob store';
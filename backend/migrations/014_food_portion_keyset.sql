@@ -0,0 +1,11 @@
+-- Migration 014: Keyset cursor for portion sampling
+-- FoodPortionTable.ingest pages through finalized meals by (finalized_at, id) rather than
+-- finalized_at alone, so a burst of meals finalized at the same instant (bulk ingestion
+-- stamps a whole batch with one now()) cannot pin the cursor.
+-- Safe to run multiple times.
+
+CREATE INDEX IF NOT EXISTS idx_meals_finalized_at_id
+  ON public.meals (finalized_at, id)
+  WHERE review_status = 'finalized';
+
+DROP INDEX IF EXISTS public.idx_meals_finalized_at;
@@ -0,0 +1,9 @@
+-- Migration 015: Remember meal photos the blob-store backfill could not move
+-- POST /api/admin/meals/images/backfill records why a row's image_base64 failed to decode
+-- and skips it afterwards, so undecodable rows cannot stall the backfill or keep
+-- `remaining` above 0. Pass retry_failed=true to clear the marks and try them again.
+-- Safe to run multiple times.
+
+ALTER TABLE public.meals ADD COLUMN IF NOT EXISTS image_backfill_error text NULL;
+
+COMMENT ON COLUMN public.meals.image_backfill_error IS 'Why the backfill could not move image_base64 to the blob store; NULL if not tried or moved';
@@ -1,24 +1,41 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Depends, Header, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import FormData, UploadFile as StarletteUploadFile
+from starlette.responses import JSONResponse, Response, StreamingResponse
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import IO, List, Optional, Dict, Any, AsyncIterator, Awaitable, Callable
+from abc import ABC, abstractmethod
 from contextlib import asynccontextmanager
 import uuid
 from datetime import datetime, timedelta, timezone
 import base64
+import binascii
+import copy
+import hashlib
+import io
 import json
-from openai import AsyncOpenAI
+import math
+import re
+import shutil
+import struct
+import tempfile
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, RateLimitError
 import jwt
 from jwt import PyJWKClient
 import asyncpg
 import httpx
 import time
 import asyncio
+import bisect
 from asyncpg.exceptions import UniqueViolationError
+from cachetools import LRUCache
+from collections import OrderedDict, deque
+from PIL import Image, ImageOps
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -31,10 +48,31 @@ pg_pool: asyncpg.Pool | None = None
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
 OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o')
 OPENAI_CHEAP_MODEL = os.environ.get('OPENAI_CHEAP_MODEL', 'gpt-4o-mini')
+CHEF_TEMPERATURE = 0.7
+# OpenAI bulkhead: total in-flight calls, then per-class caps / queue bounds / max queue wait.
+# Classes are served in priority order: interactive logging, then validation, then recipes.
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_CLASS_LIMITS = os.environ.get("LLM_CLASS_LIMITS", "interactive=12,validation=6,recipe=4")
+LLM_CLASS_MAX_QUEUE = os.environ.get("LLM_CLASS_MAX_QUEUE", "interactive=64,validation=64,recipe=8")
+LLM_CLASS_QUEUE_TIMEOUT_SECONDS = os.environ.get("LLM_CLASS_QUEUE_TIMEOUT_SECONDS", "interactive=20,validation=15,recipe=5")
+# USD per 1M tokens (input/output) or per audio minute, keyed by requested model; JSON, overrides defaults
+LLM_PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "whisper-1": {"per_minute": 0.006},
+    **json.loads(os.environ.get("LLM_PRICES", "{}") or "{}"),
+}
+LLM_METRICS_WINDOW = int(os.environ.get("LLM_METRICS_WINDOW", "500"))
 openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 
 ADMIN_SYNC_KEY = os.environ.get("ADMIN_SYNC_KEY", "").strip()
 USDA_API_KEY = os.environ.get("USDA_API_KEY", "").strip()
+# Upstream base URLs are overridable so benchmarks can point at local stand-ins
+# (the OpenAI SDK reads OPENAI_BASE_URL itself)
+USDA_API_BASE_URL = os.environ.get("USDA_API_BASE_URL", "https://api.nal.usda.gov/fdc/v1").rstrip("/")
+OPENFOODFACTS_BASE_URL = os.environ.get("OPENFOODFACTS_BASE_URL", "https://world.openfoodfacts.org").rstrip("/")
+MEALS_BULK_MAX_ITEMS = int(os.environ.get("MEALS_BULK_MAX_ITEMS", "200"))
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
 FOODS_SYNC_BATCH_SIZE = int(os.environ.get("FOODS_SYNC_BATCH_SIZE", "200"))
 FOODS_SYNC_USED_DAYS = int(os.environ.get("FOODS_SYNC_USED_DAYS", "30"))
 FOODS_SYNC_STALE_DAYS = int(os.environ.get("FOODS_SYNC_STALE_DAYS", "90"))
@@ -42,6 +80,41 @@ SEED_FOODS_ON_STARTUP = os.environ.get("SEED_FOODS_ON_STARTUP", "false").strip()
 SEED_USDA_ON_STARTUP = os.environ.get("SEED_USDA_ON_STARTUP", "false").strip().lower() in ("1", "true", "yes")
 USDA_BOOTSTRAP_TERMS = [t.strip() for t in os.environ.get("USDA_BOOTSTRAP_TERMS", "rice,egg,chicken breast,banana,apple,milk,bread,oats").split(",") if t.strip()]
 USDA_BOOTSTRAP_PER_TERM = int(os.environ.get("USDA_BOOTSTRAP_PER_TERM", "10"))
+FOODS_SEARCH_MAX_LIMIT = int(os.environ.get("FOODS_SEARCH_MAX_LIMIT", "200"))
+FOOD_NAME_INDEX_ENABLED = os.environ.get("FOOD_NAME_INDEX_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+FOOD_NAME_INDEX_REFRESH_SECONDS = float(os.environ.get("FOOD_NAME_INDEX_REFRESH_SECONDS", "30"))
+FOOD_PORTION_LEARNING = os.environ.get("FOOD_PORTION_LEARNING", "true").strip().lower() in ("1", "true", "yes")
+FOOD_PORTION_REFRESH_SECONDS = float(os.environ.get("FOOD_PORTION_REFRESH_SECONDS", "300"))
+FOOD_PORTION_MIN_SAMPLES = int(os.environ.get("FOOD_PORTION_MIN_SAMPLES", "3"))
+FOOD_VALIDATION_CONCURRENCY = int(os.environ.get("FOOD_VALIDATION_CONCURRENCY", "4"))
+# Unknown names validated per model call; 1 restores one call per name
+FOOD_VALIDATION_BATCH_SIZE = int(os.environ.get("FOOD_VALIDATION_BATCH_SIZE", "8"))
+FOOD_ESTIMATE_TTL_DAYS = float(os.environ.get("FOOD_ESTIMATE_TTL_DAYS", "30"))
+FOOD_ESTIMATE_NEGATIVE_TTL_DAYS = float(os.environ.get("FOOD_ESTIMATE_NEGATIVE_TTL_DAYS", "7"))
+FOOD_ESTIMATE_LRU_SIZE = int(os.environ.get("FOOD_ESTIMATE_LRU_SIZE", "4096"))
+IMAGE_CACHE_MAX_ENTRIES = int(os.environ.get("IMAGE_CACHE_MAX_ENTRIES", "512"))
+IMAGE_CACHE_TTL_SECONDS = float(os.environ.get("IMAGE_CACHE_TTL_SECONDS", "86400"))
+IMAGE_CACHE_PHASH_MAX_DISTANCE = int(os.environ.get("IMAGE_CACHE_PHASH_MAX_DISTANCE", "6"))  # of 64 bits; <0 disables
+IMAGE_MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", "1024"))
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "80"))
+# Meal photos live in a content-addressed blob store; meals only keep the sha256
+BLOB_STORE_BACKEND = os.environ.get("BLOB_STORE_BACKEND", "local").strip().lower()
+BLOB_STORE_DIR = Path(os.environ.get("BLOB_STORE_DIR", "") or Path(__file__).parent / "blobs")
+MEAL_THUMBNAIL_SIZE = int(os.environ.get("MEAL_THUMBNAIL_SIZE", "256"))
+MEAL_IMAGE_BACKFILL_BATCH_SIZE = int(os.environ.get("MEAL_IMAGE_BACKFILL_BATCH_SIZE", "50"))
+PHOTO_UPLOAD_MAX_BYTES = int(os.environ.get("PHOTO_UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))
+UPLOAD_SPOOL_MEMORY_BYTES = int(os.environ.get("UPLOAD_SPOOL_MEMORY_BYTES", str(1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024  # multipart boundaries + small fields on top of the file itself
+VOICE_UPLOAD_MAX_BYTES = int(os.environ.get("VOICE_UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))  # Whisper's own cap
+VOICE_MAX_DURATION_SECONDS = float(os.environ.get("VOICE_MAX_DURATION_SECONDS", "120"))
+VOICE_TRANSCODE = os.environ.get("VOICE_TRANSCODE", "true").strip().lower() in ("1", "true", "yes")
+VOICE_TRANSCODE_TIMEOUT_SECONDS = float(os.environ.get("VOICE_TRANSCODE_TIMEOUT_SECONDS", "20"))
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+VOICE_LOCAL_PARSE = os.environ.get("VOICE_LOCAL_PARSE", "true").strip().lower() in ("1", "true", "yes")
+VOICE_LOCAL_PARSE_MIN_CONFIDENCE = float(os.environ.get("VOICE_LOCAL_PARSE_MIN_CONFIDENCE", "0.6"))
+PHOTO_PRESENCE_GATE = os.environ.get("PHOTO_PRESENCE_GATE", "false").strip().lower() in ("1", "true", "yes")
+PHOTO_PRESENCE_REJECT_CONFIDENCE = float(os.environ.get("PHOTO_PRESENCE_REJECT_CONFIDENCE", "0.8"))
 
 # USDA Rate Limiting: 1,000 req/hour = 900 req/hour with safety margin
 USDA_RATE_LIMIT_PER_HOUR = 900
@@ -71,9 +144,17 @@ async def lifespan(app: FastAPI):
         import asyncio
         asyncio.create_task(_background_seed())
 
+    # Build the in-process food name index in background; matching falls back to Postgres until ready
+    food_index_task = asyncio.create_task(_food_name_index_loop()) if FOOD_NAME_INDEX_ENABLED else None
+    portion_task = asyncio.create_task(_food_portion_loop()) if FOOD_PORTION_LEARNING else None
+
     try:
         yield
     finally:
+        if food_index_task is not None:
+            food_index_task.cancel()
+        if portion_task is not None:
+            portion_task.cancel()
         if pg_pool is not None:
             await pg_pool.close()
             pg_pool = None
@@ -264,7 +345,8 @@ async def _ensure_schema(conn: asyncpg.Connection):
           ADD COLUMN IF NOT EXISTS retry_count integer NOT NULL DEFAULT 0,
           ADD COLUMN IF NOT EXISTS sync_error text NULL,
           ADD COLUMN IF NOT EXISTS raw_payload jsonb NULL,
-          ADD COLUMN IF NOT EXISTS review_status text DEFAULT 'approved';
+          ADD COLUMN IF NOT EXISTS review_status text DEFAULT 'approved',
+          ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now();
         
         ALTER TABLE meals
           ADD COLUMN IF NOT EXISTS review_status text DEFAULT 'finalized';
@@ -282,6 +364,111 @@ async def _ensure_schema(conn: asyncpg.Connection):
         CREATE INDEX IF NOT EXISTS idx_foods_last_used_at ON foods (last_used_at DESC);
         CREATE INDEX IF NOT EXISTS idx_foods_last_synced_at ON foods (last_synced_at ASC);
         CREATE INDEX IF NOT EXISTS idx_foods_sync_status ON foods (sync_status);
+        CREATE INDEX IF NOT EXISTS idx_foods_updated_at ON foods (updated_at);
+        """
+    )
+
+    # Memoized AI food validation/estimates keyed by normalized query (positive and negative)
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS food_estimate_cache (
+            query_key text PRIMARY KEY,
+            is_food boolean NOT NULL,
+            reason text NULL,
+            calories_per_100g double precision NOT NULL DEFAULT 0,
+            protein_per_100g double precision NOT NULL DEFAULT 0,
+            carbs_per_100g double precision NOT NULL DEFAULT 0,
+            fat_per_100g double precision NOT NULL DEFAULT 0,
+            model text NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            expires_at timestamptz NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_food_estimate_cache_expires_at ON food_estimate_cache (expires_at);
+        """
+    )
+
+    # Learned portion sizes from finalized meals (see migrations/011_food_portion_stats.sql, 014)
+    await conn.execute(
+        """
+        DO $$
+        BEGIN
+          IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'meals' AND column_name = 'finalized_at'
+          ) THEN
+            ALTER TABLE meals ADD COLUMN finalized_at timestamptz NULL;
+            UPDATE meals SET finalized_at = timestamp WHERE review_status = 'finalized';
+          END IF;
+        END $$;
+
+        CREATE INDEX IF NOT EXISTS idx_meals_finalized_at_id ON meals (finalized_at, id) WHERE review_status = 'finalized';
+        DROP INDEX IF EXISTS idx_meals_finalized_at;
+
+        CREATE TABLE IF NOT EXISTS food_portion_samples (
+            meal_id uuid NOT NULL REFERENCES meals(id) ON DELETE CASCADE,
+            item int NOT NULL,
+            unit text NOT NULL,
+            food_id uuid NOT NULL,
+            grams double precision NOT NULL,
+            finalized_at timestamptz NOT NULL,
+            PRIMARY KEY (meal_id, item, unit)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_food_portion_samples_food_unit ON food_portion_samples (food_id, unit);
+        CREATE INDEX IF NOT EXISTS idx_food_portion_samples_finalized_at ON food_portion_samples (finalized_at);
+
+        CREATE TABLE IF NOT EXISTS food_portion_stats (
+            food_id uuid NOT NULL REFERENCES foods(id) ON DELETE CASCADE,
+            unit text NOT NULL,
+            samples int NOT NULL,
+            median_grams double precision NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (food_id, unit)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_food_portion_stats_updated_at ON food_portion_stats (updated_at);
+        """
+    )
+
+    # Meal photos moved to the blob store (see migrations/013_meal_image_blobs.sql, 015)
+    await conn.execute(
+        """
+        ALTER TABLE meals ADD COLUMN IF NOT EXISTS image_sha256 text NULL;
+        ALTER TABLE meals ADD COLUMN IF NOT EXISTS image_backfill_error text NULL;
+
+        CREATE INDEX IF NOT EXISTS idx_meals_user_image_sha256 ON meals (user_id, image_sha256)
+          WHERE image_sha256 IS NOT NULL;
+        """
+    )
+
+    # Stored responses for retried meal writes (see migrations/012_idempotency_keys.sql)
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id uuid NOT NULL,
+            key text NOT NULL,
+            route text NOT NULL,
+            request_hash text NOT NULL,
+            status_code int NULL,
+            response jsonb NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            expires_at timestamptz NOT NULL,
+            PRIMARY KEY (user_id, key)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys (expires_at);
+        """
+    )
+
+    # Trigram indexes for substring/fuzzy food search (btree lower(name) can't serve LIKE '%..%')
+    await conn.execute(
+        """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+        CREATE INDEX IF NOT EXISTS idx_foods_name_trgm ON foods USING gin (lower(name) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_foods_brand_trgm ON foods USING gin (lower(brand) gin_trgm_ops)
+          WHERE brand IS NOT NULL;
         """
     )
 
@@ -389,7 +576,7 @@ async def _fetch_openfoodfacts(barcode: str) -> Dict[str, Any] | None:
     code = (barcode or "").strip()
     if not code:
         return None
-    url = f"https://world.openfoodfacts.org/api/v2/product/{code}.json"
+    url = f"{OPENFOODFACTS_BASE_URL}/api/v2/product/{code}.json"
     async with httpx.AsyncClient(timeout=20) as client:
         r = await client.get(url)
         if r.status_code != 200:
@@ -406,7 +593,7 @@ async def _fetch_usda_food(external_id: str) -> Dict[str, Any] | None:
     
     await _check_usda_rate_limit()
     
-    url = f"https://api.nal.usda.gov/fdc/v1/food/{fdc_id}"
+    url = f"{USDA_API_BASE_URL}/food/{fdc_id}"
     params = {"api_key": USDA_API_KEY}
     async with httpx.AsyncClient(timeout=30) as client:
         r = await client.get(url, params=params)
@@ -450,7 +637,7 @@ async def _usda_search(term: str, limit: int) -> Dict[str, Any] | None:
     
     await _check_usda_rate_limit()
     
-    url = "https://api.nal.usda.gov/fdc/v1/foods/search"
+    url = f"{USDA_API_BASE_URL}/foods/search"
     payload = {
         "query": q,
         "pageSize": int(limit),
@@ -601,6 +788,11 @@ def _require_admin_key(key: str | None) -> None:
         raise HTTPException(status_code=403, detail="Invalid admin key")
 
 
+def _escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally (default '\\' escape)."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 def _uuid(value: str) -> uuid.UUID:
     try:
         return uuid.UUID(str(value))
@@ -628,7 +820,17 @@ def _profile_from_record(record: asyncpg.Record) -> dict:
     }
 
 
-def _meal_from_record(record: asyncpg.Record) -> dict:
+def _meal_image_urls(image_sha256: str | None) -> Dict[str, Any]:
+    if not image_sha256:
+        return {}
+    return {
+        "image_sha256": image_sha256,
+        "image_url": f"/api/meals/images/{image_sha256}",
+        "thumbnail_url": f"/api/meals/images/{image_sha256}?variant=thumb",
+    }
+
+
+def _meal_foods(record: asyncpg.Record) -> Any:
     foods = record["foods"]
     if isinstance(foods, str):
         try:
@@ -636,16 +838,21 @@ def _meal_from_record(record: asyncpg.Record) -> dict:
         except Exception:
             # If parsing fails, keep original value and let validation raise a clear error
             pass
+    return foods
+
+
+def _meal_from_record(record: asyncpg.Record) -> dict:
     return {
         "id": str(record["id"]),
         "user_id": str(record["user_id"]),
         "meal_type": record["meal_type"],
-        "foods": foods,
+        "foods": _meal_foods(record),
         "total_calories": record["total_calories"],
         "total_protein": record["total_protein"],
         "total_carbs": record["total_carbs"],
         "total_fat": record["total_fat"],
         "image_base64": record["image_base64"],
+        **_meal_image_urls(record.get("image_sha256")),
         "logging_method": record["logging_method"],
         "notes": record["notes"],
         "timestamp": record["timestamp"],
@@ -788,7 +995,10 @@ class MealLog(BaseModel):
     total_protein: float
     total_carbs: float
     total_fat: float
-    image_base64: Optional[str] = None
+    image_base64: Optional[str] = None  # only for meals logged before images moved to the blob store
+    image_sha256: Optional[str] = None
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     logging_method: str  # "photo", "voice", "manual", "barcode"
     notes: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
@@ -802,9 +1012,40 @@ class MealLogCreate(BaseModel):
     logging_method: str
     notes: Optional[str] = None
 
+class BulkMealItem(BaseModel):
+    meal_type: str
+    foods: List[Dict[str, Any]]
+    image_base64: Optional[str] = None
+    logging_method: str
+    notes: Optional[str] = None
+    timestamp: Optional[datetime] = None  # when the meal was logged on the device; defaults to now
+    client_id: Optional[str] = None  # echoed back so the client can match results to its queue
+
+class BulkMealLogRequest(BaseModel):
+    user_id: str
+    meals: List[Any]  # validated one by one so a bad item doesn't reject the batch
+
+class BulkMealResult(BaseModel):
+    index: int
+    client_id: Optional[str] = None
+    status: str  # "created" | "replayed" (client_id already logged) | "in_progress" (retry later) | "invalid"
+    meal: Optional[MealLog] = None
+    error: Optional[str] = None
+
+class BulkMealLogResponse(BaseModel):
+    created: int
+    replayed: int = 0
+    failed: int
+    results: List[BulkMealResult]
+
 class PhotoAnalysisRequest(BaseModel):
     image_base64: str
     user_id: str
+    presence_gate: bool = PHOTO_PRESENCE_GATE  # run the cheap food-presence check alongside the full analysis
+
+class FoodPresenceRequest(BaseModel):
+    image_base64: str
+    user_id: str
 
 class VoiceToMealFoodItem(BaseModel):
     name: str
@@ -897,6 +1138,420 @@ def _normalize_base64_image(image_base64: str) -> str:
         return image_base64.split(",", 1)[1]
     return image_base64
 
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class JsonSectionScanner:
+    """Incrementally scan a streamed JSON object and return each top-level
+    (key, value) pair as soon as its value is complete."""
+
+    def __init__(self):
+        self._pair: List[str] = []
+        self._depth = 0
+        self._in_str = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[tuple[str, Any]]:
+        out: List[tuple[str, Any]] = []
+        for ch in text:
+            if self._in_str:
+                self._pair.append(ch)
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+                self._pair.append(ch)
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth > 1:
+                    self._pair.append(ch)
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(out)
+                else:
+                    self._pair.append(ch)
+            elif ch == "," and self._depth == 1:
+                self._emit(out)
+            elif self._depth >= 1:
+                self._pair.append(ch)
+        return out
+
+    def _emit(self, out: List[tuple[str, Any]]) -> None:
+        text = "".join(self._pair).strip()
+        self._pair = []
+        if not text:
+            return
+        try:
+            out.extend(json.loads("{" + text + "}").items())
+        except ValueError:
+            pass
+
+
+class SingleFlight:
+    """Coalesce identical concurrent async calls: while a call for a key is in flight,
+    later callers await its result instead of issuing their own."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {"calls": 0, "deduplicated": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["calls"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        else:
+            self.stats["deduplicated"] += 1
+        # Shielded: one caller disconnecting must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def snapshot(self) -> Dict[str, int]:
+        return {**self.stats, "in_flight": len(self._inflight)}
+
+
+llm_single_flight = SingleFlight()
+
+
+def _parse_class_setting(spec: str, cast: Callable[[str], Any]) -> Dict[str, Any]:
+    """'interactive=12,recipe=4' -> {'interactive': 12, 'recipe': 4}"""
+    out: Dict[str, Any] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            out[name.strip()] = cast(value.strip())
+    return out
+
+
+class LLMBulkhead:
+    """Priority-aware concurrency limiter for OpenAI calls.
+
+    A call takes a slot from the global pool and from its class. When either is full it
+    queues FIFO within its class; freed slots go to the highest-priority class with a
+    waiter that fits its cap. Calls are rejected with 503 + Retry-After when the class
+    queue is full or the wait exceeds the class queue timeout.
+    """
+
+    PRIORITY = ("interactive", "validation", "recipe")
+    _RECENT_WAITS = 512
+
+    def __init__(self, total: int, limits: Dict[str, int], max_queue: Dict[str, int], queue_timeout: Dict[str, float]):
+        self.total = max(1, total)
+        self.limits = {c: max(1, limits.get(c, self.total)) for c in self.PRIORITY}
+        self.max_queue = {c: max(0, max_queue.get(c, 64)) for c in self.PRIORITY}
+        self.queue_timeout = {c: queue_timeout.get(c, 10.0) for c in self.PRIORITY}
+        self._running = {c: 0 for c in self.PRIORITY}
+        self._waiters: Dict[str, deque] = {c: deque() for c in self.PRIORITY}
+        self._recent_waits: Dict[str, deque] = {c: deque(maxlen=self._RECENT_WAITS) for c in self.PRIORITY}
+        self._hold_ms: Dict[str, float] = {c: 0.0 for c in self.PRIORITY}
+        self.stats: Dict[str, Dict[str, float]] = {
+            c: {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+            for c in self.PRIORITY
+        }
+
+    def _has_capacity(self, cls: str) -> bool:
+        return sum(self._running.values()) < self.total and self._running[cls] < self.limits[cls]
+
+    def _retry_after(self, cls: str) -> int:
+        """Rough seconds until a slot frees up: queue ahead of us times mean hold time per slot."""
+        hold_s = (self._hold_ms[cls] or 1000.0) / 1000
+        return max(1, math.ceil(hold_s * (len(self._waiters[cls]) + 1) / self.limits[cls]))
+
+    def _reject(self, cls: str, reason: str) -> HTTPException:
+        self.stats[cls][f"rejected_{reason}"] += 1
+        logger.warning(f"[LLM_BULKHEAD] Rejected {cls} call ({reason}); running={self._running[cls]} queued={len(self._waiters[cls])}")
+        return HTTPException(
+            status_code=503,
+            detail=f"AI service busy ({cls}); please retry shortly",
+            headers={"Retry-After": str(self._retry_after(cls))},
+        )
+
+    def _record_wait(self, cls: str, wait_ms: float) -> None:
+        st = self.stats[cls]
+        st["admitted"] += 1
+        st["wait_ms_total"] += wait_ms
+        st["wait_ms_max"] = max(st["wait_ms_max"], wait_ms)
+        self._recent_waits[cls].append(wait_ms)
+
+    async def acquire(self, cls: str) -> float:
+        """Take a slot for `cls`; returns the time spent queued (ms). Pair with release()."""
+        if cls not in self._running:
+            raise ValueError(f"Unknown LLM class: {cls}")
+        # Waiters that fit are always dispatched on release, so only our own class's FIFO can be ahead
+        if self._has_capacity(cls) and not self._waiters[cls]:
+            self._running[cls] += 1
+            self._record_wait(cls, 0.0)
+            return 0.0
+        if len(self._waiters[cls]) >= self.max_queue[cls]:
+            raise self._reject(cls, "queue_full")
+
+        started = time.perf_counter()
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters[cls].append(fut)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.queue_timeout[cls])
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # Granted just as the timer fired: keep the slot
+                pass
+            else:
+                self._waiters[cls].remove(fut)
+                raise self._reject(cls, "timeout")
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                self.release(cls)
+            else:
+                self._waiters[cls].remove(fut)
+            raise
+        wait_ms = (time.perf_counter() - started) * 1000
+        self._record_wait(cls, wait_ms)
+        return wait_ms
+
+    def release(self, cls: str, held_ms: float | None = None) -> None:
+        self._running[cls] -= 1
+        if held_ms is not None:
+            # Exponential moving average of slot hold time, for Retry-After estimates
+            prev = self._hold_ms[cls]
+            self._hold_ms[cls] = held_ms if not prev else prev * 0.9 + held_ms * 0.1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for c in self.PRIORITY:
+            waiters = self._waiters[c]
+            while waiters and self._has_capacity(c):
+                fut = waiters.popleft()
+                if not fut.done():
+                    self._running[c] += 1
+                    fut.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, cls: str):
+        """Hold a slot for the block; yields the time spent queued (ms)."""
+        wait_ms = await self.acquire(cls)
+        started = time.perf_counter()
+        try:
+            yield wait_ms
+        finally:
+            self.release(cls, (time.perf_counter() - started) * 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"total_limit": self.total, "running": sum(self._running.values())}
+        for c in self.PRIORITY:
+            waits = sorted(self._recent_waits[c])
+            st = self.stats[c]
+            out[c] = {
+                **st,
+                "limit": self.limits[c],
+                "running": self._running[c],
+                "queue_depth": len(self._waiters[c]),
+                "avg_wait_ms": round(st["wait_ms_total"] / st["admitted"], 1) if st["admitted"] else 0.0,
+                "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0.0,
+                "avg_hold_ms": round(self._hold_ms[c], 1),
+            }
+        return out
+
+
+llm_bulkhead = LLMBulkhead(
+    LLM_MAX_CONCURRENCY,
+    _parse_class_setting(LLM_CLASS_LIMITS, int),
+    _parse_class_setting(LLM_CLASS_MAX_QUEUE, int),
+    _parse_class_setting(LLM_CLASS_QUEUE_TIMEOUT_SECONDS, float),
+)
+
+
+# Bulkhead class each call purpose runs under
+LLM_PURPOSE_CLASS: Dict[str, str] = {
+    "vision_analysis": "interactive",
+    "presence_check": "interactive",
+    "voice_parse": "interactive",
+    "transcription": "interactive",
+    "validation": "validation",
+    "recipe": "recipe",
+}
+
+
+def _llm_outcome(exc: BaseException) -> str:
+    if isinstance(exc, HTTPException):
+        return "rejected" if exc.status_code == 503 else "error"
+    if isinstance(exc, RateLimitError):
+        return "rate_limited"
+    if isinstance(exc, APITimeoutError):
+        return "timeout"
+    if isinstance(exc, APIConnectionError):
+        return "connection_error"
+    if isinstance(exc, APIStatusError):
+        return f"http_{exc.status_code}"
+    if isinstance(exc, asyncio.CancelledError):
+        return "cancelled"
+    return "error"
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))], 1)
+
+
+class LLMCallMetrics:
+    """Per-call OpenAI metrics: model, purpose, latency, tokens, retries, outcome and cost.
+
+    Totals per purpose are kept for the process lifetime; latency percentiles and the
+    recent-call list cover the last `window` calls per purpose. Latency is upstream time
+    only; time spent queued in the bulkhead is reported separately as queue_ms.
+    """
+
+    def __init__(self, prices: Dict[str, Dict[str, float]], window: int):
+        self.prices = prices
+        self.window = max(1, window)
+        self._totals: Dict[str, Dict[str, Any]] = {}
+        self._latencies: Dict[str, deque] = {}
+        self.recent: deque = deque(maxlen=100)
+
+    def cost_usd(self, model: str, prompt_tokens: int, completion_tokens: int, audio_seconds: float) -> float:
+        price = self.prices.get(model) or {}
+        return (
+            prompt_tokens * price.get("input", 0.0) / 1_000_000
+            + completion_tokens * price.get("output", 0.0) / 1_000_000
+            + audio_seconds / 60 * price.get("per_minute", 0.0)
+        )
+
+    def record(self, call: Dict[str, Any]) -> None:
+        call["cost_usd"] = round(
+            self.cost_usd(call["model"], call["prompt_tokens"], call["completion_tokens"], call["audio_seconds"]), 6
+        )
+        purpose = call["purpose"]
+        t = self._totals.setdefault(purpose, {
+            "calls": 0, "outcomes": {}, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "audio_seconds": 0.0, "cost_usd": 0.0, "queue_ms_total": 0.0, "models": {},
+        })
+        t["calls"] += 1
+        t["outcomes"][call["outcome"]] = t["outcomes"].get(call["outcome"], 0) + 1
+        t["models"][call["model"]] = t["models"].get(call["model"], 0) + 1
+        t["retries"] += call["retries"]
+        t["prompt_tokens"] += call["prompt_tokens"]
+        t["completion_tokens"] += call["completion_tokens"]
+        t["audio_seconds"] += call["audio_seconds"]
+        t["cost_usd"] += call["cost_usd"]
+        t["queue_ms_total"] += call["queue_ms"]
+        if call["outcome"] != "rejected":
+            self._latencies.setdefault(purpose, deque(maxlen=self.window)).append(call["latency_ms"])
+        self.recent.append(call)
+        logger.info(
+            f"[LLM] {purpose} model={call['model']} {call['latency_ms']:.0f}ms (queued {call['queue_ms']:.0f}ms) "
+            f"tokens={call['prompt_tokens']}/{call['completion_tokens']} retries={call['retries']} "
+            f"cost=${call['cost_usd']:.5f} outcome={call['outcome']}"
+        )
+
+    @asynccontextmanager
+    async def track(self, purpose: str, model: str):
+        """Time the block and record one call; the caller fills in tokens/retries/queue_ms
+        on the yielded dict. Exceptions are classified into the call outcome and re-raised."""
+        call: Dict[str, Any] = {
+            "at": datetime.utcnow().isoformat(), "purpose": purpose, "model": model, "outcome": "ok",
+            "prompt_tokens": 0, "completion_tokens": 0, "audio_seconds": 0.0, "retries": 0, "queue_ms": 0.0,
+        }
+        started = time.perf_counter()
+        try:
+            yield call
+        except BaseException as e:
+            call["outcome"] = _llm_outcome(e)
+            raise
+        finally:
+            call["queue_ms"] = round(call["queue_ms"], 1)
+            call["latency_ms"] = round(max(0.0, (time.perf_counter() - started) * 1000 - call["queue_ms"]), 1)
+            self.record(call)
+
+    def snapshot(self) -> Dict[str, Any]:
+        purposes: Dict[str, Any] = {}
+        for purpose, t in self._totals.items():
+            lat = sorted(self._latencies.get(purpose, ()))
+            purposes[purpose] = {
+                **t,
+                "cost_usd": round(t["cost_usd"], 4),
+                "audio_seconds": round(t["audio_seconds"], 1),
+                "avg_queue_ms": round(t["queue_ms_total"] / t["calls"], 1),
+                "avg_cost_usd": round(t["cost_usd"] / t["calls"], 6),
+                "latency_ms": {
+                    "window": len(lat),
+                    "p50": _percentile(lat, 0.50),
+                    "p95": _percentile(lat, 0.95),
+                    "p99": _percentile(lat, 0.99),
+                    "max": round(lat[-1], 1) if lat else 0.0,
+                },
+            }
+        return {
+            "total_cost_usd": round(sum(t["cost_usd"] for t in self._totals.values()), 4),
+            "purposes": purposes,
+        }
+
+
+llm_metrics = LLMCallMetrics(LLM_PRICES, LLM_METRICS_WINDOW)
+
+
+async def _openai_call(purpose: str, create: Callable[..., Awaitable[Any]], *, audio_seconds: float = 0.0, **kwargs: Any) -> Any:
+    """Run one OpenAI request under the purpose's bulkhead class and record its metrics.
+
+    `create` is a `with_raw_response` method so the SDK's retry count is available;
+    returns the parsed response object.
+    """
+    async with llm_metrics.track(purpose, str(kwargs.get("model", ""))) as call:
+        async with llm_bulkhead.slot(LLM_PURPOSE_CLASS[purpose]) as queue_ms:
+            call["queue_ms"] = queue_ms
+            raw = await create(**kwargs)
+        response = raw.parse()
+        call["retries"] = raw.retries_taken
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            call["prompt_tokens"] = getattr(usage, "prompt_tokens", None) or 0
+            call["completion_tokens"] = getattr(usage, "completion_tokens", None) or 0
+            # Whisper reports billed audio duration in newer API versions
+            if getattr(usage, "type", None) == "duration":
+                call["audio_seconds"] = float(getattr(usage, "seconds", 0) or 0)
+        if not call["audio_seconds"]:
+            call["audio_seconds"] = audio_seconds
+        return response
+
+
+def _llm_flight_key(model: str, messages: List[Dict[str, Any]], **params: Any) -> str:
+    """(model, whitespace-normalized prompt, params) -> stable single-flight key."""
+    normalized = [
+        {**m, "content": " ".join(m["content"].split())} if isinstance(m.get("content"), str) else m
+        for m in messages
+    ]
+    payload = json.dumps([normalized, params], sort_keys=True, default=str)
+    return f"{model}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+async def _chat_json_content(model: str, messages: List[Dict[str, Any]], temperature: float, purpose: str) -> str:
+    """JSON-mode chat completion returning the message content.
+    Identical requests already in flight share a single upstream call (and bulkhead slot)."""
+    async def _call() -> str:
+        response = await _openai_call(
+            purpose,
+            openai_client.chat.completions.with_raw_response.create,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            response_format={"type": "json_object"},
+        )
+        return response.choices[0].message.content if response.choices else ""
+
+    return await llm_single_flight.do(_llm_flight_key(model, messages, temperature=temperature), _call)
+
+
 def _extract_json_from_text(text: str) -> str:
     content = text or ""
     if "```json" in content:
@@ -905,16 +1560,354 @@ def _extract_json_from_text(text: str) -> str:
         return content.split("```", 1)[1].split("```", 1)[0].strip()
     return content.strip()
 
-async def analyze_food_image(image_base64: str) -> Dict[str, Any]:
+class ImageAnalysisCache:
+    """Content-addressed cache of analyze_food_image results.
+
+    Entries are keyed by the SHA-256 of the decoded image bytes plus a 64-bit
+    difference hash (dHash) of the picture. Exact re-uploads hit the digest map;
+    retakes of the same plate hit when their dHashes are within
+    IMAGE_CACHE_PHASH_MAX_DISTANCE bits. Eviction is LRU with a TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_distance: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        # digest -> (phash | None, stored_at, result)
+        self._entries: "OrderedDict[str, tuple[int | None, float, Dict[str, Any]]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"exact_hits": 0, "perceptual_hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _dhash(raw: bytes) -> int | None:
+        try:
+            with Image.open(io.BytesIO(raw)) as img:
+                img.draft("L", (64, 64))  # JPEG: decode at reduced scale, much cheaper than full size
+                small = img.convert("L").resize((9, 8), Image.Resampling.BILINEAR)
+            px = list(small.getdata())
+        except Exception:
+            return None
+        bits = 0
+        for row in range(8):
+            for col in range(8):
+                bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+        return bits
+
+    @classmethod
+    def fingerprint(cls, raw: bytes) -> tuple[str, int | None]:
+        """(sha256 of the image bytes, dHash). CPU-bound - call via asyncio.to_thread."""
+        return hashlib.sha256(raw).hexdigest(), cls._dhash(raw)
+
+    def get(self, digest: str, phash: int | None) -> Dict[str, Any] | None:
+        self._expire()
+        entry = self._entries.get(digest)
+        if entry is not None:
+            self._entries.move_to_end(digest)
+            self.stats["exact_hits"] += 1
+            return copy.deepcopy(entry[2])
+
+        if phash is not None and self.max_distance >= 0:
+            best_key, best_dist = None, self.max_distance + 1
+            for key, (other, _, _) in self._entries.items():
+                if other is None:
+                    continue
+                dist = bin(phash ^ other).count("1")
+                if dist < best_dist:
+                    best_key, best_dist = key, dist
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.stats["perceptual_hits"] += 1
+                return copy.deepcopy(self._entries[best_key][2])
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, digest: str, phash: int | None, result: Dict[str, Any]) -> None:
+        self._entries[digest] = (phash, time.monotonic(), copy.deepcopy(result))
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        for key in [k for k, (_, stored_at, _) in self._entries.items() if stored_at < cutoff]:
+            del self._entries[key]
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["exact_hits"] + self.stats["perceptual_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+image_analysis_cache = ImageAnalysisCache(IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_TTL_SECONDS, IMAGE_CACHE_PHASH_MAX_DISTANCE)
+
+_image_prep_stats: Dict[str, float] = {"images": 0, "bytes_in": 0, "bytes_out": 0, "total_ms": 0.0, "passthrough": 0}
+
+
+def _preprocess_image_sync(raw: bytes, max_dimension: int, quality: int) -> tuple[bytes, Dict[str, Any]]:
+    """Decode, EXIF-orient, downscale and re-encode as JPEG. Returns (jpeg bytes, report).
+    Falls back to the original bytes if they can't be decoded or wouldn't shrink."""
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"bytes_in": len(raw), "bytes_out": len(raw), "resized": False, "passthrough": True}
+    prepared = raw
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            img.draft("RGB", (max_dimension, max_dimension))  # JPEG: DCT-scaled decode, never below target
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            if max(img.size) > max_dimension:
+                img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+                report["resized"] = True
+            report["width"], report["height"] = img.size
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+        encoded = out.getvalue()
+        if len(encoded) < len(raw) or report["resized"]:
+            report["bytes_out"] = len(encoded)
+            report["passthrough"] = False
+            prepared = encoded
+    except Exception as e:
+        report["error"] = str(e)
+    report["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    report["bytes_saved"] = report["bytes_in"] - report["bytes_out"]
+    return prepared, report
+
+
+async def preprocess_image(raw: bytes, max_dimension: int = IMAGE_MAX_DIMENSION) -> bytes:
+    """Shrink an upload before a vision call, in a worker thread so the event loop never blocks."""
+    prepared, report = await asyncio.to_thread(_preprocess_image_sync, raw, max_dimension, IMAGE_JPEG_QUALITY)
+    _image_prep_stats["images"] += 1
+    _image_prep_stats["bytes_in"] += report["bytes_in"]
+    _image_prep_stats["bytes_out"] += report["bytes_out"]
+    _image_prep_stats["total_ms"] += report["ms"]
+    _image_prep_stats["passthrough"] += int(report["passthrough"])
+    logger.info(
+        f"[IMAGE_PREP] in={report['bytes_in']}B out={report['bytes_out']}B saved={report['bytes_saved']}B "
+        f"resized={report['resized']} ms={report['ms']}"
+    )
+    return prepared
+
+
+def _decode_base64_image(image_base64: str) -> bytes:
+    try:
+        return base64.b64decode(_normalize_base64_image(image_base64), validate=False)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid base64 image")
+
+
+def _image_data_url(jpeg: bytes) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('ascii')}"
+
+
+# ===== Meal image blob store =====
+
+_blob_stats: Dict[str, int] = {"puts": 0, "deduplicated": 0, "bytes_written": 0, "thumbnails": 0, "reads": 0, "backfilled": 0}
+_BLOB_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore(ABC):
+    """Content-addressed, write-once blob storage. Keys are the sha256 hex of the bytes;
+    derived variants (e.g. thumbnails) are stored alongside their source blob."""
+
+    @abstractmethod
+    async def put(self, data: bytes) -> str:
+        ...
+
+    @abstractmethod
+    async def put_variant(self, key: str, variant: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, key: str, variant: str | None = None) -> bytes | None:
+        ...
+
+
+class LocalBlobStore(BlobStore):
+    """Filesystem backend for dev and tests: <root>/<k[:2]>/<k[2:4]>/<k>[.<variant>].
+    Writes go to a temp file and are renamed into place, so readers never see partial blobs."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str, variant: str | None = None) -> Path:
+        if not _BLOB_KEY_RE.match(key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return self.root / key[:2] / key[2:4] / (f"{key}.{variant}" if variant else key)
+
+    def _write_sync(self, path: Path, data: bytes) -> bool:
+        if path.exists():
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return True
+
+    async def put(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        written = await asyncio.to_thread(self._write_sync, self._path(key), data)
+        _blob_stats["puts"] += 1
+        if written:
+            _blob_stats["bytes_written"] += len(data)
+        else:
+            _blob_stats["deduplicated"] += 1
+        return key
+
+    async def put_variant(self, key: str, variant: str, data: bytes) -> None:
+        if await asyncio.to_thread(self._write_sync, self._path(key, variant), data):
+            _blob_stats["bytes_written"] += len(data)
+
+    async def get(self, key: str, variant: str | None = None) -> bytes | None:
+        path = self._path(key, variant)
+        try:
+            data = await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            return None
+        _blob_stats["reads"] += 1
+        return data
+
+
+def _create_blob_store() -> BlobStore:
+    if BLOB_STORE_BACKEND == "local":
+        return LocalBlobStore(BLOB_STORE_DIR)
+    raise RuntimeError(f"Unsupported BLOB_STORE_BACKEND: {BLOB_STORE_BACKEND}")
+
+
+blob_store = _create_blob_store()
+
+
+def _image_mime(data: bytes) -> str:
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return "application/octet-stream"
+
+
+def _thumbnail_sync(raw: bytes, size: int) -> bytes | None:
+    """EXIF-oriented JPEG thumbnail fitting size x size, or None if raw isn't a decodable image."""
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            img.draft("RGB", (size, size))
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=75, optimize=True)
+        return out.getvalue()
+    except Exception:
+        return None
+
+
+async def _store_meal_image(raw: bytes) -> str:
+    """Store a meal photo and its thumbnail; returns the blob key (sha256)."""
+    key = await blob_store.put(raw)
+    thumb = await asyncio.to_thread(_thumbnail_sync, raw, MEAL_THUMBNAIL_SIZE)
+    if thumb is not None:
+        await blob_store.put_variant(key, "thumb", thumb)
+        _blob_stats["thumbnails"] += 1
+    return key
+
+
+async def _store_meal_image_base64(image_base64: str | None) -> str | None:
+    if not image_base64:
+        return None
+    return await _store_meal_image(_decode_base64_image(image_base64))
+
+
+async def analyze_food_image(image_base64: str, presence_gate: bool = False) -> Dict[str, Any]:
     """Analyze food image using OpenAI Vision API"""
+    return await analyze_food_image_bytes(_decode_base64_image(image_base64), presence_gate)
+
+
+async def analyze_food_image_bytes(raw: bytes, presence_gate: bool = False) -> Dict[str, Any]:
+    """Analyze raw image bytes; near-duplicate uploads are served from image_analysis_cache.
+    With presence_gate, a confidently non-food photo fails fast with 400 (see _analyze_with_presence_gate)."""
+    digest, phash = await asyncio.to_thread(ImageAnalysisCache.fingerprint, raw)
+
+    cached = image_analysis_cache.get(digest, phash)
+    if cached is not None:
+        logger.info(f"[IMAGE_CACHE] Hit for digest={digest[:12]}")
+        return cached
+
+    if presence_gate:
+        result = await _analyze_with_presence_gate(raw)
+    else:
+        result = await _analyze_food_image_uncached(await preprocess_image(raw))
+    if "error" not in result:
+        image_analysis_cache.put(digest, phash, result)
+    return result
+
+
+_presence_gate_stats: Dict[str, int] = {"runs": 0, "rejected": 0, "analysis_cancelled": 0, "analysis_first": 0}
+
+
+async def _analyze_with_presence_gate(raw: bytes) -> Dict[str, Any]:
+    """Start the cheap presence check and the full analysis together.
+
+    If presence reports no food with confidence >= PHOTO_PRESENCE_REJECT_CONFIDENCE
+    before the full analysis finishes, the full call is cancelled and 400 is raised.
+    Food photos wait no longer than the full analysis alone.
+    """
+    _presence_gate_stats["runs"] += 1
+
+    async def _full() -> Dict[str, Any]:
+        return await _analyze_food_image_uncached(await preprocess_image(raw))
+
+    full_task = asyncio.create_task(_full())
+    presence_task = asyncio.create_task(detect_food_presence_bytes(raw))
+    try:
+        done, _ = await asyncio.wait({full_task, presence_task}, return_when=asyncio.FIRST_COMPLETED)
+        if full_task in done:
+            _presence_gate_stats["analysis_first"] += 1
+            return full_task.result()
+
+        if presence_task.exception() is not None:
+            return await full_task
+        presence = presence_task.result()
+        if not presence.has_food and presence.confidence >= PHOTO_PRESENCE_REJECT_CONFIDENCE:
+            full_task.cancel()
+            _presence_gate_stats["rejected"] += 1
+            _presence_gate_stats["analysis_cancelled"] += 1
+            logger.info(f"[PRESENCE_GATE] Rejected photo (confidence={presence.confidence}, reason={presence.reason})")
+            raise HTTPException(
+                status_code=400,
+                detail=f"No food detected in photo. {presence.reason}".strip(),
+            )
+        return await full_task
+    finally:
+        for task in (full_task, presence_task):
+            if not task.done():
+                task.cancel()
+
+
+async def _analyze_food_image_uncached(jpeg: bytes) -> Dict[str, Any]:
     try:
         if openai_client is None:
             raise RuntimeError("OPENAI_API_KEY is not set")
 
-        normalized_image_base64 = _normalize_base64_image(image_base64)
-        image_url = f"data:image/jpeg;base64,{normalized_image_base64}"
+        image_url = _image_data_url(jpeg)
 
-        response = await openai_client.chat.completions.create(
+        response = await _openai_call(
+            "vision_analysis",
+            openai_client.chat.completions.with_raw_response.create,
             model=OPENAI_MODEL,
             messages=[
                 {
@@ -953,9 +1946,6 @@ async def analyze_food_image(image_base64: str) -> Dict[str, Any]:
             response_format={"type": "json_object"},
         )
 
-        # Debug: log the raw response
-        logger.info(f"Raw LLM response: {response}")
-
         content = response.choices[0].message.content if response.choices else ""
         extracted = _extract_json_from_text(content)
 
@@ -963,6 +1953,8 @@ async def analyze_food_image(image_base64: str) -> Dict[str, Any]:
 
         result = json.loads(extracted)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error analyzing image: {str(e)}")
         return {
@@ -974,14 +1966,20 @@ async def analyze_food_image(image_base64: str) -> Dict[str, Any]:
 
 
 async def detect_food_presence(image_base64: str) -> FoodPresenceResponse:
+    return await detect_food_presence_bytes(_decode_base64_image(image_base64))
+
+
+async def detect_food_presence_bytes(raw: bytes) -> FoodPresenceResponse:
     try:
         if openai_client is None:
             raise RuntimeError("OPENAI_API_KEY is not set")
 
-        normalized_image_base64 = _normalize_base64_image(image_base64)
-        image_url = f"data:image/jpeg;base64,{normalized_image_base64}"
+        # A yes/no classifier doesn't need full resolution
+        image_url = _image_data_url(await preprocess_image(raw, max_dimension=512))
 
-        response = await openai_client.chat.completions.create(
+        response = await _openai_call(
+            "presence_check",
+            openai_client.chat.completions.with_raw_response.create,
             model=OPENAI_CHEAP_MODEL,
             messages=[
                 {
@@ -1012,11 +2010,24 @@ async def detect_food_presence(image_base64: str) -> FoodPresenceResponse:
             confidence=float(parsed.get("confidence", 0.0) or 0.0),
             reason=str(parsed.get("reason", "") or ""),
         )
+    except HTTPException:
+        # Shed by the LLM bulkhead: /meals/has-food answers 503; the gate just skips the check
+        raise
     except Exception as e:
         logger.error(f"Error detecting food presence: {str(e)}")
         # Don't block the main photo analysis flow if the cheap check fails.
         return FoodPresenceResponse(has_food=True, confidence=0.0, reason="presence_check_failed")
 
+# Serving words shared by _normalize_food_name and the local voice parser
+_SERVING_UNITS = ("bowl", "plate", "cup", "glass", "piece", "slice", "serving", "portion", "helping")
+_SERVING_SIZES = ("small", "medium", "large", "big")
+_SERVING_PATTERNS = [
+    rf'\b({"|".join(_SERVING_UNITS)})\s+of\s+',
+    rf'\b(a|an|one|two|three)\s+({"|".join(_SERVING_UNITS[:6])})\s+of\s+',
+    rf'\b({"|".join(_SERVING_SIZES)})\s+({"|".join(_SERVING_UNITS[:6])})\s+of\s+',
+]
+
+
 def _normalize_food_name(name: str) -> str:
     """Normalize food name by removing serving size indicators and common prefixes.
     Examples:
@@ -1028,15 +2039,7 @@ def _normalize_food_name(name: str) -> str:
     """
     normalized = name.lower().strip()
     
-    # Common serving size patterns to remove
-    serving_patterns = [
-        r'\b(bowl|plate|cup|glass|piece|slice|serving|portion|helping)\s+of\s+',
-        r'\b(a|an|one|two|three)\s+(bowl|plate|cup|glass|piece|slice)\s+of\s+',
-        r'\b(small|medium|large|big)\s+(bowl|plate|cup|glass|piece|slice)\s+of\s+',
-    ]
-    
-    import re
-    for pattern in serving_patterns:
+    for pattern in _SERVING_PATTERNS:
         normalized = re.sub(pattern, '', normalized, flags=re.IGNORECASE)
     
     # Remove leading/trailing articles
@@ -1048,39 +2051,51 @@ def _normalize_food_name(name: str) -> str:
     return normalized
 
 
-async def _validate_and_estimate_food(query: str) -> Dict[str, Any]:
-    """Use AI to validate if query is a food item and estimate its nutrition per 100g.
-    Returns: {
-        "is_food": bool,
-        "reason": str,
-        "calories_per_100g": float,
-        "protein_per_100g": float,
-        "carbs_per_100g": float,
-        "fat_per_100g": float
+def _default_food_estimate(reason: str) -> Dict[str, Any]:
+    return {
+        "is_food": True,
+        "reason": reason,
+        "calories_per_100g": 0.0,
+        "protein_per_100g": 0.0,
+        "carbs_per_100g": 0.0,
+        "fat_per_100g": 0.0,
     }
-    """
-    if openai_client is None:
-        logger.warning("OpenAI client not available, using defaults")
-        return {
-            "is_food": True,
-            "reason": "AI unavailable",
-            "calories_per_100g": 0.0,
-            "protein_per_100g": 0.0,
-            "carbs_per_100g": 0.0,
-            "fat_per_100g": 0.0,
-        }
-    
-    try:
-        response = await openai_client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a nutrition expert. Validate if the text is a food item and provide estimated nutrition per 100g. Be VERY lenient - only reject obvious non-food items like electronics, furniture, or body parts. For valid foods, provide reasonable estimates based on typical values. Return JSON only.",
-                },
-                {
-                    "role": "user",
-                    "content": f'''Is "{query}" a food, beverage, ingredient, or edible item? If yes, estimate its nutrition per 100g.
+
+
+_FOOD_VALIDATION_SYSTEM_PROMPT = "You are a nutrition expert. Validate if the text is a food item and provide estimated nutrition per 100g. Be VERY lenient - only reject obvious non-food items like electronics, furniture, or body parts. For valid foods, provide reasonable estimates based on typical values. Return JSON only."
+
+_validation_batch_stats: Dict[str, int] = {
+    "batches": 0,
+    "batched_items": 0,
+    "item_fallbacks": 0,
+    "malformed_batches": 0,
+    "batch_failures": 0,
+}
+
+
+def _estimate_from_json(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "is_food": bool(parsed.get("is_food", False)),
+        "reason": str(parsed.get("reason", "")),
+        "calories_per_100g": float(parsed.get("calories_per_100g", 0) or 0),
+        "protein_per_100g": float(parsed.get("protein_per_100g", 0) or 0),
+        "carbs_per_100g": float(parsed.get("carbs_per_100g", 0) or 0),
+        "fat_per_100g": float(parsed.get("fat_per_100g", 0) or 0),
+    }
+
+
+async def _ai_validate_food(query: str) -> Dict[str, Any]:
+    """Ask the model whether query is a food and for its nutrition per 100g. Raises on failure."""
+    content = await _chat_json_content(
+        OPENAI_MODEL,
+        [
+            {
+                "role": "system",
+                "content": _FOOD_VALIDATION_SYSTEM_PROMPT,
+            },
+            {
+                "role": "user",
+                "content": f'''Is "{query}" a food, beverage, ingredient, or edible item? If yes, estimate its nutrition per 100g.
 
 Examples of valid foods: egg, boiled egg, chicken, rice, apple, water, milk, bread, pasta, etc.
 
@@ -1096,154 +2111,629 @@ Return ONLY JSON in this exact format:
 
 For non-food items, set all nutrition values to 0.
 For foods, provide reasonable estimates (e.g., boiled egg: ~155 cal, 13g protein, 1g carbs, 11g fat per 100g).''',
-                },
-            ],
-            temperature=0,
-            response_format={"type": "json_object"},
-        )
-        
-        content = response.choices[0].message.content if response.choices else ""
-        extracted = _extract_json_from_text(content)
-        parsed = json.loads(extracted)
-        
-        result = {
-            "is_food": bool(parsed.get("is_food", False)),
-            "reason": str(parsed.get("reason", "")),
-            "calories_per_100g": float(parsed.get("calories_per_100g", 0) or 0),
-            "protein_per_100g": float(parsed.get("protein_per_100g", 0) or 0),
-            "carbs_per_100g": float(parsed.get("carbs_per_100g", 0) or 0),
-            "fat_per_100g": float(parsed.get("fat_per_100g", 0) or 0),
-        }
-        
-        logger.info(f"[FOOD_VALIDATION] query='{query}', is_food={result['is_food']}, cal={result['calories_per_100g']}, reason={result['reason']}")
-        return result
-        
-    except Exception as e:
-        logger.error(f"[FOOD_VALIDATION] Error validating '{query}': {str(e)}")
-        return {
-            "is_food": True,
-            "reason": "Error during validation",
-            "calories_per_100g": 0.0,
-            "protein_per_100g": 0.0,
-            "carbs_per_100g": 0.0,
-            "fat_per_100g": 0.0,
-        }
+            },
+        ],
+        temperature=0,
+        purpose="validation",
+    )
 
-def match_food_to_database(name: str, quantity_grams: float) -> Dict[str, Any]:
-    raise RuntimeError("match_food_to_database() should not be used. Use match_food_to_database_db().")
+    extracted = _extract_json_from_text(content)
+    parsed = json.loads(extracted)
 
+    result = _estimate_from_json(parsed)
 
-async def match_food_to_database_db(conn: asyncpg.Connection, name: str, quantity_grams: float) -> Dict[str, Any]:
-    """Match food name to database food entry and scale to quantity.
-    If not found, creates a placeholder food and enqueues it for async enrichment."""
-    # Normalize the name to remove serving size indicators (bowl of rice -> rice)
-    original_name = (name or "").strip()
-    normalized_name = _normalize_food_name(original_name)
-    
-    logger.info(f"[FOOD_MATCH] original='{original_name}', normalized='{normalized_name}'")
-    
-    # Try exact match first with normalized name
-    row = await conn.fetchrow(
+    logger.info(f"[FOOD_VALIDATION] query='{query}', is_food={result['is_food']}, cal={result['calories_per_100g']}, reason={result['reason']}")
+    return result
+
+
+async def _ai_validate_foods_batch(queries: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Validate several names in one model call. Returns estimates keyed by
+    _estimate_cache_key(query); names the model skipped or answered malformed are
+    left out so the caller can retry them one by one. Raises if the call itself fails."""
+    content = await _chat_json_content(
+        OPENAI_MODEL,
+        [
+            {
+                "role": "system",
+                "content": _FOOD_VALIDATION_SYSTEM_PROMPT,
+            },
+            {
+                "role": "user",
+                "content": f'''For each text in this JSON array, decide if it is a food, beverage, ingredient, or edible item, and if yes estimate its nutrition per 100g:
+{json.dumps(queries, ensure_ascii=False)}
+
+Examples of valid foods: egg, boiled egg, chicken, rice, apple, water, milk, bread, pasta, etc.
+
+Return ONLY JSON in this exact format, with one entry per input text and "query" copied exactly from the input:
+{{
+  "foods": [
+    {{
+      "query": "<input text>",
+      "is_food": true/false,
+      "reason": "brief explanation",
+      "calories_per_100g": <number>,
+      "protein_per_100g": <number>,
+      "carbs_per_100g": <number>,
+      "fat_per_100g": <number>
+    }}
+  ]
+}}
+
+For non-food items, set all nutrition values to 0.
+For foods, provide reasonable estimates (e.g., boiled egg: ~155 cal, 13g protein, 1g carbs, 11g fat per 100g).''',
+            },
+        ],
+        temperature=0,
+        purpose="validation",
+    )
+
+    parsed = json.loads(_extract_json_from_text(content))
+    items = parsed.get("foods") if isinstance(parsed, dict) else None
+    wanted = {_estimate_cache_key(q) for q in queries}
+    out: Dict[str, Dict[str, Any]] = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or "is_food" not in item:
+            continue
+        key = _estimate_cache_key(str(item.get("query", "")))
+        if key not in wanted or key in out:
+            continue
+        try:
+            out[key] = _estimate_from_json(item)
+        except (TypeError, ValueError):
+            continue
+
+    logger.info(f"[FOOD_VALIDATION] Batch of {len(queries)}: answered {len(out)}, foods={[k for k, v in out.items() if v['is_food']]}")
+    return out
+
+
+# ===== AI estimate cache (positive + negative, LRU in front of food_estimate_cache) =====
+
+_estimate_lru: "LRUCache[str, tuple[float, Dict[str, Any]]]" = LRUCache(maxsize=FOOD_ESTIMATE_LRU_SIZE)
+_estimate_cache_stats: Dict[str, int] = {"lru_hits": 0, "db_hits": 0, "misses": 0, "stored": 0}
+
+
+def _estimate_cache_key(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+def _estimate_ttl(result: Dict[str, Any]) -> timedelta:
+    return timedelta(days=FOOD_ESTIMATE_TTL_DAYS if result["is_food"] else FOOD_ESTIMATE_NEGATIVE_TTL_DAYS)
+
+
+def _estimate_cache_get_local(key: str) -> Dict[str, Any] | None:
+    entry = _estimate_lru.get(key)
+    if entry is None:
+        return None
+    expires_at, result = entry
+    if expires_at <= time.time():
+        _estimate_lru.pop(key, None)
+        return None
+    return dict(result)
+
+
+def _estimate_cache_put_local(key: str, result: Dict[str, Any], expires_at: datetime) -> None:
+    _estimate_lru[key] = (expires_at.timestamp(), dict(result))
+
+
+async def _estimate_cache_load(conn: asyncpg.Connection, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    rows = await conn.fetch(
         """
-        SELECT id, name, category,
+        SELECT query_key, is_food, reason,
                calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
-               is_vegetarian
-        FROM foods
-        WHERE lower(name) = lower($1)
-        LIMIT 1
+               expires_at
+        FROM food_estimate_cache
+        WHERE query_key = ANY($1::text[]) AND expires_at > now()
         """,
-        normalized_name,
+        keys,
     )
-    
-    # If no exact match, try fuzzy match
-    if not row:
-        logger.info(f"[FOOD_MATCH] No exact match, trying fuzzy search")
-        row = await conn.fetchrow(
-            """
-            SELECT id, name, category,
-                   calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
-                   is_vegetarian
-            FROM foods
-            WHERE lower(name) LIKE '%' || lower($1) || '%'
-            ORDER BY length(name) ASC
-            LIMIT 1
-            """,
-            normalized_name,
-        )
-    
-    if row:
-        logger.info(f"[FOOD_MATCH] Found existing food: '{row['name']}' (id={row['id']})")
+    out: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        result = {
+            "is_food": bool(r["is_food"]),
+            "reason": r["reason"] or "",
+            "calories_per_100g": float(r["calories_per_100g"] or 0),
+            "protein_per_100g": float(r["protein_per_100g"] or 0),
+            "carbs_per_100g": float(r["carbs_per_100g"] or 0),
+            "fat_per_100g": float(r["fat_per_100g"] or 0),
+        }
+        out[r["query_key"]] = result
+        _estimate_cache_put_local(r["query_key"], result, r["expires_at"])
+    return out
 
-    if not row:
-        # AI validation + nutrition estimation
-        ai_result = await _validate_and_estimate_food(normalized_name)
-        
-        if not ai_result["is_food"]:
-            logger.warning(f"[FOOD_MATCH] AI validation rejected: '{normalized_name}' - {ai_result['reason']}")
-            raise HTTPException(
-                status_code=400, 
-                detail=f"'{normalized_name}' does not appear to be a food item. {ai_result['reason']}"
-            )
-        
-        # Create placeholder food with AI-estimated nutrition
-        logger.info(f"[FOOD_MATCH] Creating placeholder with AI estimates: '{normalized_name}' (cal={ai_result['calories_per_100g']})")
-        food_id = uuid.uuid4()
-        
-        await conn.execute(
-            """
-            INSERT INTO foods (
-                id, name, category,
-                calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
-                is_vegetarian, source, verified, review_status, last_used_at
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, now())
-            """,
-            food_id,
-            normalized_name,
-            "user",  # category
-            ai_result["calories_per_100g"],  # AI-estimated calories
-            ai_result["protein_per_100g"],   # AI-estimated protein
-            ai_result["carbs_per_100g"],     # AI-estimated carbs
-            ai_result["fat_per_100g"],       # AI-estimated fat
-            True,  # is_vegetarian (default)
-            "user",  # source
-            False,  # verified (will be updated by USDA sync)
-            "pending_review",  # review_status - needs user confirmation
+
+async def _estimate_cache_store(conn: asyncpg.Connection, entries: Dict[str, Dict[str, Any]]) -> None:
+    keys = list(entries)
+    now = datetime.now(timezone.utc)
+    expires = [now + _estimate_ttl(entries[k]) for k in keys]
+    await conn.execute(
+        """
+        INSERT INTO food_estimate_cache (
+            query_key, is_food, reason,
+            calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
+            model, expires_at
         )
-        
-        # Enqueue for async enrichment (will process after user confirms)
-        await conn.execute(
-            """
-            INSERT INTO foods_ingestion_queue (food_id, query, status)
-            VALUES ($1, $2, 'pending')
-            ON CONFLICT (food_id) DO NOTHING
-            """,
-            food_id,
-            normalized_name,  # Use normalized name for USDA search
+        SELECT * FROM unnest(
+            $1::text[], $2::bool[], $3::text[],
+            $4::float8[], $5::float8[], $6::float8[], $7::float8[],
+            $8::text[], $9::timestamptz[]
         )
-        
-        logger.info(f"[FOOD_MATCH] Created pending placeholder food_id={food_id}, awaiting user review")
-        
-        # Return placeholder with AI-estimated nutrition and needs_review flag
-        qty = float(quantity_grams or 0)
-        multiplier = qty / 100.0
-        return {
-            "food_id": str(food_id),
-            "name": normalized_name,
-            "quantity": qty,
-            "calories": round(ai_result["calories_per_100g"] * multiplier, 2),
-            "protein": round(ai_result["protein_per_100g"] * multiplier, 2),
-            "carbs": round(ai_result["carbs_per_100g"] * multiplier, 2),
-            "fat": round(ai_result["fat_per_100g"] * multiplier, 2),
-            "calories_per_100g": ai_result["calories_per_100g"],
-            "protein_per_100g": ai_result["protein_per_100g"],
-            "carbs_per_100g": ai_result["carbs_per_100g"],
-            "fat_per_100g": ai_result["fat_per_100g"],
-            "matched": False,
-            "needs_review": True,  # Frontend should show review modal
-            "is_estimated": True,  # Flag for frontend to show "estimated" label
+        ON CONFLICT (query_key) DO UPDATE SET
+            is_food = EXCLUDED.is_food,
+            reason = EXCLUDED.reason,
+            calories_per_100g = EXCLUDED.calories_per_100g,
+            protein_per_100g = EXCLUDED.protein_per_100g,
+            carbs_per_100g = EXCLUDED.carbs_per_100g,
+            fat_per_100g = EXCLUDED.fat_per_100g,
+            model = EXCLUDED.model,
+            created_at = now(),
+            expires_at = EXCLUDED.expires_at
+        """,
+        keys,
+        [entries[k]["is_food"] for k in keys],
+        [entries[k]["reason"] for k in keys],
+        [entries[k]["calories_per_100g"] for k in keys],
+        [entries[k]["protein_per_100g"] for k in keys],
+        [entries[k]["carbs_per_100g"] for k in keys],
+        [entries[k]["fat_per_100g"] for k in keys],
+        [OPENAI_MODEL] * len(keys),
+        expires,
+    )
+    for k, exp in zip(keys, expires):
+        _estimate_cache_put_local(k, entries[k], exp)
+    _estimate_cache_stats["stored"] += len(keys)
+
+
+async def _validate_foods_concurrently(names: List[str], conn: asyncpg.Connection | None = None) -> List[Dict[str, Any]]:
+    """Validate several names: LRU, then one food_estimate_cache read, then the model for
+    the rest, FOOD_VALIDATION_BATCH_SIZE names per call with at most
+    FOOD_VALIDATION_CONCURRENCY calls in flight per request. Names a batch answered
+    malformed or not at all are retried individually; a batch whose call failed upstream
+    (rate limit, timeout, API error) falls back to defaults without fanning out more calls.
+    New answers are written back in one upsert. Results keep input order."""
+    if not names:
+        return []
+
+    keys = [_estimate_cache_key(n) for n in names]
+    resolved: Dict[str, Dict[str, Any]] = {}
+    for k in keys:
+        if k not in resolved and (hit := _estimate_cache_get_local(k)) is not None:
+            resolved[k] = hit
+            _estimate_cache_stats["lru_hits"] += 1
+
+    pending = list(dict.fromkeys(k for k in keys if k not in resolved))
+    if pending:
+        try:
+            if conn is not None:
+                db_hits = await _estimate_cache_load(conn, pending)
+            else:
+                async with _require_pool().acquire() as c:
+                    db_hits = await _estimate_cache_load(c, pending)
+            resolved.update(db_hits)
+            _estimate_cache_stats["db_hits"] += len(db_hits)
+        except Exception as e:
+            logger.warning(f"[FOOD_VALIDATION] Estimate cache read failed: {str(e)}")
+
+    to_ask = {k: names[keys.index(k)] for k in pending if k not in resolved}
+    if to_ask:
+        _estimate_cache_stats["misses"] += len(to_ask)
+        if openai_client is None:
+            logger.warning("OpenAI client not available, using defaults")
+            for k in to_ask:
+                resolved[k] = _default_food_estimate("AI unavailable")
+        else:
+            sem = asyncio.Semaphore(max(1, FOOD_VALIDATION_CONCURRENCY))
+
+            async def _one(q: str) -> Dict[str, Any] | None:
+                async with sem:
+                    try:
+                        return await _ai_validate_food(q)
+                    except HTTPException:
+                        # Bulkhead shedding (503 + Retry-After) must reach the client, not become a placeholder
+                        raise
+                    except Exception as e:
+                        logger.error(f"[FOOD_VALIDATION] Error validating '{q}': {str(e)}")
+                        return None
+
+            async def _batch(chunk: Dict[str, str]) -> Dict[str, Dict[str, Any] | None]:
+                if len(chunk) == 1:
+                    ((k, q),) = chunk.items()
+                    return {k: await _one(q)}
+                async with sem:
+                    try:
+                        answered: Dict[str, Dict[str, Any] | None] = dict(await _ai_validate_foods_batch(list(chunk.values())))
+                        _validation_batch_stats["batches"] += 1
+                        _validation_batch_stats["batched_items"] += len(answered)
+                    except HTTPException:
+                        raise
+                    except ValueError as e:
+                        # The model answered but not with parseable JSON
+                        _validation_batch_stats["malformed_batches"] += 1
+                        logger.error(f"[FOOD_VALIDATION] Batch of {len(chunk)} answered malformed, validating individually: {str(e)}")
+                        answered = {}
+                    except Exception as e:
+                        # Upstream trouble: one call per item would only add load to it
+                        _validation_batch_stats["batch_failures"] += 1
+                        logger.error(f"[FOOD_VALIDATION] Batch of {len(chunk)} failed, using defaults: {str(e)}")
+                        return dict.fromkeys(chunk)
+                # Anything the batch did not answer cleanly is asked on its own
+                missing = [k for k in chunk if k not in answered]
+                if missing:
+                    _validation_batch_stats["item_fallbacks"] += len(missing)
+                    for k, answer in zip(missing, await asyncio.gather(*(_one(chunk[k]) for k in missing))):
+                        answered[k] = answer
+                return answered
+
+            items = list(to_ask.items())
+            size = max(1, FOOD_VALIDATION_BATCH_SIZE)
+            started = time.perf_counter()
+            chunks = await asyncio.gather(*(_batch(dict(items[i:i + size])) for i in range(0, len(items), size)))
+            by_key = {k: v for chunk in chunks for k, v in chunk.items()}
+            answers = [by_key.get(k) for k in to_ask]
+            if len(to_ask) > 1:
+                logger.info(f"[FOOD_VALIDATION] Validated {len(to_ask)} foods in {len(chunks)} batch(es) in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+            fresh: Dict[str, Dict[str, Any]] = {}
+            for k, answer in zip(to_ask, answers):
+                if answer is None:
+                    # Failures fall back to defaults and are not cached
+                    resolved[k] = _default_food_estimate("Error during validation")
+                else:
+                    resolved[k] = fresh[k] = answer
+
+            if fresh:
+                try:
+                    if conn is not None:
+                        await _estimate_cache_store(conn, fresh)
+                    else:
+                        async with _require_pool().acquire() as c:
+                            await _estimate_cache_store(c, fresh)
+                except Exception as e:
+                    logger.warning(f"[FOOD_VALIDATION] Estimate cache write failed: {str(e)}")
+
+    return [dict(resolved[k]) for k in keys]
+
+class FoodNameIndex:
+    """In-process lower(name) -> food index used by match_foods_to_database_batch.
+
+    Exact lookups are a dict hit. Substring lookups mirror the old
+    `LIKE '%name%' ORDER BY length(name)` query: names are packed into one
+    NUL-separated string sorted by length, so the first `str.find` hit is the
+    shortest containing name. Names added since the last pack live in a small
+    delta list that is scanned linearly until the next rebuild.
+    """
+
+    COLUMNS = (
+        "id, name, category, calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g, "
+        "is_vegetarian, updated_at"
+    )
+    DELTA_REBUILD_THRESHOLD = 1000
+
+    def __init__(self):
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._name_by_id: Dict[str, str] = {}
+        self._blob = ""
+        self._starts: List[int] = []
+        self._blob_names: List[str] = []
+        self._delta: List[str] = []
+        self._watermark: datetime | None = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def upsert(self, row: Any) -> None:
+        food_id = str(row["id"])
+        key = str(row["name"] or "").strip().lower()
+        old_key = self._name_by_id.get(food_id)
+        if old_key is not None and old_key != key:
+            self.remove(food_id)
+        if not key:
+            return
+
+        existing = self._by_name.get(key)
+        if existing is not None and existing["id"] != food_id:
+            # Several foods can share a name; keep the first one like `LIMIT 1` would
+            return
+
+        self._by_name[key] = {
+            "id": food_id,
+            "name": row["name"],
+            "category": row["category"],
+            "calories_per_100g": float(row["calories_per_100g"] or 0),
+            "protein_per_100g": float(row["protein_per_100g"] or 0),
+            "carbs_per_100g": float(row["carbs_per_100g"] or 0),
+            "fat_per_100g": float(row["fat_per_100g"] or 0),
+            "is_vegetarian": bool(row["is_vegetarian"]),
         }
-    
-    # Found in DB - return scaled values
+        self._name_by_id[food_id] = key
+        if existing is None:
+            self._delta.append(key)
+
+    def remove(self, food_id: str) -> None:
+        key = self._name_by_id.pop(str(food_id), None)
+        if key is not None and self._by_name.get(key, {}).get("id") == str(food_id):
+            # Stale copies in the packed blob / delta are skipped at lookup time
+            del self._by_name[key]
+
+    def exact(self, name: str) -> Dict[str, Any] | None:
+        return self._by_name.get((name or "").strip().lower())
+
+    def lookup(self, name: str) -> Dict[str, Any] | None:
+        term = (name or "").strip().lower()
+        if not term:
+            return None
+        hit = self._by_name.get(term)
+        if hit is not None:
+            return hit
+        return self._lookup_substring(term)
+
+    def _lookup_substring(self, term: str) -> Dict[str, Any] | None:
+        best: str | None = None
+        pos = self._blob.find(term)
+        while pos != -1:
+            key = self._blob_names[bisect.bisect_right(self._starts, pos) - 1]
+            if key in self._by_name:
+                best = key
+                break
+            pos = self._blob.find(term, pos + 1)
+
+        for key in self._delta:
+            if term in key and key in self._by_name and (best is None or len(key) < len(best)):
+                best = key
+
+        return self._by_name[best] if best is not None else None
+
+    def _pack(self, names: List[str]) -> tuple[str, List[int], List[str]]:
+        names = sorted(names, key=lambda n: (len(n), n))
+        starts: List[int] = []
+        offset = 0
+        for n in names:
+            starts.append(offset)
+            offset += len(n) + 1
+        return "\x00".join(names), starts, names
+
+    async def rebuild(self) -> None:
+        """Re-pack all names off the event loop and clear the delta it now covers."""
+        delta_len = len(self._delta)
+        blob, starts, names = await asyncio.to_thread(self._pack, list(self._by_name))
+        self._blob, self._starts, self._blob_names = blob, starts, names
+        self._delta = self._delta[delta_len:]
+
+    async def load(self, conn: asyncpg.Connection) -> None:
+        started = time.perf_counter()
+        rows = await conn.fetch(f"SELECT {self.COLUMNS} FROM foods")
+        self._by_name.clear()
+        self._name_by_id.clear()
+        self._delta.clear()
+        for r in rows:
+            self._track_watermark(r["updated_at"])
+            self.upsert(r)
+        await self.rebuild()
+        self.ready = True
+        logger.info(f"[FOOD_INDEX] Loaded {len(self)} names in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    async def refresh(self, conn: asyncpg.Connection) -> int:
+        """Apply rows inserted/updated since the last load or refresh (covers other workers' writes)."""
+        if not self.ready:
+            await self.load(conn)
+            return len(self)
+        # Overlap the window: updated_at is the writer's transaction start, not its commit time
+        since = (self._watermark or datetime.fromtimestamp(0, timezone.utc)) - timedelta(seconds=60)
+        rows = await conn.fetch(f"SELECT {self.COLUMNS} FROM foods WHERE updated_at >= $1", since)
+        for r in rows:
+            self._track_watermark(r["updated_at"])
+            self.upsert(r)
+        if len(self._delta) >= self.DELTA_REBUILD_THRESHOLD:
+            await self.rebuild()
+        return len(rows)
+
+    def _track_watermark(self, ts: datetime | None) -> None:
+        if ts is not None and (self._watermark is None or ts > self._watermark):
+            self._watermark = ts
+
+
+food_name_index = FoodNameIndex()
+
+
+async def _food_name_index_loop():
+    """Load the food name index once, then keep it fresh incrementally."""
+    while True:
+        try:
+            pool = _require_pool()
+            async with pool.acquire() as conn:
+                await food_name_index.refresh(conn)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[FOOD_INDEX] Refresh failed: {str(e)}")
+        await asyncio.sleep(FOOD_NAME_INDEX_REFRESH_SECONDS)
+
+
+class FoodPortionTable:
+    """In-process (food_id, unit) -> median confirmed grams, mirrored from food_portion_stats.
+
+    Each refresh first samples the next batch of finalized meals after a (finalized_at, id)
+    cursor (one worker at a time, via an advisory lock), re-aggregates only the (food_id, unit)
+    keys that got new samples, then pulls stats rows updated since this worker's last refresh.
+
+    Clients currently only send mass displayUnits (g/oz), so in practice only 'serving' rows
+    fill in; per-unit rows (bowl, piece, ...) appear once a client logs portion units.
+    """
+
+    # displayUnit values that are already grams (or a fixed conversion), not a portion unit
+    MASS_UNITS = ("", "g", "gm", "gms", "gram", "grams", "kg", "oz", "ml", "l")
+    BATCH_MEALS = 5000
+    # finalized_at is the writer's transaction start, not its commit time; meals younger than
+    # this may still be uncommitted, so the cursor never passes them
+    SETTLE_SECONDS = 60.0
+    _NUMERIC = r"^[0-9]+(\.[0-9]+)?$"
+    _UUID = r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+
+    def __init__(self):
+        self._grams: Dict[tuple[str, str], tuple[float, int]] = {}
+        self._watermark: datetime | None = None
+        self._scanned_to: tuple[datetime, uuid.UUID] | None = None
+        self.samples_ingested = 0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def grams(self, food_id: Any, unit: str) -> float | None:
+        """Median grams for one `unit` of a food ('serving' = a whole logged portion)."""
+        hit = self._grams.get((str(food_id), unit))
+        if hit is None or hit[1] < FOOD_PORTION_MIN_SAMPLES:
+            return None
+        return hit[0]
+
+    async def ingest(self, conn: asyncpg.Connection) -> int:
+        """Sample newly finalized meals and recompute stats for the keys they touch."""
+        async with conn.transaction():
+            if not await conn.fetchval("SELECT pg_try_advisory_xact_lock(hashtext('food_portion_samples'))"):
+                return 0
+            # Resume after the newest sampled meal (or the last meal scanned here, if later
+            # batches yielded no samples); the cursor is strictly increasing, so ties on
+            # finalized_at cannot make a pass rescan the same rows
+            newest = await conn.fetchrow(
+                "SELECT finalized_at, meal_id FROM food_portion_samples ORDER BY finalized_at DESC, meal_id DESC LIMIT 1"
+            )
+            marks = [m for m in ((newest["finalized_at"], newest["meal_id"]) if newest else None, self._scanned_to) if m]
+            after_at, after_id = max(marks) if marks else (datetime.fromtimestamp(0, timezone.utc), uuid.UUID(int=0))
+            batch = await conn.fetchrow(
+                f"""
+                WITH recent AS (
+                    SELECT id, foods, finalized_at
+                    FROM meals
+                    WHERE review_status = 'finalized'
+                      AND (finalized_at, id) > ($1, $2)
+                      AND finalized_at < now() - make_interval(secs => $5)
+                    ORDER BY finalized_at, id
+                    LIMIT $3
+                ), last AS (
+                    SELECT finalized_at, id FROM recent ORDER BY finalized_at DESC, id DESC LIMIT 1
+                ), items AS (
+                    SELECT r.id AS meal_id, f.ord::int AS item, r.finalized_at,
+                           CASE WHEN f.food->>'food_id' ~ '{self._UUID}' THEN (f.food->>'food_id')::uuid END AS food_id,
+                           CASE WHEN f.food->>'quantity' ~ '{self._NUMERIC}' THEN (f.food->>'quantity')::float8 END AS grams,
+                           CASE WHEN f.food->>'displayQuantity' ~ '{self._NUMERIC}' THEN (f.food->>'displayQuantity')::float8 END AS display_qty,
+                           lower(trim(COALESCE(f.food->>'displayUnit', ''))) AS unit
+                    FROM recent r
+                    CROSS JOIN LATERAL jsonb_array_elements(
+                        CASE WHEN jsonb_typeof(r.foods) = 'array' THEN r.foods ELSE '[]'::jsonb END
+                    ) WITH ORDINALITY AS f(food, ord)
+                ), samples AS (
+                    SELECT meal_id, item, 'serving' AS unit, food_id, grams, finalized_at
+                    FROM items
+                    WHERE food_id IS NOT NULL AND grams > 0
+                    UNION ALL
+                    SELECT meal_id, item, unit, food_id, grams / display_qty, finalized_at
+                    FROM items
+                    WHERE food_id IS NOT NULL AND grams > 0 AND display_qty > 0
+                      AND unit <> ALL($4::text[])
+                ), inserted AS (
+                    INSERT INTO food_portion_samples (meal_id, item, unit, food_id, grams, finalized_at)
+                    SELECT meal_id, item, unit, food_id, grams, finalized_at FROM samples
+                    ON CONFLICT (meal_id, item, unit) DO NOTHING
+                    RETURNING food_id, unit
+                ), keys AS (
+                    SELECT DISTINCT food_id, unit FROM inserted
+                )
+                SELECT (SELECT finalized_at FROM last) AS scanned_at,
+                       (SELECT id FROM last) AS scanned_id,
+                       (SELECT count(*) FROM inserted) AS inserted,
+                       (SELECT array_agg(food_id ORDER BY food_id, unit) FROM keys) AS food_ids,
+                       (SELECT array_agg(unit ORDER BY food_id, unit) FROM keys) AS units
+                """,
+                after_at,
+                after_id,
+                self.BATCH_MEALS,
+                list(self.MASS_UNITS),
+                self.SETTLE_SECONDS,
+            )
+            if batch["scanned_at"] is not None:
+                self._scanned_to = (batch["scanned_at"], batch["scanned_id"])
+            if not batch["inserted"]:
+                return 0
+            await conn.execute(
+                """
+                INSERT INTO food_portion_stats (food_id, unit, samples, median_grams, updated_at)
+                SELECT s.food_id, s.unit, count(*)::int,
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY s.grams), now()
+                FROM unnest($1::uuid[], $2::text[]) AS k(food_id, unit)
+                JOIN food_portion_samples s ON s.food_id = k.food_id AND s.unit = k.unit
+                WHERE EXISTS (SELECT 1 FROM foods WHERE foods.id = k.food_id)
+                GROUP BY s.food_id, s.unit
+                ON CONFLICT (food_id, unit) DO UPDATE
+                SET samples = EXCLUDED.samples,
+                    median_grams = EXCLUDED.median_grams,
+                    updated_at = now()
+                """,
+                batch["food_ids"],
+                batch["units"],
+            )
+        self.samples_ingested += batch["inserted"]
+        logger.info(f"[FOOD_PORTIONS] Sampled {batch['inserted']} confirmed portions, recomputed {len(batch['units'])} food/unit medians")
+        return batch["inserted"]
+
+    async def refresh(self, conn: asyncpg.Connection) -> int:
+        await self.ingest(conn)
+        since = (self._watermark or datetime.fromtimestamp(0, timezone.utc)) - timedelta(seconds=60)
+        rows = await conn.fetch(
+            "SELECT food_id, unit, samples, median_grams, updated_at FROM food_portion_stats WHERE updated_at >= $1",
+            since,
+        )
+        for r in rows:
+            self._grams[(str(r["food_id"]), r["unit"])] = (float(r["median_grams"]), int(r["samples"]))
+            if self._watermark is None or r["updated_at"] > self._watermark:
+                self._watermark = r["updated_at"]
+        self.ready = True
+        return len(rows)
+
+
+food_portion_table = FoodPortionTable()
+
+
+async def _food_portion_loop():
+    """Keep the learned portion table fresh from newly finalized meals."""
+    while True:
+        try:
+            pool = _require_pool()
+            async with pool.acquire() as conn:
+                await food_portion_table.refresh(conn)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[FOOD_PORTIONS] Refresh failed: {str(e)}")
+        await asyncio.sleep(FOOD_PORTION_REFRESH_SECONDS)
+
+
+def match_food_to_database(name: str, quantity_grams: float) -> Dict[str, Any]:
+    raise RuntimeError("match_food_to_database() should not be used. Use match_foods_to_database_batch().")
+
+
+def _placeholder_food_result(food_id: uuid.UUID, name: str, ai_result: Dict[str, Any], quantity_grams: float) -> Dict[str, Any]:
+    qty = float(quantity_grams or 0)
+    multiplier = qty / 100.0
+    return {
+        "food_id": str(food_id),
+        "name": name,
+        "quantity": qty,
+        "calories": round(ai_result["calories_per_100g"] * multiplier, 2),
+        "protein": round(ai_result["protein_per_100g"] * multiplier, 2),
+        "carbs": round(ai_result["carbs_per_100g"] * multiplier, 2),
+        "fat": round(ai_result["fat_per_100g"] * multiplier, 2),
+        "calories_per_100g": ai_result["calories_per_100g"],
+        "protein_per_100g": ai_result["protein_per_100g"],
+        "carbs_per_100g": ai_result["carbs_per_100g"],
+        "fat_per_100g": ai_result["fat_per_100g"],
+        "matched": False,
+        "needs_review": True,  # Frontend should show review modal
+        "is_estimated": True,  # Flag for frontend to show "estimated" label
+    }
+
+
+def _scale_food_row(row: Any, quantity_grams: float) -> Dict[str, Any]:
+    """Scale a matched food row (DB record or name index entry) to the given quantity."""
     qty = float(quantity_grams or 0)
     multiplier = qty / 100.0
     return {
@@ -1262,33 +2752,620 @@ async def match_food_to_database_db(conn: asyncpg.Connection, name: str, quantit
     }
 
 
-async def _transcribe_audio_file(file: UploadFile) -> str:
+async def match_foods_to_database_batch(
+    conn: asyncpg.Connection,
+    items: List[tuple[str, float]],
+    on_match: Callable[[int, Dict[str, Any]], None] | None = None,
+) -> List[Dict[str, Any]]:
+    """Match food names to the catalog and scale to quantity, for photo/voice meals.
+
+    Names missing from the in-process index are resolved in one query (exact, then
+    shortest substring per name via unnest + LATERAL). Misses are AI-validated and all
+    placeholders plus their queue rows are written in one multi-row statement.
+    Results keep the input order; a rejected non-food raises 400.
+    `on_match(index, result)` fires as each item settles: catalog hits before any AI call.
+    """
+    normalized = [_normalize_food_name((name or "").strip()) for name, _ in items]
+    rows: List[Any] = [None] * len(items)
+
+    if food_name_index.ready:
+        for idx, n in enumerate(normalized):
+            rows[idx] = food_name_index.lookup(n)
+
+    # One lookup per distinct name (a thali can list "Roti" twice)
+    missing: Dict[str, str] = {}
+    for idx, n in enumerate(normalized):
+        if rows[idx] is None:
+            missing.setdefault(n.lower(), n)
+
+    logger.info(f"[FOOD_MATCH] batch items={len(items)}, index_hits={len(items) - sum(r is None for r in rows)}, db_lookups={len(missing)}")
+
+    found: Dict[str, Any] = {}
+    if missing:
+        db_rows = await conn.fetch(
+            """
+            SELECT q.ord, m.id, m.name, m.category,
+                   m.calories_per_100g, m.protein_per_100g, m.carbs_per_100g, m.fat_per_100g,
+                   m.is_vegetarian
+            FROM unnest($1::text[], $2::text[]) WITH ORDINALITY AS q(name, pattern, ord)
+            JOIN LATERAL (
+                (SELECT id, name, category,
+                        calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
+                        is_vegetarian
+                 FROM foods
+                 WHERE lower(name) = lower(q.name)
+                 LIMIT 1)
+                UNION ALL
+                (SELECT id, name, category,
+                        calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
+                        is_vegetarian
+                 FROM foods
+                 WHERE lower(name) LIKE '%' || q.pattern || '%'
+                 ORDER BY length(name) ASC
+                 LIMIT 1)
+                LIMIT 1
+            ) m ON true
+            """,
+            list(missing.values()),
+            [_escape_like(k) for k in missing],
+        )
+        missing_keys = list(missing)
+        for r in db_rows:
+            found[missing_keys[r["ord"] - 1]] = r
+            if food_name_index.ready:
+                food_name_index.upsert(r)
+
+    results: List[Dict[str, Any] | None] = [None] * len(items)
+
+    def _settle(idx: int, result: Dict[str, Any]) -> None:
+        results[idx] = result
+        if on_match is not None:
+            on_match(idx, result)
+
+    for idx, (_, quantity_grams) in enumerate(items):
+        row = rows[idx] if rows[idx] is not None else found.get(normalized[idx].lower())
+        if row is not None:
+            _settle(idx, _scale_food_row(row, quantity_grams))
+
+    # AI validation + placeholder creation for names nothing matched
+    unknown = [n for key, n in missing.items() if key not in found]
+    placeholders: Dict[str, tuple[uuid.UUID, Dict[str, Any]]] = {}
+    ai_results = await _validate_foods_concurrently(unknown, conn)
+    for n, ai_result in zip(unknown, ai_results):
+        if not ai_result["is_food"]:
+            logger.warning(f"[FOOD_MATCH] AI validation rejected: '{n}' - {ai_result['reason']}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"'{n}' does not appear to be a food item. {ai_result['reason']}"
+            )
+        placeholders[n.lower()] = (uuid.uuid4(), ai_result)
+
+    if placeholders:
+        ordered = [(placeholders[n.lower()], n) for n in unknown]
+        await conn.execute(
+            """
+            WITH inserted AS (
+                INSERT INTO foods (
+                    id, name, category,
+                    calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
+                    is_vegetarian, source, verified, review_status, last_used_at
+                )
+                SELECT t.id, t.name, 'user', t.cal, t.protein, t.carbs, t.fat,
+                       true, 'user', false, 'pending_review', now()
+                FROM unnest($1::uuid[], $2::text[], $3::float8[], $4::float8[], $5::float8[], $6::float8[])
+                     AS t(id, name, cal, protein, carbs, fat)
+                RETURNING id, name
+            )
+            INSERT INTO foods_ingestion_queue (food_id, query, status)
+            SELECT id, name, 'pending' FROM inserted
+            ON CONFLICT (food_id) DO NOTHING
+            """,
+            [fid for (fid, _), _ in ordered],
+            [n for _, n in ordered],
+            [ai["calories_per_100g"] for (_, ai), _ in ordered],
+            [ai["protein_per_100g"] for (_, ai), _ in ordered],
+            [ai["carbs_per_100g"] for (_, ai), _ in ordered],
+            [ai["fat_per_100g"] for (_, ai), _ in ordered],
+        )
+        for (fid, ai), n in ordered:
+            food_name_index.upsert({
+                "id": fid,
+                "name": n,
+                "category": "user",
+                "calories_per_100g": ai["calories_per_100g"],
+                "protein_per_100g": ai["protein_per_100g"],
+                "carbs_per_100g": ai["carbs_per_100g"],
+                "fat_per_100g": ai["fat_per_100g"],
+                "is_vegetarian": True,
+            })
+        logger.info(f"[FOOD_MATCH] Created {len(ordered)} pending placeholders in one write, awaiting user review")
+
+    for idx, (_, quantity_grams) in enumerate(items):
+        if results[idx] is None:
+            key = normalized[idx].lower()
+            fid, ai_result = placeholders[key]
+            _settle(idx, _placeholder_food_result(fid, missing[key], ai_result, quantity_grams))
+    return results
+
+
+async def _spool_stream(
+    chunks: AsyncIterator[bytes], limit: int, what: str = "Upload"
+) -> tuple[tempfile.SpooledTemporaryFile, int]:
+    """Copy an upload into a SpooledTemporaryFile (memory up to UPLOAD_SPOOL_MEMORY_BYTES,
+    then disk), failing with 413 as soon as more than `limit` bytes arrive.
+    Returns (spool, size); the caller owns and closes the spool."""
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY_BYTES)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > limit:
+                raise HTTPException(status_code=413, detail=f"{what} exceeds {limit} bytes")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    return spool, size
+
+
+def _body_limited(request: Request, limit: int, detail: str) -> Request:
+    """The same request, but reading its body fails with 413 as soon as more than `limit`
+    bytes have arrived, whether or not the client sent a Content-Length. Parse forms and
+    streams through the returned request so oversized bodies are cut off on the wire."""
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise HTTPException(status_code=413, detail=detail)
+        return message
+
+    return Request(request.scope, receive)
+
+
+_voice_upload_stats: Dict[str, int] = {
+    "uploads": 0,
+    "bytes_in": 0,
+    "kept_in_memory": 0,
+    "spilled_to_disk": 0,
+    "max_memory_bytes": 0,
+    "rejected_size": 0,
+    "rejected_duration": 0,
+}
+
+
+def _box_header(f, end: int) -> tuple[bytes, int, int] | None:
+    """Read an MP4 box header at the current position: (type, header_len, box_len)."""
+    head = f.read(8)
+    if len(head) < 8:
+        return None
+    size, kind = struct.unpack(">I4s", head)
+    header = 8
+    if size == 1:
+        large = f.read(8)
+        if len(large) < 8:
+            return None
+        size, header = struct.unpack(">Q", large)[0], 16
+    elif size == 0:
+        size = end - (f.tell() - 8)
+    if size < header:
+        return None
+    return kind, header, size
+
+
+def _mp4_duration_seconds(f, end: int) -> float | None:
+    pos, limit = 0, end
+    while pos + 8 <= limit:
+        f.seek(pos)
+        box = _box_header(f, limit)
+        if box is None:
+            return None
+        kind, header, size = box
+        if kind == b"moov":
+            # Descend into moov and look for its mvhd child
+            pos, limit = pos + header, pos + size
+            continue
+        if kind == b"mvhd":
+            version = f.read(4)[:1]
+            if version == b"\x01":
+                f.seek(16, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">II", f.read(8))
+            return duration / timescale if timescale else None
+        pos += size
+    return None
+
+
+def _wav_duration_seconds(f, end: int) -> float | None:
+    pos, byte_rate = 12, 0
+    while pos + 8 <= end:
+        f.seek(pos)
+        kind, size = struct.unpack("<4sI", f.read(8))
+        if kind == b"fmt ":
+            byte_rate = struct.unpack("<I", f.read(12)[8:12])[0]
+        elif kind == b"data":
+            return size / byte_rate if byte_rate else None
+        pos += 8 + size + (size & 1)
+    return None
+
+
+def _audio_duration_seconds(f, size: int) -> float | None:
+    """Duration from the container header (MP4/M4A mvhd or WAV fmt/data), seeking
+    past the media payload. Returns None for formats we don't inspect."""
+    try:
+        f.seek(0)
+        head = f.read(12)
+        if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+            return _wav_duration_seconds(f, size)
+        if head[4:8] == b"ftyp":
+            return _mp4_duration_seconds(f, size)
+        return None
+    except (struct.error, ValueError):
+        return None
+    finally:
+        f.seek(0)
+
+
+def _spool_residency(f: Any) -> tuple[bool, int]:
+    """(rolled over to disk, bytes held in memory) for a SpooledTemporaryFile, read off the
+    file itself rather than inferred from its size."""
+    rolled = bool(getattr(f, "_rolled", True))
+    buf = getattr(f, "_file", None)
+    if rolled or not isinstance(buf, io.BytesIO):
+        return rolled, 0
+    with buf.getbuffer() as view:
+        return False, view.nbytes
+
+
+async def _check_audio_upload(audio: StarletteUploadFile) -> int:
+    """Reject a parsed voice upload over VOICE_UPLOAD_MAX_BYTES or longer than
+    VOICE_MAX_DURATION_SECONDS before anything is sent to Whisper. Returns its size."""
+    size = audio.size or 0
+    if size > VOICE_UPLOAD_MAX_BYTES:
+        _voice_upload_stats["rejected_size"] += 1
+        raise HTTPException(status_code=413, detail=f"Audio exceeds {VOICE_UPLOAD_MAX_BYTES} bytes")
+
+    # Seeks and reads on a spool that may already be on disk
+    duration = await asyncio.to_thread(_audio_duration_seconds, audio.file, size)
+    if duration is not None and duration > VOICE_MAX_DURATION_SECONDS:
+        _voice_upload_stats["rejected_duration"] += 1
+        raise HTTPException(
+            status_code=413,
+            detail=f"Recording is {duration:.0f}s; the limit is {VOICE_MAX_DURATION_SECONDS:.0f}s",
+        )
+
+    rolled, memory_bytes = _spool_residency(audio.file)
+    _voice_upload_stats["uploads"] += 1
+    _voice_upload_stats["bytes_in"] += size
+    _voice_upload_stats["spilled_to_disk" if rolled else "kept_in_memory"] += 1
+    _voice_upload_stats["max_memory_bytes"] = max(_voice_upload_stats["max_memory_bytes"], memory_bytes)
+    duration_text = f"{duration:.1f}s" if duration is not None else "unknown duration"
+    logger.info(
+        f"[VOICE_UPLOAD] {size} bytes, {duration_text}, "
+        f"{'spooled to disk' if rolled else f'{memory_bytes} bytes held in memory'}"
+    )
+    return size
+
+
+async def _voice_upload_form(request: Request, uid: str) -> tuple[FormData, StarletteUploadFile]:
+    """Parse a voice multipart form (`user_id` + `audio`) with the body capped at
+    VOICE_UPLOAD_MAX_BYTES on the wire, then check the user and the recording.
+    Returns (form, audio); the caller owns and closes the form."""
+    too_large = f"Audio exceeds {VOICE_UPLOAD_MAX_BYTES} bytes"
+    declared = request.headers.get("content-length", "")
+    try:
+        if declared.isdigit() and int(declared) > VOICE_UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES:
+            raise HTTPException(status_code=413, detail=too_large)
+        limited = _body_limited(request, VOICE_UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES, too_large)
+        form = await limited.form(max_files=1, max_fields=4)
+    except HTTPException as e:
+        if e.status_code == 413:
+            _voice_upload_stats["rejected_size"] += 1
+        raise
+
+    try:
+        user_id = str(form.get("user_id") or "")
+        audio = form.get("audio")
+        if not user_id or not isinstance(audio, StarletteUploadFile):
+            raise HTTPException(status_code=422, detail="Expected multipart fields 'user_id' and 'audio'")
+        _require_user_match(uid, user_id)
+        await _check_audio_upload(audio)
+    except BaseException:
+        await form.close()
+        raise
+    return form, audio
+
+
+async def _transcribe_audio_file(audio: StarletteUploadFile) -> str:
     if openai_client is None:
         raise RuntimeError("OPENAI_API_KEY is not set")
-
-    audio_bytes = await file.read()
-    if not audio_bytes:
+    if not audio.size:
         return ""
-
-    transcription = await openai_client.audio.transcriptions.create(
-        model="whisper-1",
-        file=(file.filename or "audio.m4a", audio_bytes, file.content_type or "application/octet-stream"),
+    # Transcribe straight from the part the form parser spooled
+    return await _transcribe_audio_stream(audio.filename, audio.file, audio.content_type)
+
+
+_audio_transcode_stats: Dict[str, float] = {
+    "transcoded": 0,
+    "passthrough": 0,
+    "failed": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "transcode_ms": 0.0,
+    "transcribe_calls_transcoded": 0,
+    "transcribe_ms_transcoded": 0.0,
+    "transcribe_calls_original": 0,
+    "transcribe_ms_original": 0.0,
+}
+
+
+async def _run_ffmpeg_speech(src: str, dst: str) -> bool:
+    """Convert `src` to mono 16 kHz low-bitrate AAC at `dst` in an ffmpeg subprocess."""
+    proc = await asyncio.create_subprocess_exec(
+        FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", src,
+        "-vn", "-ac", "1", "-ar", "16000", "-c:a", "aac", "-b:a", "32k",
+        dst,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
     )
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(), timeout=VOICE_TRANSCODE_TIMEOUT_SECONDS)
+    except BaseException as e:
+        # Timeout, or the request was cancelled (client gone, shutdown): don't leave ffmpeg running
+        if proc.returncode is None:
+            proc.kill()
+        await asyncio.shield(proc.wait())
+        if isinstance(e, asyncio.TimeoutError):
+            logger.warning(f"[AUDIO_PREP] ffmpeg timed out after {VOICE_TRANSCODE_TIMEOUT_SECONDS}s")
+            return False
+        raise
+    if proc.returncode != 0:
+        logger.warning(f"[AUDIO_PREP] ffmpeg exited {proc.returncode}: {stderr.decode(errors='replace')[-300:]}")
+        return False
+    return True
 
-    return (getattr(transcription, "text", None) or "").strip()
 
+@asynccontextmanager
+async def _speech_audio(filename: str | None, audio: IO[bytes], content_type: str | None):
+    """Yield (name, file, content_type, transcoded) for Whisper.
 
-async def _parse_voice_meal_text(transcript: str) -> List[VoiceToMealFoodItem]:
+    Phone recordings are re-encoded to mono 16 kHz speech-grade audio when ffmpeg is
+    available; the original upload is used if ffmpeg is missing, fails, or the result is
+    not smaller. Temporary files are removed on exit.
+    """
+    original = (filename or "audio.m4a", audio, content_type or "application/octet-stream", False)
+    if not VOICE_TRANSCODE or shutil.which(FFMPEG_BINARY) is None:
+        _audio_transcode_stats["passthrough"] += 1
+        yield original
+        return
+
+    with tempfile.TemporaryDirectory(prefix="voice-") as workdir:
+        src = os.path.join(workdir, "input" + (Path(filename or "").suffix or ".m4a"))
+        dst = os.path.join(workdir, "speech.m4a")
+
+        def _write_input() -> int:
+            audio.seek(0)
+            with open(src, "wb") as out:
+                shutil.copyfileobj(audio, out, UPLOAD_CHUNK_SIZE)
+            return os.path.getsize(src)
+
+        started = time.perf_counter()
+        bytes_in = await asyncio.to_thread(_write_input)
+        ok = await _run_ffmpeg_speech(src, dst)
+        bytes_out = os.path.getsize(dst) if ok and os.path.exists(dst) else 0
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if not ok or not 0 < bytes_out < bytes_in:
+            _audio_transcode_stats["failed" if not ok else "passthrough"] += 1
+            yield original
+            return
+
+        _audio_transcode_stats["transcoded"] += 1
+        _audio_transcode_stats["bytes_in"] += bytes_in
+        _audio_transcode_stats["bytes_out"] += bytes_out
+        _audio_transcode_stats["transcode_ms"] += elapsed_ms
+        logger.info(f"[AUDIO_PREP] {bytes_in} -> {bytes_out} bytes in {elapsed_ms:.0f}ms")
+        with open(dst, "rb") as speech:
+            yield "speech.m4a", speech, "audio/mp4", True
+
+
+async def _transcribe_audio_stream(filename: str | None, audio: IO[bytes], content_type: str | None) -> str:
+    """Transcribe from a file object; the multipart body is streamed from it in chunks."""
     if openai_client is None:
         raise RuntimeError("OPENAI_API_KEY is not set")
 
+    async with _speech_audio(filename, audio, content_type) as (name, speech, mime, transcoded):
+        speech.seek(0, os.SEEK_END)
+        duration = _audio_duration_seconds(speech, speech.tell()) or 0.0
+        speech.seek(0)
+        started = time.perf_counter()
+        transcription = await _openai_call(
+            "transcription",
+            openai_client.audio.transcriptions.with_raw_response.create,
+            audio_seconds=duration,
+            model="whisper-1",
+            file=(name, speech, mime),
+        )
+        kind = "transcoded" if transcoded else "original"
+        _audio_transcode_stats[f"transcribe_calls_{kind}"] += 1
+        _audio_transcode_stats[f"transcribe_ms_{kind}"] += (time.perf_counter() - started) * 1000
+
+    return (getattr(transcription, "text", None) or "").strip()
+
+
+# ---- Local voice meal parser ----
+# Short formulaic transcripts ("2 rotis and dal", "one bowl of rice with sambar") are parsed
+# here against the catalog; anything it is not sure about goes to the model instead.
+
+_NUMBER_WORDS: Dict[str, float] = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "half": 0.5, "quarter": 0.25, "couple": 2, "few": 3, "dozen": 12,
+}
+
+# Grams per unit; ml are treated as grams like the rest of the app does
+_UNIT_GRAMS: Dict[str, float] = {
+    "g": 1, "gm": 1, "gms": 1, "gram": 1, "kg": 1000, "kilo": 1000, "kilogram": 1000,
+    "ml": 1, "millilitre": 1, "milliliter": 1, "l": 1000, "litre": 1000, "liter": 1000,
+    "bowl": 150, "katori": 150, "plate": 250, "cup": 240, "glass": 250, "mug": 250,
+    "piece": 50, "slice": 30, "serving": 150, "portion": 150, "helping": 150,
+    "tablespoon": 15, "tbsp": 15, "spoon": 15, "teaspoon": 5, "tsp": 5,
+    "handful": 30, "scoop": 30, "can": 330, "bottle": 500,
+}
+_MASS_UNITS = frozenset({"g", "gm", "gms", "gram", "kg", "kilo", "kilogram", "ml", "millilitre", "milliliter", "l", "litre", "liter"})
+_SIZE_FACTOR: Dict[str, float] = {"small": 0.75, "medium": 1.0, "large": 1.5, "big": 1.5}
+
+# Typical weight of one countable item, for "2 rotis" / "3 eggs"
+_PIECE_GRAMS: Dict[str, float] = {
+    "roti": 40, "chapati": 40, "phulka": 30, "paratha": 80, "naan": 90, "puri": 25,
+    "idli": 40, "dosa": 100, "uttapam": 120, "vada": 50, "samosa": 60, "egg": 50,
+    "boiled egg": 50, "banana": 120, "apple": 180, "orange": 130, "bread": 30,
+    "toast": 30, "biscuit": 10, "cookie": 15,
+}
+_DEFAULT_PORTION_GRAMS = 150.0
+
+_VOICE_LOCAL_MAX_WORDS = 30
+_VOICE_HARD_SPLIT = re.compile(r"\s*(?:,|;|&|\bplus\b|\balso\b|\band then\b)\s*")
+_VOICE_SOFT_SPLIT = re.compile(r"\s+(?:and|with)\s+")
+_VOICE_LEAD_IN = re.compile(r"^(?:(?:i|we)\s+(?:just\s+)?(?:had|ate|have|eat|drank|am having)\s+|(?:for\s+\w+\s+)?i\s+had\s+)")
+_VOICE_TRAIL = re.compile(r"\s+(?:for\s+(?:breakfast|lunch|dinner|snacks?)|today|this\s+(?:morning|afternoon|evening))$")
+_VOICE_TOKEN = re.compile(r"\d+(?:\.\d+)?(?:/\d+)?|[a-z]+")
+
+_voice_parse_stats: Dict[str, float] = {"local_hits": 0, "llm_fallbacks": 0, "local_us_total": 0.0}
+
+
+def _singular(word: str) -> List[str]:
+    forms = [word]
+    if word.endswith("ies") and len(word) > 4:
+        forms.append(word[:-3] + "y")
+    if word.endswith("es") and len(word) > 3:
+        forms.append(word[:-2])
+    if word.endswith("s") and len(word) > 2:
+        forms.append(word[:-1])
+    return forms
+
+
+def _parse_quantity(token: str) -> float | None:
+    try:
+        if "/" in token:
+            num, den = token.split("/", 1)
+            return float(num) / float(den) if float(den) else None
+        return float(token)
+    except ValueError:
+        return _NUMBER_WORDS.get(token)
+
+
+def _local_parse_segment(segment: str) -> tuple[VoiceToMealFoodItem, float] | None:
+    """Parse "[qty] [size] [unit] [of] food" into (item, confidence), or None."""
+    tokens = _VOICE_TOKEN.findall(segment.lower())
+    i, qty, size, unit = 0, None, 1.0, None
+
+    if i < len(tokens) and (q := _parse_quantity(tokens[i])) is not None:
+        qty, i = q, i + 1
+        # "a couple of", "a dozen", "half a", "a half"
+        if i < len(tokens) and tokens[i] in ("couple", "few", "dozen", "half") and qty == 1:
+            qty, i = _NUMBER_WORDS[tokens[i]], i + 1
+        elif qty == 0.5 and i < len(tokens) and tokens[i] in ("a", "an"):
+            i += 1
+        if i < len(tokens) and tokens[i] == "of":
+            i += 1
+    if i < len(tokens) and tokens[i] in _SIZE_FACTOR:
+        size, i = _SIZE_FACTOR[tokens[i]], i + 1
+    if i < len(tokens):
+        unit = next((u for u in _singular(tokens[i]) if u in _UNIT_GRAMS), None)
+        if unit is not None:
+            i += 1
+            if i < len(tokens) and tokens[i] == "of":
+                i += 1
+    while i < len(tokens) and tokens[i] in ("the", "some"):
+        i += 1
+
+    words = tokens[i:]
+    if not words:
+        return None
+    food = None
+    for last in _singular(words[-1]):
+        name = " ".join(words[:-1] + [last])
+        food = food_name_index.exact(name) or food_name_index.exact(_normalize_food_name(name))
+        if food is not None:
+            break
+    if food is None:
+        return None
+
+    # Portions users actually confirmed for this food beat the generic tables
+    key = food["name"].strip().lower()
+    count = qty if qty is not None else 1.0
+    learned = food_portion_table.grams(food["id"], unit or ("serving" if qty is None else "piece"))
+    if unit in _MASS_UNITS:
+        grams, confidence = count * _UNIT_GRAMS[unit], 1.0
+    elif learned is not None:
+        grams, confidence = count * learned * size, 0.9
+    elif unit is not None:
+        grams, confidence = count * _UNIT_GRAMS[unit] * size, 0.8
+    elif key in _PIECE_GRAMS:
+        grams, confidence = count * _PIECE_GRAMS[key] * size, 0.8
+    elif qty is None:
+        grams, confidence = _DEFAULT_PORTION_GRAMS * size, 0.6
+    else:
+        # "3 mangoes": a count without a known piece weight
+        return None
+    return VoiceToMealFoodItem(name=food["name"], quantity_grams=round(grams, 1)), confidence
+
+
+def _local_parse_voice_meal(transcript: str) -> List[VoiceToMealFoodItem] | None:
+    """Rule-based parse of a short meal description. Returns None (use the LLM) unless
+    every part resolves to a catalog food with confidence >= VOICE_LOCAL_PARSE_MIN_CONFIDENCE."""
+    if not VOICE_LOCAL_PARSE or not food_name_index.ready:
+        return None
+    text = re.sub(r"[.!?]+$", "", transcript.strip().lower())
+    if not text or len(text.split()) > _VOICE_LOCAL_MAX_WORDS:
+        return None
+    text = _VOICE_TRAIL.sub("", _VOICE_LEAD_IN.sub("", text))
+
+    items: List[VoiceToMealFoodItem] = []
+    confidence = 1.0
+    for chunk in filter(None, _VOICE_HARD_SPLIT.split(text)):
+        chunk = re.sub(r"^(?:and|with)\s+", "", chunk)
+        # Try the chunk whole first so names like "bread and butter" survive
+        whole = _local_parse_segment(chunk)
+        parts = [whole] if whole is not None else [_local_parse_segment(p) for p in _VOICE_SOFT_SPLIT.split(chunk)]
+        for part in parts:
+            if part is None:
+                return None
+            items.append(part[0])
+            confidence = min(confidence, part[1])
+
+    if not items or confidence < VOICE_LOCAL_PARSE_MIN_CONFIDENCE:
+        return None
+    return items
+
+
+async def _parse_voice_meal_text(transcript: str) -> List[VoiceToMealFoodItem]:
     cleaned = (transcript or "").strip()
     if not cleaned:
         return []
 
-    response = await openai_client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[
+    started = time.perf_counter()
+    local = _local_parse_voice_meal(cleaned)
+    _voice_parse_stats["local_us_total"] += (time.perf_counter() - started) * 1_000_000
+    if local is not None:
+        _voice_parse_stats["local_hits"] += 1
+        logger.info(f"[VOICE_TO_MEAL] Parsed locally: {[(f.name, f.quantity_grams) for f in local]}")
+        return local
+    _voice_parse_stats["llm_fallbacks"] += 1
+
+    if openai_client is None:
+        raise RuntimeError("OPENAI_API_KEY is not set")
+
+    content = await _chat_json_content(
+        OPENAI_MODEL,
+        [
             {
                 "role": "system",
                 "content": (
@@ -1301,10 +3378,8 @@ async def _parse_voice_meal_text(transcript: str) -> List[VoiceToMealFoodItem]:
             {"role": "user", "content": cleaned},
         ],
         temperature=0,
-        response_format={"type": "json_object"},
+        purpose="voice_parse",
     )
-
-    content = response.choices[0].message.content if response.choices else ""
     extracted = _extract_json_from_text(content)
     parsed = json.loads(extracted) if extracted else {}
     foods = parsed.get("foods", []) if isinstance(parsed, dict) else []
@@ -1479,32 +3554,75 @@ async def update_goals(user_id: str, payload: GoalsUpdateRequest, uid: str = Dep
 
 
 @api_router.get("/foods/search")
-async def search_foods(query: str = "", category: str = "", vegetarian_only: bool = False):
-    """Search foods from Postgres cache"""
+async def search_foods(query: str = "", category: str = "", vegetarian_only: bool = False, limit: int = 200):
+    """Search foods from Postgres cache.
+
+    Uses the pg_trgm GIN indexes on lower(name)/lower(brand) for substring and fuzzy
+    matches, ranked exact > prefix > word similarity. An empty query lists alphabetically.
+    """
+    term = (query or "").strip().lower()
+    lim = max(1, min(int(limit or FOODS_SEARCH_MAX_LIMIT), FOODS_SEARCH_MAX_LIMIT))
+
     pool = _require_pool()
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            """
-            SELECT id, name, brand, barcode, category,
-                   calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
-                   fiber_g_per_100g, sugar_g_per_100g, sodium_mg_per_100g,
-                   source, external_id, verified
-            FROM foods
-            WHERE ($1 = '' OR lower(name) LIKE '%' || lower($1) || '%'
-                OR (brand IS NOT NULL AND lower(brand) LIKE '%' || lower($1) || '%'))
-              AND ($2 = '' OR category = $2)
-              AND ($3::bool = false OR is_vegetarian = true)
-            ORDER BY name ASC
-            LIMIT 200
-            """,
-            (query or "").strip(),
-            (category or "").strip(),
-            bool(vegetarian_only),
-        )
+        if not term:
+            rows = await conn.fetch(
+                """
+                SELECT id, name, brand, barcode, category,
+                       calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
+                       fiber_g_per_100g, sugar_g_per_100g, sodium_mg_per_100g,
+                       source, external_id, verified
+                FROM foods
+                WHERE ($1 = '' OR category = $1)
+                  AND ($2::bool = false OR is_vegetarian = true)
+                ORDER BY name ASC
+                LIMIT $3
+                """,
+                (category or "").strip(),
+                bool(vegetarian_only),
+                lim,
+            )
+        else:
+            rows = await conn.fetch(
+                """
+                SELECT id, name, brand, barcode, category,
+                       calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g,
+                       fiber_g_per_100g, sugar_g_per_100g, sodium_mg_per_100g,
+                       source, external_id, verified,
+                       GREATEST(
+                           word_similarity($1, lower(name)),
+                           COALESCE(word_similarity($1, lower(brand)), 0) * 0.8
+                       )::double precision AS score
+                FROM foods
+                WHERE (
+                    lower(name) LIKE '%' || $2 || '%'
+                    OR $1 <% lower(name)
+                    OR (brand IS NOT NULL AND (lower(brand) LIKE '%' || $2 || '%' OR $1 <% lower(brand)))
+                )
+                  AND ($3 = '' OR category = $3)
+                  AND ($4::bool = false OR is_vegetarian = true)
+                ORDER BY
+                  (lower(name) = $1) DESC,
+                  (lower(name) LIKE $2 || '%') DESC,
+                  score DESC,
+                  length(name) ASC,
+                  name ASC
+                LIMIT $5
+                """,
+                term,
+                _escape_like(term),
+                (category or "").strip(),
+                bool(vegetarian_only),
+                lim,
+            )
 
     foods = [dict(r) for r in rows]
     for f in foods:
         f["id"] = str(f["id"])
+        # Default the quantity picker to the portion users typically confirm for this food
+        portion = food_portion_table.grams(f["id"], "serving")
+        if portion is not None:
+            f["serving_size"] = round(portion)
     return {"foods": foods, "count": len(foods)}
 
 
@@ -1523,28 +3641,8 @@ async def log_meal_photo(request: PhotoAnalysisRequest, uid: str = Depends(get_c
     """Log meal from photo using AI analysis"""
     try:
         _require_user_match(uid, request.user_id)
-        analysis = await analyze_food_image(request.image_base64)
-        if "error" in analysis:
-            raise HTTPException(status_code=500, detail=analysis["error"])
-
-        pool = _require_pool()
-        matched_foods: List[Dict[str, Any]] = []
-        async with pool.acquire() as conn:
-            for food in analysis.get("foods", []):
-                matched = await match_food_to_database_db(
-                    conn,
-                    food.get("name", ""),
-                    float(food.get("estimated_quantity_grams", 0) or 0),
-                )
-                matched["confidence"] = food.get("confidence", "medium")
-                matched_foods.append(matched)
-
-        return {
-            "coin_detected": analysis.get("coin_detected", False),
-            "coin_type": analysis.get("coin_type"),
-            "foods": matched_foods,
-            "notes": analysis.get("notes", ""),
-        }
+        analysis = await analyze_food_image(request.image_base64, request.presence_gate)
+        return await _photo_meal_response(analysis)
     except HTTPException:
         raise
     except Exception as e:
@@ -1552,19 +3650,107 @@ async def log_meal_photo(request: PhotoAnalysisRequest, uid: str = Depends(get_c
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@api_router.post("/meals/voice-to-meal", response_model=VoiceToMealResponse)
-async def voice_to_meal(
-    user_id: str = Form(...),
-    audio: UploadFile = File(...),
+@api_router.post("/meals/has-food", response_model=FoodPresenceResponse)
+async def has_food(request: FoodPresenceRequest, uid: str = Depends(get_current_uid)):
+    """Cheap yes/no food check for a photo (OPENAI_CHEAP_MODEL)"""
+    _require_user_match(uid, request.user_id)
+    return await detect_food_presence(request.image_base64)
+
+
+@api_router.post("/meals/log-photo/upload")
+async def log_meal_photo_upload(
+    request: Request,
+    user_id: str = "",
+    presence_gate: bool = PHOTO_PRESENCE_GATE,
     uid: str = Depends(get_current_uid),
 ):
-    """Transcribe uploaded audio and parse into structured foods for the existing confirmation UI."""
+    """Binary variant of /meals/log-photo (no base64/JSON overhead).
+
+    Accepts multipart/form-data with `user_id` + `image` fields, or a raw image body
+    with `?user_id=` (`?presence_gate=` works for both). The body is read through
+    _body_limited, so it is rejected with 413 once it passes PHOTO_UPLOAD_MAX_BYTES
+    (plus form overhead for multipart) even without a Content-Length.
+    """
     try:
-        logger.info(f"[VOICE_TO_MEAL] Starting voice-to-meal for user={user_id}")
-        _require_user_match(uid, user_id)
+        declared = request.headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > PHOTO_UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Image exceeds {PHOTO_UPLOAD_MAX_BYTES} bytes")
+
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            limited = _body_limited(
+                request, PHOTO_UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES,
+                f"Image exceeds {PHOTO_UPLOAD_MAX_BYTES} bytes",
+            )
+            form = await limited.form(max_files=1, max_fields=4)
+            try:
+                user_id = str(form.get("user_id") or user_id)
+                _require_user_match(uid, user_id)
+                upload = form.get("image")
+                if not isinstance(upload, StarletteUploadFile):
+                    raise HTTPException(status_code=400, detail="Missing 'image' file field")
+                if (upload.size or 0) > PHOTO_UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Image exceeds {PHOTO_UPLOAD_MAX_BYTES} bytes")
+                # The form parser already spooled the part; read it from there
+                upload.file.seek(0)
+                raw = await asyncio.to_thread(upload.file.read)
+            finally:
+                await form.close()
+        else:
+            _require_user_match(uid, user_id)
+            spool, _ = await _spool_stream(request.stream(), PHOTO_UPLOAD_MAX_BYTES, "Image")
+            with spool:
+                spool.seek(0)
+                raw = await asyncio.to_thread(spool.read)
+        if not raw:
+            raise HTTPException(status_code=400, detail="Empty image upload")
+
+        analysis = await analyze_food_image_bytes(raw, presence_gate)
+        return await _photo_meal_response(analysis)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error logging photo upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 
-        logger.info(f"[VOICE_TO_MEAL] Transcribing audio file")
-        transcript = await _transcribe_audio_file(audio)
+async def _photo_meal_response(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Match analyzed foods against the catalog and shape the log-photo response."""
+    if "error" in analysis:
+        raise HTTPException(status_code=500, detail=analysis["error"])
+
+    pool = _require_pool()
+    detected = analysis.get("foods", [])
+    async with pool.acquire() as conn:
+        matched_foods = await match_foods_to_database_batch(
+            conn,
+            [(food.get("name", ""), float(food.get("estimated_quantity_grams", 0) or 0)) for food in detected],
+        )
+    for food, matched in zip(detected, matched_foods):
+        matched["confidence"] = food.get("confidence", "medium")
+
+    return {
+        "coin_detected": analysis.get("coin_detected", False),
+        "coin_type": analysis.get("coin_type"),
+        "foods": matched_foods,
+        "notes": analysis.get("notes", ""),
+    }
+
+
+@api_router.post("/meals/voice-to-meal", response_model=VoiceToMealResponse)
+async def voice_to_meal(request: Request, uid: str = Depends(get_current_uid)):
+    """Transcribe uploaded audio and parse into structured foods for the existing confirmation UI.
+
+    Takes multipart/form-data with `user_id` + `audio` fields.
+    """
+    try:
+        form, audio = await _voice_upload_form(request, uid)
+        try:
+            logger.info(f"[VOICE_TO_MEAL] Starting voice-to-meal for user={uid}")
+            logger.info(f"[VOICE_TO_MEAL] Transcribing audio file")
+            transcript = await _transcribe_audio_file(audio)
+        finally:
+            await form.close()
         logger.info(f"[VOICE_TO_MEAL] Transcript: {transcript}")
         
         logger.info(f"[VOICE_TO_MEAL] Parsing transcript into foods")
@@ -1572,22 +3758,21 @@ async def voice_to_meal(
         logger.info(f"[VOICE_TO_MEAL] Parsed {len(parsed_foods)} foods: {[f.name for f in parsed_foods]}")
 
         pool = _require_pool()
-        matched_foods: List[Dict[str, Any]] = []
         async with pool.acquire() as conn:
-            for idx, item in enumerate(parsed_foods):
-                try:
-                    logger.info(f"[VOICE_TO_MEAL] Matching food {idx+1}/{len(parsed_foods)}: {item.name} ({item.quantity_grams}g)")
-                    matched = await match_food_to_database_db(conn, item.name, float(item.quantity_grams))
-                    matched["displayQuantity"] = round(float(item.quantity_grams), 1)
-                    matched["displayUnit"] = "g"
-                    matched_foods.append(matched)
-                    logger.info(f"[VOICE_TO_MEAL] Successfully matched: {item.name} -> food_id={matched.get('food_id')}, needs_review={matched.get('needs_review', False)}")
-                except HTTPException as e:
-                    logger.error(f"[VOICE_TO_MEAL] Failed to match food '{item.name}': {e.status_code} - {e.detail}")
-                    raise
-                except Exception as e:
-                    logger.error(f"[VOICE_TO_MEAL] Unexpected error matching food '{item.name}': {str(e)}", exc_info=True)
-                    raise HTTPException(status_code=500, detail=f"Failed to match food '{item.name}': {str(e)}")
+            try:
+                matched_foods = await match_foods_to_database_batch(
+                    conn,
+                    [(item.name, float(item.quantity_grams)) for item in parsed_foods],
+                )
+            except HTTPException as e:
+                logger.error(f"[VOICE_TO_MEAL] Failed to match foods: {e.status_code} - {e.detail}")
+                raise
+            except Exception as e:
+                logger.error(f"[VOICE_TO_MEAL] Unexpected error matching foods: {str(e)}", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Failed to match foods: {str(e)}")
+
+        for item, matched in zip(parsed_foods, matched_foods):
+            _with_voice_display(item, matched)
 
         logger.info(f"[VOICE_TO_MEAL] Successfully matched all {len(matched_foods)} foods")
         return VoiceToMealResponse(transcript=transcript, foods=matched_foods)
@@ -1598,9 +3783,298 @@ async def voice_to_meal(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.post("/meals/voice-to-meal/stream")
+async def voice_to_meal_stream(request: Request, uid: str = Depends(get_current_uid)):
+    """Progressive variant of /meals/voice-to-meal over Server-Sent Events.
+
+    Events: `transcript` ({"transcript"}), `parsed` ({"foods": [{"name", "quantity_grams"}]}),
+    one `item` ({"index", "food"}) per food as it is matched or estimated, then `done`
+    with the same body /meals/voice-to-meal returns, or `error` ({"status", "detail"}).
+    """
+    if openai_client is None:
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY is not set")
+
+    # We parsed the form ourselves, so its spooled audio stays open until the stream closes it
+    form, audio = await _voice_upload_form(request, uid)
+
+    async def events() -> AsyncIterator[str]:
+        match_task: asyncio.Task | None = None
+        try:
+            transcript = await _transcribe_audio_file(audio)
+            logger.info(f"[VOICE_TO_MEAL] Transcript: {transcript}")
+            yield _sse("transcript", {"transcript": transcript})
+
+            parsed_foods = await _parse_voice_meal_text(transcript)
+            yield _sse("parsed", {"foods": [f.dict() for f in parsed_foods]})
+
+            settled: asyncio.Queue = asyncio.Queue()
+
+            async def _match() -> List[Dict[str, Any]]:
+                async with _require_pool().acquire() as conn:
+                    return await match_foods_to_database_batch(
+                        conn,
+                        [(item.name, float(item.quantity_grams)) for item in parsed_foods],
+                        on_match=lambda idx, matched: settled.put_nowait((idx, matched)),
+                    )
+
+            match_task = asyncio.create_task(_match())
+            match_task.add_done_callback(lambda _: settled.put_nowait(None))
+            while (entry := await settled.get()) is not None:
+                idx, matched = entry
+                yield _sse("item", {"index": idx, "food": _with_voice_display(parsed_foods[idx], matched)})
+
+            matched_foods = await match_task
+            yield _sse("done", VoiceToMealResponse(transcript=transcript, foods=matched_foods).dict())
+        except HTTPException as e:
+            logger.error(f"[VOICE_TO_MEAL] Stream failed: {e.status_code} - {e.detail}")
+            yield _sse("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"[VOICE_TO_MEAL] Stream failed: {type(e).__name__}: {str(e)}", exc_info=True)
+            yield _sse("error", {"status": 500, "detail": str(e)})
+        finally:
+            await form.close()
+            if match_task is not None and not match_task.done():
+                match_task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _with_voice_display(item: VoiceToMealFoodItem, matched: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the confirmation UI's display fields to a matched voice food (in place)."""
+    matched["displayQuantity"] = round(float(item.quantity_grams), 1)
+    matched["displayUnit"] = "g"
+    logger.info(f"[VOICE_TO_MEAL] Matched: {item.name} -> food_id={matched.get('food_id')}, needs_review={matched.get('needs_review', False)}")
+    return matched
+
+
+_idempotency_stats: Dict[str, int] = {"executed": 0, "replayed": 0, "mismatched": 0}
+
+
+async def _idempotent(
+    conn: asyncpg.Connection,
+    uid: str,
+    key: str | None,
+    route: str,
+    payload: Any,
+    work: Callable[[], Awaitable[Any]],
+) -> Any:
+    """Run `work` at most once per (user, Idempotency-Key) and replay its response to retries.
+
+    Without a key `work` just runs. With one, claiming the key, `work` and storing its
+    result share one transaction on `conn`: a concurrent retry blocks on the key row until
+    the first attempt commits (and then replays it) or rolls back (and then runs itself).
+    Failed attempts store nothing, so they can be retried. Reusing a key for a different
+    request is a 422.
+    """
+    if not key:
+        return await work()
+    if len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 255 characters")
+
+    request_hash = _idempotency_hash(payload)
+    user_id = _uuid(uid)
+    async with conn.transaction():
+        claimed = await conn.fetchval(
+            """
+            INSERT INTO idempotency_keys (user_id, key, route, request_hash, expires_at)
+            VALUES ($1, $2, $3, $4, now() + make_interval(secs => $5))
+            ON CONFLICT (user_id, key) DO UPDATE SET
+                route = EXCLUDED.route,
+                request_hash = EXCLUDED.request_hash,
+                status_code = NULL,
+                response = NULL,
+                created_at = now(),
+                expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at <= now()
+            RETURNING true
+            """,
+            user_id,
+            key,
+            route,
+            request_hash,
+            IDEMPOTENCY_TTL_HOURS * 3600,
+        )
+        if not claimed:
+            stored = await conn.fetchrow(
+                "SELECT route, request_hash, status_code, response FROM idempotency_keys WHERE user_id = $1 AND key = $2",
+                user_id,
+                key,
+            )
+            if stored is None or stored["response"] is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress", headers={"Retry-After": "1"})
+            if stored["route"] != route or stored["request_hash"] != request_hash:
+                _idempotency_stats["mismatched"] += 1
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            _idempotency_stats["replayed"] += 1
+            logger.info(f"[IDEMPOTENCY] Replaying {route} for user={uid}, key={key}")
+            return JSONResponse(
+                content=json.loads(stored["response"]),
+                status_code=stored["status_code"],
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        result = await work()
+        await conn.execute(
+            "UPDATE idempotency_keys SET status_code = 200, response = $3::jsonb WHERE user_id = $1 AND key = $2",
+            user_id,
+            key,
+            json.dumps(jsonable_encoder(result)),
+        )
+        _idempotency_stats["executed"] += 1
+        return result
+
+
+def _idempotency_hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+
+async def _claim_idempotency_keys(
+    conn: asyncpg.Connection, uid: str, route: str, hashes: Dict[str, str]
+) -> Dict[str, asyncpg.Record]:
+    """Claim several keys at once, as _idempotent does for one; call inside a transaction.
+    Returns the stored rows (route, request_hash, response) of keys that were already
+    used; every other key in `hashes` is now claimed for the caller to run and store."""
+    user_id = _uuid(uid)
+    claimed = await conn.fetch(
+        """
+        INSERT INTO idempotency_keys (user_id, key, route, request_hash, expires_at)
+        SELECT $1, k.key, $2, k.request_hash, now() + make_interval(secs => $5)
+        FROM unnest($3::text[], $4::text[]) AS k(key, request_hash)
+        ON CONFLICT (user_id, key) DO UPDATE SET
+            route = EXCLUDED.route,
+            request_hash = EXCLUDED.request_hash,
+            status_code = NULL,
+            response = NULL,
+            created_at = now(),
+            expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at <= now()
+        RETURNING key
+        """,
+        user_id,
+        route,
+        list(hashes),
+        list(hashes.values()),
+        IDEMPOTENCY_TTL_HOURS * 3600,
+    )
+    used = set(hashes) - {r["key"] for r in claimed}
+    if not used:
+        return {}
+    rows = await conn.fetch(
+        "SELECT key, route, request_hash, response FROM idempotency_keys WHERE user_id = $1 AND key = ANY($2::text[])",
+        user_id,
+        list(used),
+    )
+    return {r["key"]: r for r in rows}
+
+
+async def _store_idempotent_responses(conn: asyncpg.Connection, uid: str, responses: Dict[str, Any]) -> None:
+    """Store the responses of keys claimed with _claim_idempotency_keys, in the same transaction."""
+    if not responses:
+        return
+    await conn.execute(
+        """
+        UPDATE idempotency_keys AS k
+        SET status_code = 200, response = r.response::jsonb
+        FROM unnest($2::text[], $3::text[]) AS r(key, response)
+        WHERE k.user_id = $1 AND k.key = r.key
+        """,
+        _uuid(uid),
+        list(responses),
+        [json.dumps(jsonable_encoder(v)) for v in responses.values()],
+    )
+    _idempotency_stats["executed"] += len(responses)
+
+
+# One round trip, one statement (so atomic): the insert is gated on the profile existing, the
+# meal is pending_review if any of its foods still are, and its foods are touched, approved and
+# queued for enrichment. All CTEs see the same snapshot, so pending is counted before approval.
+_LOG_MEAL_SQL = """
+WITH profile AS (
+    SELECT id FROM profiles WHERE id = $2
+),
+pending AS (
+    SELECT count(*) AS n FROM foods WHERE id = ANY($13::uuid[]) AND review_status = 'pending_review'
+),
+ins AS (
+    INSERT INTO meals (
+        id, user_id, meal_type, foods,
+        total_calories, total_protein, total_carbs, total_fat,
+        image_base64, image_sha256, logging_method, notes, timestamp, review_status, finalized_at
+    )
+    SELECT
+        $1::uuid, profile.id, $3::text, $4::jsonb,
+        $5::float8, $6::float8, $7::float8, $8::float8,
+        $9::text, $14::text, $10::text, $11::text, $12::timestamptz,
+        CASE WHEN pending.n > 0 THEN 'pending_review' ELSE 'finalized' END,
+        CASE WHEN pending.n = 0 THEN now() END
+    FROM profile, pending
+    RETURNING *
+),
+touched AS (
+    UPDATE foods
+    SET last_used_at = now(),
+        review_status = CASE WHEN review_status = 'pending_review' THEN 'approved' ELSE review_status END
+    WHERE id = ANY($13::uuid[]) AND EXISTS (SELECT 1 FROM ins)
+    RETURNING id
+),
+queued AS (
+    UPDATE foods_ingestion_queue
+    SET status = 'ready', updated_at = now()
+    WHERE food_id = ANY($13::uuid[]) AND status = 'pending' AND EXISTS (SELECT 1 FROM ins)
+    RETURNING food_id
+)
+SELECT ins.*,
+       (SELECT n FROM pending) AS pending_foods,
+       (SELECT count(*) FROM touched) AS foods_touched,
+       (SELECT count(*) FROM queued) AS queue_ready
+FROM ins
+"""
+
+
+def _meal_food_ids(foods: List[Dict[str, Any]]) -> List[uuid.UUID]:
+    food_ids: List[uuid.UUID] = []
+    for f in foods:
+        fid = f.get("food_id")
+        if not fid:
+            continue
+        try:
+            food_ids.append(uuid.UUID(str(fid)))
+        except Exception:
+            continue
+    return food_ids
+
+
+def _log_meal_args(meal_log: "MealLog", food_ids: List[uuid.UUID]) -> tuple:
+    return (
+        _uuid(meal_log.id),
+        _uuid(meal_log.user_id),
+        meal_log.meal_type,
+        json.dumps(meal_log.foods),
+        float(meal_log.total_calories),
+        float(meal_log.total_protein),
+        float(meal_log.total_carbs),
+        float(meal_log.total_fat),
+        meal_log.image_base64,
+        meal_log.logging_method,
+        meal_log.notes,
+        meal_log.timestamp,
+        food_ids,
+        meal_log.image_sha256,
+    )
+
+
 @api_router.post("/meals/log", response_model=MealLog)
-async def log_meal(meal_data: MealLogCreate, uid: str = Depends(get_current_uid)):
-    """Log a meal manually or save photo analysis result"""
+async def log_meal(
+    meal_data: MealLogCreate,
+    uid: str = Depends(get_current_uid),
+    idempotency_key: str | None = Header(default=None),
+):
+    """Log a meal manually or save photo analysis result.
+    Retries carrying the same Idempotency-Key header get the original response back."""
     try:
         logger.info(f"[LOG_MEAL] Starting meal log for user={meal_data.user_id}, meal_type={meal_data.meal_type}, foods_count={len(meal_data.foods)}")
         _require_user_match(uid, meal_data.user_id)
@@ -1623,109 +4097,28 @@ async def log_meal(meal_data: MealLogCreate, uid: str = Depends(get_current_uid)
         )
 
         meal_log = MealLog(**meal_dict)
+        # The photo goes to the blob store; the row only references it
+        meal_log.image_sha256 = await _store_meal_image_base64(meal_log.image_base64)
+        meal_log.image_base64 = None
+
+        food_ids = _meal_food_ids(meal_data.foods)
+
         pool = _require_pool()
         async with pool.acquire() as conn:
-            profile_exists = await conn.fetchval(
-                "SELECT 1 FROM profiles WHERE id = $1",
-                _uuid(meal_data.user_id),
-            )
-            logger.info(f"[LOG_MEAL] Profile check: exists={profile_exists}")
-            if not profile_exists:
-                raise HTTPException(status_code=404, detail="User not found")
-
-            # Check if any foods in this meal are pending_review
-            food_ids_to_check: List[uuid.UUID] = []
-            for f in meal_data.foods:
-                fid = f.get("food_id")
-                if fid:
-                    try:
-                        food_ids_to_check.append(uuid.UUID(str(fid)))
-                    except Exception:
-                        pass
-            
-            logger.info(f"[LOG_MEAL] Checking review status for {len(food_ids_to_check)} food IDs")
-            
-            meal_review_status = "finalized"
-            if food_ids_to_check:
-                pending_count = await conn.fetchval(
-                    "SELECT COUNT(*) FROM foods WHERE id = ANY($1::uuid[]) AND review_status = 'pending_review'",
-                    food_ids_to_check,
-                )
-                logger.info(f"[LOG_MEAL] Found {pending_count} pending foods")
-                if pending_count and int(pending_count) > 0:
-                    meal_review_status = "pending_review"
-                    logger.info(f"[LOG_MEAL] Meal contains {pending_count} pending foods, marking as pending_review")
-            else:
-                logger.info(f"[LOG_MEAL] No food IDs to check, using finalized status")
 
-            logger.info(f"[LOG_MEAL] Inserting meal with review_status={meal_review_status}")
-            row = await conn.fetchrow(
-                """
-                INSERT INTO meals (
-                    id, user_id, meal_type, foods,
-                    total_calories, total_protein, total_carbs, total_fat,
-                    image_base64, logging_method, notes, timestamp, review_status
-                ) VALUES (
-                    $1,$2,$3,$4::jsonb,
-                    $5,$6,$7,$8,
-                    $9,$10,$11,$12,$13
+            async def _insert() -> MealLog:
+                row = await conn.fetchrow(_LOG_MEAL_SQL, *_log_meal_args(meal_log, food_ids))
+                if row is None:
+                    # The insert is gated on the profile; nothing was written
+                    raise HTTPException(status_code=404, detail="User not found")
+                logger.info(
+                    f"[LOG_MEAL] Meal inserted, meal_id={row['id']}, review_status={row['review_status']}, "
+                    f"pending_foods={row['pending_foods']}, foods_touched={row['foods_touched']}, queue_ready={row['queue_ready']}"
                 )
-                RETURNING *
-                """,
-                _uuid(meal_log.id),
-                _uuid(meal_log.user_id),
-                meal_log.meal_type,
-                json.dumps(meal_log.foods),
-                float(meal_log.total_calories),
-                float(meal_log.total_protein),
-                float(meal_log.total_carbs),
-                float(meal_log.total_fat),
-                meal_log.image_base64,
-                meal_log.logging_method,
-                meal_log.notes,
-                meal_log.timestamp,
-                meal_review_status,
-            )
-
-            logger.info(f"[LOG_MEAL] Meal inserted successfully, meal_id={row['id']}")
-
-            food_ids: List[uuid.UUID] = []
-            for f in meal_data.foods:
-                fid = f.get("food_id")
-                if not fid:
-                    continue
-                try:
-                    food_ids.append(uuid.UUID(str(fid)))
-                except Exception:
-                    continue
+                return MealLog(**_meal_from_record(row))
 
-            if food_ids:
-                logger.info(f"[LOG_MEAL] Updating last_used_at for {len(food_ids)} foods")
-                await conn.execute(
-                    "UPDATE foods SET last_used_at = now() WHERE id = ANY($1::uuid[])",
-                    food_ids,
-                )
-                
-                # Mark pending foods as approved and queue items as ready when meal is saved
-                # This allows immediate enrichment without waiting for finalize endpoint
-                approved_count = await conn.execute(
-                    "UPDATE foods SET review_status = 'approved' WHERE id = ANY($1::uuid[]) AND review_status = 'pending_review'",
-                    food_ids,
-                )
-                
-                ready_count = await conn.execute(
-                    "UPDATE foods_ingestion_queue SET status = 'ready', updated_at = now() WHERE food_id = ANY($1::uuid[]) AND status = 'pending'",
-                    food_ids,
-                )
-                
-                logger.info(f"[LOG_MEAL] Auto-approved {approved_count} pending foods, marked {ready_count} queue items as ready")
+            meal_response = await _idempotent(conn, uid, idempotency_key, "meals.log", meal_data, _insert)
 
-        if not row:
-            logger.error(f"[LOG_MEAL] Failed to insert meal - no row returned")
-            raise HTTPException(status_code=500, detail="Failed to log meal")
-        
-        logger.info(f"[LOG_MEAL] Converting row to MealLog response")
-        meal_response = MealLog(**_meal_from_record(row))
         logger.info(f"[LOG_MEAL] Successfully logged meal, returning response")
         return meal_response
     except HTTPException as e:
@@ -1736,6 +4129,226 @@ async def log_meal(meal_data: MealLogCreate, uid: str = Depends(get_current_uid)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Bulk variant of _LOG_MEAL_SQL: all meals go in with one multi-row insert. A meal is
+# pending_review if any of its own foods are; meal_foods pairs each meal id with its food ids.
+_LOG_MEALS_BULK_SQL = """
+WITH profile AS (
+    SELECT id FROM profiles WHERE id = $1
+),
+input AS (
+    SELECT *
+    FROM unnest(
+        $2::uuid[], $3::text[], $4::jsonb[],
+        $5::float8[], $6::float8[], $7::float8[], $8::float8[],
+        $9::text[], $10::text[], $11::text[], $12::timestamptz[], $15::text[]
+    ) AS t(
+        id, meal_type, foods,
+        total_calories, total_protein, total_carbs, total_fat,
+        image_base64, logging_method, notes, ts, image_sha256
+    )
+),
+meal_foods AS (
+    SELECT * FROM unnest($13::uuid[], $14::uuid[]) AS t(meal_id, food_id)
+),
+pending AS (
+    SELECT DISTINCT mf.meal_id
+    FROM meal_foods mf
+    JOIN foods f ON f.id = mf.food_id
+    WHERE f.review_status = 'pending_review'
+),
+ins AS (
+    INSERT INTO meals (
+        id, user_id, meal_type, foods,
+        total_calories, total_protein, total_carbs, total_fat,
+        image_base64, image_sha256, logging_method, notes, timestamp, review_status, finalized_at
+    )
+    SELECT
+        i.id, profile.id, i.meal_type, i.foods,
+        i.total_calories, i.total_protein, i.total_carbs, i.total_fat,
+        i.image_base64, i.image_sha256, i.logging_method, i.notes, i.ts,
+        CASE WHEN p.meal_id IS NULL THEN 'finalized' ELSE 'pending_review' END,
+        CASE WHEN p.meal_id IS NULL THEN now() END
+    FROM input i
+    CROSS JOIN profile
+    LEFT JOIN pending p ON p.meal_id = i.id
+    RETURNING *
+),
+touched AS (
+    UPDATE foods
+    SET last_used_at = now(),
+        review_status = CASE WHEN review_status = 'pending_review' THEN 'approved' ELSE review_status END
+    WHERE id IN (SELECT food_id FROM meal_foods) AND EXISTS (SELECT 1 FROM ins)
+    RETURNING id
+),
+queued AS (
+    UPDATE foods_ingestion_queue
+    SET status = 'ready', updated_at = now()
+    WHERE food_id IN (SELECT food_id FROM meal_foods) AND status = 'pending' AND EXISTS (SELECT 1 FROM ins)
+    RETURNING food_id
+)
+SELECT ins.*,
+       (SELECT count(*) FROM touched) AS foods_touched,
+       (SELECT count(*) FROM queued) AS queue_ready
+FROM ins
+"""
+
+
+def _bulk_meal_log(user_id: str, raw: Dict[str, Any]) -> tuple[MealLog, MealLogCreate]:
+    """Validate one bulk item into a MealLog (totals computed as /meals/log does), plus the
+    /meals/log request it stands for, which its client_id is checked against. Raises ValueError."""
+    try:
+        item = BulkMealItem(**raw)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()))
+    try:
+        totals = {
+            f"total_{k}": float(sum(f[k] for f in item.foods))
+            for k in ("calories", "protein", "carbs", "fat")
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"each food needs numeric calories, protein, carbs and fat ({type(e).__name__}: {e})")
+    data = item.dict(exclude={"client_id", "timestamp"})
+    create = MealLogCreate(user_id=user_id, **data)
+    if item.timestamp is not None:
+        data["timestamp"] = item.timestamp
+    return MealLog(user_id=user_id, **data, **totals), create
+
+
+async def _insert_bulk_meals(
+    conn: asyncpg.Connection, user_id: str, valid: List[tuple[int, MealLog]], results: List[BulkMealResult]
+) -> None:
+    """Insert the validated meals with _LOG_MEALS_BULK_SQL and fill in their results."""
+    meals = [m for _, m in valid]
+    meal_ids = [_uuid(m.id) for m in meals]
+    pair_meals: List[uuid.UUID] = []
+    pair_foods: List[uuid.UUID] = []
+    for mid, m in zip(meal_ids, meals):
+        for fid in _meal_food_ids(m.foods):
+            pair_meals.append(mid)
+            pair_foods.append(fid)
+
+    started = time.perf_counter()
+    rows = await conn.fetch(
+        _LOG_MEALS_BULK_SQL,
+        _uuid(user_id),
+        meal_ids,
+        [m.meal_type for m in meals],
+        [json.dumps(m.foods) for m in meals],
+        [float(m.total_calories) for m in meals],
+        [float(m.total_protein) for m in meals],
+        [float(m.total_carbs) for m in meals],
+        [float(m.total_fat) for m in meals],
+        [m.image_base64 for m in meals],
+        [m.logging_method for m in meals],
+        [m.notes for m in meals],
+        [m.timestamp for m in meals],
+        pair_meals,
+        pair_foods,
+        [m.image_sha256 for m in meals],
+    )
+    if not rows:
+        # The insert is gated on the profile; nothing was written
+        raise HTTPException(status_code=404, detail="User not found")
+
+    by_id = {r["id"]: r for r in rows}
+    for (idx, _), mid in zip(valid, meal_ids):
+        row = by_id[mid]
+        results[idx].status = "created"
+        results[idx].meal = MealLog(**_meal_from_record(row), review_status=row["review_status"])
+    logger.info(
+        f"[LOG_MEAL_BULK] user={user_id} inserted={len(rows)} of {len(results)} "
+        f"foods_touched={rows[0]['foods_touched']} queue_ready={rows[0]['queue_ready']} "
+        f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+
+
+@api_router.post("/meals/log/bulk", response_model=BulkMealLogResponse)
+async def log_meals_bulk(
+    request: BulkMealLogRequest,
+    uid: str = Depends(get_current_uid),
+    idempotency_key: str | None = Header(default=None),
+):
+    """Log a batch of meals (e.g. queued while offline) in one statement.
+
+    Each item is validated on its own; valid items are inserted together and atomically,
+    invalid ones are reported without blocking the rest. Results keep input order.
+
+    An item's client_id is its idempotency key, shared with /meals/log: an item whose
+    client_id was already logged (by an earlier flush, or by a /meals/log save whose
+    response never arrived) is reported as "replayed" with the stored meal instead of
+    being inserted again. An Idempotency-Key header still replays a whole batch.
+    """
+    try:
+        _require_user_match(uid, request.user_id)
+        if len(request.meals) > MEALS_BULK_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {MEALS_BULK_MAX_ITEMS} meals per request")
+
+        results: List[BulkMealResult] = []
+        valid: List[tuple[int, MealLog]] = []
+        hashes: Dict[str, str] = {}  # client_id -> request hash, as /meals/log computes it
+        for idx, raw in enumerate(request.meals):
+            client_id = raw.get("client_id") if isinstance(raw, dict) else None
+            result = BulkMealResult(index=idx, client_id=str(client_id) if client_id is not None else None, status="invalid")
+            try:
+                if not isinstance(raw, dict):
+                    raise ValueError("meal must be an object")
+                if result.client_id is not None:
+                    if len(result.client_id) > 255:
+                        raise ValueError("client_id must be at most 255 characters")
+                    if result.client_id in hashes:
+                        raise ValueError("client_id appears more than once in this batch")
+                meal, create = _bulk_meal_log(request.user_id, raw)
+                try:
+                    meal.image_sha256 = await _store_meal_image_base64(meal.image_base64)
+                except HTTPException as e:
+                    raise ValueError(str(e.detail))
+                meal.image_base64 = None
+                valid.append((idx, meal))
+                if result.client_id is not None:
+                    hashes[result.client_id] = _idempotency_hash(create)
+            except ValueError as e:
+                result.error = str(e)
+            results.append(result)
+
+        pool = _require_pool()
+        async with pool.acquire() as conn:
+
+            async def _insert() -> BulkMealLogResponse:
+                async with conn.transaction():
+                    used = await _claim_idempotency_keys(conn, uid, "meals.log", hashes) if hashes else {}
+                    to_insert: List[tuple[int, MealLog]] = []
+                    for idx, meal in valid:
+                        result = results[idx]
+                        stored = used.get(result.client_id) if result.client_id is not None else None
+                        if stored is None:
+                            to_insert.append((idx, meal))
+                        elif stored["response"] is None:
+                            result.status, result.error = "in_progress", "A save with this client_id is still in progress"
+                        elif stored["route"] != "meals.log" or stored["request_hash"] != hashes[result.client_id]:
+                            _idempotency_stats["mismatched"] += 1
+                            result.error = "client_id was already used for a different meal"
+                        else:
+                            _idempotency_stats["replayed"] += 1
+                            result.status, result.meal = "replayed", MealLog(**json.loads(stored["response"]))
+                    if to_insert:
+                        await _insert_bulk_meals(conn, request.user_id, to_insert, results)
+                    await _store_idempotent_responses(conn, uid, {
+                        results[idx].client_id: results[idx].meal
+                        for idx, _ in to_insert
+                        if results[idx].client_id is not None
+                    })
+                counts = {status: sum(1 for r in results if r.status == status) for status in ("created", "replayed")}
+                failed = len(results) - counts["created"] - counts["replayed"]
+                return BulkMealLogResponse(**counts, failed=failed, results=results)
+
+            return await _idempotent(conn, uid, idempotency_key, "meals.log.bulk", request, _insert)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[LOG_MEAL_BULK] Unexpected error: {type(e).__name__}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 class PendingFoodUpdate(BaseModel):
     food_id: str
     name: str
@@ -1745,102 +4358,316 @@ class FinalizeMealRequest(BaseModel):
     meal_id: str
     food_updates: List[PendingFoodUpdate]
 
-@api_router.post("/meals/pending/finalize")
-async def finalize_pending_meal(request: FinalizeMealRequest, uid: str = Depends(get_current_uid)):
-    """Finalize a pending meal by confirming/editing pending foods"""
-    pool = _require_pool()
-    async with pool.acquire() as conn:
-        # Get the meal and verify ownership
-        meal = await conn.fetchrow(
-            "SELECT user_id, foods, review_status FROM meals WHERE id = $1",
-            _uuid(request.meal_id),
-        )
-        if not meal:
-            raise HTTPException(status_code=404, detail="Meal not found")
-        
-        _require_user_match(uid, str(meal["user_id"]))
+async def _finalize_meal(
+    conn: asyncpg.Connection,
+    request: FinalizeMealRequest,
+    uid: str,
+    renamed_foods: List[asyncpg.Record],
+) -> Dict[str, Any]:
+    """Finalize the meal on `conn`. Renamed food rows are appended to `renamed_foods`
+    for the caller to apply to food_name_index once the surrounding transaction commits."""
+    # Get the meal and verify ownership
+    meal = await conn.fetchrow(
+        "SELECT user_id, foods, review_status FROM meals WHERE id = $1",
+        _uuid(request.meal_id),
+    )
+    if not meal:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    
+    _require_user_match(uid, str(meal["user_id"]))
+    
+    if meal["review_status"] != "pending_review":
+        raise HTTPException(status_code=400, detail="Meal is not pending review")
+    
+    # Update food names if edited by user
+    for update in request.food_updates:
+        food_id = _uuid(update.food_id)
         
-        if meal["review_status"] != "pending_review":
-            raise HTTPException(status_code=400, detail="Meal is not pending review")
+        # Check if food is pending_review
+        food_status = await conn.fetchval(
+            "SELECT review_status FROM foods WHERE id = $1",
+            food_id,
+        )
         
-        # Update food names if edited by user
-        for update in request.food_updates:
-            food_id = _uuid(update.food_id)
+        if food_status == "pending_review":
+            # Update food name and mark as approved
+            renamed = await conn.fetchrow(
+                f"""
+                UPDATE foods 
+                SET name = $2, review_status = 'approved', updated_at = now()
+                WHERE id = $1
+                RETURNING {FoodNameIndex.COLUMNS}
+                """,
+                food_id,
+                update.name.strip(),
+            )
+            if renamed:
+                renamed_foods.append(renamed)
             
-            # Check if food is pending_review
-            food_status = await conn.fetchval(
-                "SELECT review_status FROM foods WHERE id = $1",
+            # Mark queue item as ready for processing (user has confirmed)
+            await conn.execute(
+                """
+                UPDATE foods_ingestion_queue
+                SET query = $2, status = 'ready', updated_at = now()
+                WHERE food_id = $1 AND status = 'pending'
+                """,
                 food_id,
+                update.name.strip(),
             )
             
-            if food_status == "pending_review":
-                # Update food name and mark as approved
-                await conn.execute(
-                    """
-                    UPDATE foods 
-                    SET name = $2, review_status = 'approved', updated_at = now()
-                    WHERE id = $1
-                    """,
-                    food_id,
-                    update.name.strip(),
-                )
-                
-                # Mark queue item as ready for processing (user has confirmed)
-                await conn.execute(
-                    """
-                    UPDATE foods_ingestion_queue
-                    SET query = $2, status = 'ready', updated_at = now()
-                    WHERE food_id = $1 AND status = 'pending'
-                    """,
-                    food_id,
-                    update.name.strip(),
-                )
-                
-                logger.info(f"User confirmed food: {update.name} (food_id={update.food_id}), queue marked as ready")
-        
-        # Update meal foods with new quantities if changed
-        foods_json = json.loads(meal["foods"]) if isinstance(meal["foods"], str) else meal["foods"]
-        for update in request.food_updates:
-            for food in foods_json:
-                if food.get("food_id") == update.food_id:
-                    food["name"] = update.name
-                    food["quantity"] = update.quantity
-                    # Recalculate macros based on new quantity (still 0 until enriched)
-                    multiplier = update.quantity / 100.0
-                    food["calories"] = round(food.get("calories_per_100g", 0) * multiplier, 2)
-                    food["protein"] = round(food.get("protein_per_100g", 0) * multiplier, 2)
-                    food["carbs"] = round(food.get("carbs_per_100g", 0) * multiplier, 2)
-                    food["fat"] = round(food.get("fat_per_100g", 0) * multiplier, 2)
-        
-        # Recalculate meal totals
-        total_calories = sum([f.get("calories", 0) for f in foods_json])
-        total_protein = sum([f.get("protein", 0) for f in foods_json])
-        total_carbs = sum([f.get("carbs", 0) for f in foods_json])
-        total_fat = sum([f.get("fat", 0) for f in foods_json])
-        
-        # Mark meal as finalized
-        await conn.execute(
+            logger.info(f"User confirmed food: {update.name} (food_id={update.food_id}), queue marked as ready")
+    
+    # Update meal foods with new quantities if changed
+    foods_json = json.loads(meal["foods"]) if isinstance(meal["foods"], str) else meal["foods"]
+    for update in request.food_updates:
+        for food in foods_json:
+            if food.get("food_id") == update.food_id:
+                food["name"] = update.name
+                food["quantity"] = update.quantity
+                # Recalculate macros based on new quantity (still 0 until enriched)
+                multiplier = update.quantity / 100.0
+                food["calories"] = round(food.get("calories_per_100g", 0) * multiplier, 2)
+                food["protein"] = round(food.get("protein_per_100g", 0) * multiplier, 2)
+                food["carbs"] = round(food.get("carbs_per_100g", 0) * multiplier, 2)
+                food["fat"] = round(food.get("fat_per_100g", 0) * multiplier, 2)
+    
+    # Recalculate meal totals
+    total_calories = sum([f.get("calories", 0) for f in foods_json])
+    total_protein = sum([f.get("protein", 0) for f in foods_json])
+    total_carbs = sum([f.get("carbs", 0) for f in foods_json])
+    total_fat = sum([f.get("fat", 0) for f in foods_json])
+    
+    # Mark meal as finalized
+    await conn.execute(
+        """
+        UPDATE meals
+        SET review_status = 'finalized',
+            finalized_at = now(),
+            foods = $2::jsonb,
+            total_calories = $3,
+            total_protein = $4,
+            total_carbs = $5,
+            total_fat = $6
+        WHERE id = $1
+        """,
+        _uuid(request.meal_id),
+        json.dumps(foods_json),
+        total_calories,
+        total_protein,
+        total_carbs,
+        total_fat,
+    )
+    
+    logger.info(f"Finalized meal {request.meal_id} with {len(request.food_updates)} confirmed foods")
+    
+    return {"status": "finalized", "meal_id": request.meal_id}
+
+
+@api_router.post("/meals/pending/finalize")
+async def finalize_pending_meal(
+    request: FinalizeMealRequest,
+    uid: str = Depends(get_current_uid),
+    idempotency_key: str | None = Header(default=None),
+):
+    """Finalize a pending meal by confirming/editing pending foods.
+    Retries carrying the same Idempotency-Key header get the original response back."""
+    pool = _require_pool()
+    renamed_foods: List[asyncpg.Record] = []
+    async with pool.acquire() as conn:
+        result = await _idempotent(
+            conn, uid, idempotency_key, "meals.pending.finalize", request,
+            lambda: _finalize_meal(conn, request, uid, renamed_foods),
+        )
+    # Only after commit: a rolled-back finalize must not leave the index ahead of the table
+    for row in renamed_foods:
+        food_name_index.upsert(row)
+    return result
+
+
+@api_router.get("/meals/images/{image_sha256}")
+async def get_meal_image(image_sha256: str, variant: str = "full", uid: str = Depends(get_current_uid)):
+    """Serve a meal photo (or its thumbnail with variant=thumb) from the blob store.
+    Only users with a meal referencing the image may read it."""
+    if not _BLOB_KEY_RE.match(image_sha256):
+        raise HTTPException(status_code=404, detail="Image not found")
+    if variant not in ("full", "thumb"):
+        raise HTTPException(status_code=400, detail="variant must be 'full' or 'thumb'")
+
+    pool = _require_pool()
+    async with pool.acquire() as conn:
+        owned = await conn.fetchval(
+            "SELECT 1 FROM meals WHERE user_id = $1 AND image_sha256 = $2 LIMIT 1",
+            _uuid(uid),
+            image_sha256,
+        )
+    if not owned:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    data = await blob_store.get(image_sha256, "thumb" if variant == "thumb" else None)
+    if data is None and variant == "thumb":
+        # Not decodable as an image when stored; fall back to the original
+        data = await blob_store.get(image_sha256)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(
+        content=data,
+        media_type=_image_mime(data),
+        headers={"Cache-Control": "private, max-age=31536000, immutable", "ETag": f'"{image_sha256}-{variant}"'},
+    )
+
+
+# Response field -> meals columns it is computed from. Projections select only these columns.
+_HISTORY_FIELDS: Dict[str, tuple[str, ...]] = {
+    "id": ("id",),
+    "user_id": ("user_id",),
+    "meal_type": ("meal_type",),
+    "foods": ("foods",),
+    "total_calories": ("total_calories",),
+    "total_protein": ("total_protein",),
+    "total_carbs": ("total_carbs",),
+    "total_fat": ("total_fat",),
+    "image_base64": ("image_base64",),
+    "image_sha256": ("image_sha256",),
+    "image_url": ("image_sha256",),
+    "thumbnail_url": ("image_sha256",),
+    "logging_method": ("logging_method",),
+    "notes": ("notes",),
+    "timestamp": ("timestamp",),
+    "review_status": ("review_status",),
+    "micros": ("foods",),
+}
+_HISTORY_VIEWS: Dict[str, tuple[str, ...]] = {
+    # Totals and timestamps only: what home, chef and the daily rings need
+    "summary": ("id", "meal_type", "timestamp", "total_calories", "total_protein", "total_carbs", "total_fat"),
+    "full": (
+        "id", "user_id", "meal_type", "foods", "total_calories", "total_protein", "total_carbs", "total_fat",
+        "image_base64", "image_url", "thumbnail_url", "logging_method", "notes", "timestamp", "micros",
+    ),
+}
+
+
+def _history_fields(view: str, fields: str | None) -> tuple[str, ...]:
+    """Resolve ?view= / ?fields= (fields wins) to the response fields, validated against _HISTORY_FIELDS."""
+    if fields:
+        requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [f for f in requested if f not in _HISTORY_FIELDS]
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown history fields: {', '.join(unknown) or '(none given)'}; allowed: {', '.join(_HISTORY_FIELDS)}",
+            )
+        return requested
+    if view not in _HISTORY_VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of: {', '.join(_HISTORY_VIEWS)}")
+    return _HISTORY_VIEWS[view]
+
+
+def _history_meal(record: asyncpg.Record, fields: tuple[str, ...]) -> Dict[str, Any]:
+    """Shape one projected meals row; field formatting matches _meal_from_record."""
+    out: Dict[str, Any] = {}
+    for f in fields:
+        if f == "micros":
+            continue
+        if f in ("image_sha256", "image_url", "thumbnail_url"):
+            urls = _meal_image_urls(record["image_sha256"])
+            if f in urls:
+                out[f] = urls[f]
+        elif f in ("id", "user_id"):
+            out[f] = str(record[f])
+        elif f == "foods":
+            out[f] = _meal_foods(record)
+        else:
+            out[f] = record[f]
+    return out
+
+
+async def _meal_micros(conn: asyncpg.Connection, foods_per_meal: List[Any]) -> List[Dict[str, float]]:
+    """Micronutrient totals per meal from each food's per-100g values and logged quantity."""
+    food_ids: list[uuid.UUID] = []
+    for foods in foods_per_meal:
+        foods = foods or []
+        if not isinstance(foods, list):
+            continue
+        for f in foods:
+            if not isinstance(f, dict):
+                continue
+            fid = f.get("food_id")
+            if not fid:
+                continue
+            try:
+                food_ids.append(uuid.UUID(str(fid)))
+            except Exception:
+                continue
+
+    foods_by_id: dict[str, dict] = {}
+    if food_ids:
+        food_rows = await conn.fetch(
             """
-            UPDATE meals
-            SET review_status = 'finalized',
-                foods = $2::jsonb,
-                total_calories = $3,
-                total_protein = $4,
-                total_carbs = $5,
-                total_fat = $6
-            WHERE id = $1
+            SELECT
+                id,
+                fiber_g_per_100g,
+                sugar_g_per_100g,
+                saturated_fat_g_per_100g,
+                sodium_mg_per_100g,
+                potassium_mg_per_100g,
+                calcium_mg_per_100g,
+                iron_mg_per_100g,
+                vitamin_c_mg_per_100g
+            FROM foods
+            WHERE id = ANY($1::uuid[])
             """,
-            _uuid(request.meal_id),
-            json.dumps(foods_json),
-            total_calories,
-            total_protein,
-            total_carbs,
-            total_fat,
+            list({*food_ids}),
         )
-        
-        logger.info(f"Finalized meal {request.meal_id} with {len(request.food_updates)} confirmed foods")
-        
-        return {"status": "finalized", "meal_id": request.meal_id}
+        for fr in food_rows:
+            foods_by_id[str(fr["id"])] = dict(fr)
+
+    out: List[Dict[str, float]] = []
+    for foods in foods_per_meal:
+        micros = {
+            "fiber_g": 0.0,
+            "sugar_g": 0.0,
+            "saturated_fat_g": 0.0,
+            "sodium_mg": 0.0,
+            "potassium_mg": 0.0,
+            "calcium_mg": 0.0,
+            "iron_mg": 0.0,
+            "vitamin_c_mg": 0.0,
+        }
+
+        foods = foods or []
+        if isinstance(foods, list):
+            for f in foods:
+                if not isinstance(f, dict):
+                    continue
+                fid = f.get("food_id")
+                if not fid:
+                    continue
+                row = foods_by_id.get(str(fid))
+                if not row:
+                    continue
+
+                grams = f.get("quantity")
+                if grams is None:
+                    grams = f.get("displayQuantity")
+                try:
+                    grams_f = float(grams or 0)
+                except Exception:
+                    grams_f = 0.0
+                if grams_f <= 0:
+                    continue
+                ratio = grams_f / 100.0
+
+                micros["fiber_g"] += float(row.get("fiber_g_per_100g") or 0) * ratio
+                micros["sugar_g"] += float(row.get("sugar_g_per_100g") or 0) * ratio
+                micros["saturated_fat_g"] += float(row.get("saturated_fat_g_per_100g") or 0) * ratio
+                micros["sodium_mg"] += float(row.get("sodium_mg_per_100g") or 0) * ratio
+                micros["potassium_mg"] += float(row.get("potassium_mg_per_100g") or 0) * ratio
+                micros["calcium_mg"] += float(row.get("calcium_mg_per_100g") or 0) * ratio
+                micros["iron_mg"] += float(row.get("iron_mg_per_100g") or 0) * ratio
+                micros["vitamin_c_mg"] += float(row.get("vitamin_c_mg_per_100g") or 0) * ratio
+
+        out.append(micros)
+    return out
 
 
 @api_router.get("/meals/history/{user_id}")
@@ -1848,20 +4675,25 @@ async def get_meal_history(
     user_id: str, 
     days: int = 7, 
     timezone_offset: int = 0,  # Offset in minutes from UTC (e.g., IST = 330)
+    view: str = "full",  # "summary" | "full"
+    fields: str | None = None,  # comma-separated response fields; overrides view
     uid: str = Depends(get_current_uid)
 ):
-    """Get meal history for user in their local timezone"""
+    """Get meal history for user in their local timezone.
+    view=summary (or an explicit fields= list) selects only the needed columns."""
     _require_user_match(uid, user_id)
     if days < 1 or days > 3650:
         raise HTTPException(status_code=400, detail="Invalid days")
+    selected = _history_fields(view, fields)
+    columns = ", ".join(dict.fromkeys(c for f in selected for c in _HISTORY_FIELDS[f]))
 
     pool = _require_pool()
     async with pool.acquire() as conn:
         # Calculate cutoff time in user's timezone
         # Convert user's "now" to UTC for comparison
         rows = await conn.fetch(
-            """
-            SELECT *
+            f"""
+            SELECT {columns}
             FROM meals
             WHERE user_id = $1
               AND timestamp >= (now() AT TIME ZONE 'UTC' + make_interval(mins => $3::int) - make_interval(days => $2::int))
@@ -1873,91 +4705,11 @@ async def get_meal_history(
             int(timezone_offset),
         )
 
-        meals = [_meal_from_record(r) for r in rows]
-
-        food_ids: list[uuid.UUID] = []
-        for m in meals:
-            foods = m.get("foods") or []
-            if not isinstance(foods, list):
-                continue
-            for f in foods:
-                if not isinstance(f, dict):
-                    continue
-                fid = f.get("food_id")
-                if not fid:
-                    continue
-                try:
-                    food_ids.append(uuid.UUID(str(fid)))
-                except Exception:
-                    continue
-
-        foods_by_id: dict[str, dict] = {}
-        if food_ids:
-            food_rows = await conn.fetch(
-                """
-                SELECT
-                    id,
-                    fiber_g_per_100g,
-                    sugar_g_per_100g,
-                    saturated_fat_g_per_100g,
-                    sodium_mg_per_100g,
-                    potassium_mg_per_100g,
-                    calcium_mg_per_100g,
-                    iron_mg_per_100g,
-                    vitamin_c_mg_per_100g
-                FROM foods
-                WHERE id = ANY($1::uuid[])
-                """,
-                list({*food_ids}),
-            )
-            for fr in food_rows:
-                foods_by_id[str(fr["id"])] = dict(fr)
-
-        for m in meals:
-            micros = {
-                "fiber_g": 0.0,
-                "sugar_g": 0.0,
-                "saturated_fat_g": 0.0,
-                "sodium_mg": 0.0,
-                "potassium_mg": 0.0,
-                "calcium_mg": 0.0,
-                "iron_mg": 0.0,
-                "vitamin_c_mg": 0.0,
-            }
+        meals = [_history_meal(r, selected) for r in rows]
 
-            foods = m.get("foods") or []
-            if isinstance(foods, list):
-                for f in foods:
-                    if not isinstance(f, dict):
-                        continue
-                    fid = f.get("food_id")
-                    if not fid:
-                        continue
-                    row = foods_by_id.get(str(fid))
-                    if not row:
-                        continue
-
-                    grams = f.get("quantity")
-                    if grams is None:
-                        grams = f.get("displayQuantity")
-                    try:
-                        grams_f = float(grams or 0)
-                    except Exception:
-                        grams_f = 0.0
-                    if grams_f <= 0:
-                        continue
-                    ratio = grams_f / 100.0
-
-                    micros["fiber_g"] += float(row.get("fiber_g_per_100g") or 0) * ratio
-                    micros["sugar_g"] += float(row.get("sugar_g_per_100g") or 0) * ratio
-                    micros["saturated_fat_g"] += float(row.get("saturated_fat_g_per_100g") or 0) * ratio
-                    micros["sodium_mg"] += float(row.get("sodium_mg_per_100g") or 0) * ratio
-                    micros["potassium_mg"] += float(row.get("potassium_mg_per_100g") or 0) * ratio
-                    micros["calcium_mg"] += float(row.get("calcium_mg_per_100g") or 0) * ratio
-                    micros["iron_mg"] += float(row.get("iron_mg_per_100g") or 0) * ratio
-                    micros["vitamin_c_mg"] += float(row.get("vitamin_c_mg_per_100g") or 0) * ratio
-
-            m["micros"] = micros
+        if "micros" in selected:
+            for m, micros in zip(meals, await _meal_micros(conn, [_meal_foods(r) for r in rows])):
+                m["micros"] = micros
 
     return {"meals": meals, "count": len(meals)}
 
@@ -2463,6 +5215,7 @@ async def admin_foods_sync(
                         publication_date = COALESCE($21, publication_date),
                         is_generic = COALESCE($22, is_generic),
                         review_status = 'approved',
+                        updated_at = now(),
                         verified = true,
                         sync_status = 'ok',
                         sync_error = NULL,
@@ -2600,42 +5353,267 @@ async def admin_foods_sync(
                         retry_after_ts,
                     )
 
+        if food_name_index.ready:
+            await food_name_index.refresh(conn)
+
+        await conn.execute("DELETE FROM food_estimate_cache WHERE expires_at < now()")
+        await conn.execute("DELETE FROM idempotency_keys WHERE expires_at < now()")
+
     logger.info(f"Sync complete: selected={len(rows)}, ok={ok}, failed={failed}, skipped={skipped}")
     return {"selected": len(rows), "ok": ok, "failed": failed, "skipped": skipped}
  
  
-@api_router.post("/chef/generate")
-async def generate_recipe(request: dict, uid: str = Depends(get_current_uid)):
+async def _backfill_meal_images_batch(conn: asyncpg.Connection, after: uuid.UUID | None, batch_size: int) -> tuple[int, int, uuid.UUID | None]:
+    """Move one batch of inline meals.image_base64 photos into the blob store.
+    Returns (moved, failed, last id scanned). Rows that fail to decode keep their inline
+    copy and get image_backfill_error set, so later runs skip them."""
+    rows = await conn.fetch(
+        """
+        SELECT id, image_base64
+        FROM meals
+        WHERE image_base64 IS NOT NULL AND image_backfill_error IS NULL AND ($1::uuid IS NULL OR id > $1)
+        ORDER BY id
+        LIMIT $2
+        """,
+        after,
+        batch_size,
+    )
+    if not rows:
+        return 0, 0, None
+
+    ids: List[uuid.UUID] = []
+    keys: List[str] = []
+    failed_ids: List[uuid.UUID] = []
+    errors: List[str] = []
+    for r in rows:
+        try:
+            keys.append(await _store_meal_image(_decode_base64_image(r["image_base64"])))
+            ids.append(r["id"])
+        except Exception as e:
+            failed_ids.append(r["id"])
+            errors.append(f"{type(e).__name__}: {str(e)}"[:500])
+            logger.warning(f"[MEAL_IMAGES] Could not move image for meal {r['id']}: {str(e)}")
+
+    # Blobs are written first, so a crash here only leaves unreferenced (content-addressed) blobs
+    if ids:
+        await conn.execute(
+            """
+            UPDATE meals m
+            SET image_sha256 = u.sha, image_base64 = NULL
+            FROM unnest($1::uuid[], $2::text[]) AS u(id, sha)
+            WHERE m.id = u.id AND m.image_base64 IS NOT NULL
+            """,
+            ids,
+            keys,
+        )
+    if failed_ids:
+        await conn.execute(
+            """
+            UPDATE meals m
+            SET image_backfill_error = u.error
+            FROM unnest($1::uuid[], $2::text[]) AS u(id, error)
+            WHERE m.id = u.id
+            """,
+            failed_ids,
+            errors,
+        )
+    _blob_stats["backfilled"] += len(ids)
+    return len(ids), len(failed_ids), rows[-1]["id"]
+
+
+@api_router.post("/admin/meals/images/backfill")
+async def admin_meal_images_backfill(
+    batch_size: int = MEAL_IMAGE_BACKFILL_BATCH_SIZE,
+    max_batches: int = 20,
+    after: str | None = None,
+    retry_failed: bool = False,
+    x_admin_key: str | None = Header(default=None),
+):
+    """Move inline meal photos into the blob store, batch_size rows at a time.
+
+    Re-run, passing the returned `next_after` as `after`, until `remaining` is 0; each
+    batch commits on its own. Rows whose photo cannot be decoded are marked and counted
+    in `unmovable` instead of `remaining`; `retry_failed=true` clears the marks first.
+    """
+    _require_admin_key(x_admin_key)
+    batch_size = max(1, min(batch_size, 500))
+    cursor = _uuid(after) if after else None
+
+    moved = failed = batches = 0
+    pool = _require_pool()
+    async with pool.acquire() as conn:
+        if retry_failed:
+            await conn.execute("UPDATE meals SET image_backfill_error = NULL WHERE image_backfill_error IS NOT NULL")
+        for _ in range(max(1, max_batches)):
+            n_moved, n_failed, last = await _backfill_meal_images_batch(conn, cursor, batch_size)
+            if last is None:
+                # Past the last row: the next run starts over from the beginning
+                cursor = None
+                break
+            cursor = last
+            moved += n_moved
+            failed += n_failed
+            batches += 1
+        counts = await conn.fetchrow(
+            """
+            SELECT count(*) FILTER (WHERE image_backfill_error IS NULL) AS remaining,
+                   count(*) FILTER (WHERE image_backfill_error IS NOT NULL) AS unmovable
+            FROM meals
+            WHERE image_base64 IS NOT NULL
+            """
+        )
+
+    remaining, unmovable = int(counts["remaining"] or 0), int(counts["unmovable"] or 0)
+    logger.info(
+        f"[MEAL_IMAGES] Backfill: batches={batches}, moved={moved}, failed={failed}, "
+        f"remaining={remaining}, unmovable={unmovable}"
+    )
+    return {
+        "batches": batches,
+        "moved": moved,
+        "failed": failed,
+        "remaining": remaining,
+        "unmovable": unmovable,
+        "next_after": str(cursor) if cursor else None,
+    }
+
+
+@api_router.get("/admin/cache/stats")
+async def admin_cache_stats(x_admin_key: str | None = Header(default=None)):
+    """Hit/miss counters for the in-process caches and image preprocessing totals."""
+    _require_admin_key(x_admin_key)
+    parses = _voice_parse_stats["local_hits"] + _voice_parse_stats["llm_fallbacks"]
+    return {
+        "image_analysis": image_analysis_cache.snapshot(),
+        "food_estimates": {**_estimate_cache_stats, "lru_entries": len(_estimate_lru)},
+        "food_validation_batches": _validation_batch_stats,
+        "food_name_index": {"ready": food_name_index.ready, "names": len(food_name_index)},
+        "food_portions": {
+            "ready": food_portion_table.ready,
+            "entries": len(food_portion_table),
+            "samples_ingested": food_portion_table.samples_ingested,
+        },
+        "presence_gate": _presence_gate_stats,
+        "voice_upload": _voice_upload_stats,
+        "voice_parse": {
+            **_voice_parse_stats,
+            "hit_rate": round(_voice_parse_stats["local_hits"] / parses, 3) if parses else 0.0,
+            "fallback_rate": round(_voice_parse_stats["llm_fallbacks"] / parses, 3) if parses else 0.0,
+        },
+        "audio_transcode": {
+            **_audio_transcode_stats,
+            "bytes_saved": _audio_transcode_stats["bytes_in"] - _audio_transcode_stats["bytes_out"],
+        },
+        "idempotency": _idempotency_stats,
+        "blob_store": {**_blob_stats, "backend": BLOB_STORE_BACKEND},
+        "llm_single_flight": llm_single_flight.snapshot(),
+        "llm_bulkhead": llm_bulkhead.snapshot(),
+        "llm_calls": llm_metrics.snapshot(),
+        "image_preprocess": {
+            **_image_prep_stats,
+            "bytes_saved": _image_prep_stats["bytes_in"] - _image_prep_stats["bytes_out"],
+            "avg_ms": round(_image_prep_stats["total_ms"] / _image_prep_stats["images"], 1) if _image_prep_stats["images"] else 0.0,
+        },
+    }
+
+
+@api_router.post("/chef/generate", dependencies=[Depends(get_current_uid)])
+async def generate_recipe(request: dict):
     """Generate personalized recipe using AI"""
     try:
-        _ = uid
         if openai_client is None:
             raise RuntimeError("OPENAI_API_KEY is not set")
 
         prompt = request.get("prompt", "")
 
-        response = await openai_client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional chef and nutritionist. Always respond with valid JSON only.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"},
+        content = await _chat_json_content(
+            OPENAI_MODEL, _chef_messages(prompt), temperature=CHEF_TEMPERATURE, purpose="recipe"
         )
-
-        content = response.choices[0].message.content if response.choices else ""
         extracted = _extract_json_from_text(content)
         recipe = json.loads(extracted)
         return {"recipe": recipe}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating recipe: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.post("/chef/generate/stream", dependencies=[Depends(get_current_uid)])
+async def generate_recipe_stream(request: dict):
+    """Streaming variant of /chef/generate over Server-Sent Events.
+
+    Events: `delta` ({"text"}) per token chunk, `section` ({"key", "value"}) as each
+    top-level recipe field completes, then `done` with the same {"recipe": ...}
+    payload /chef/generate returns, or `error` ({"detail"}; plus "status" and
+    "retry_after" when the AI bulkhead is saturated).
+    """
+    if openai_client is None:
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY is not set")
+
+    messages = _chef_messages(request.get("prompt", ""))
+
+    async def events() -> AsyncIterator[str]:
+        stream = None
+        parts: List[str] = []
+        scanner = JsonSectionScanner()
+        try:
+            # The slot is held for the whole token stream; taken here so it is always released
+            async with llm_metrics.track("recipe", OPENAI_MODEL) as call:
+                async with llm_bulkhead.slot(LLM_PURPOSE_CLASS["recipe"]) as queue_ms:
+                    call["queue_ms"] = queue_ms
+                    raw = await openai_client.chat.completions.with_raw_response.create(
+                        model=OPENAI_MODEL,
+                        messages=messages,
+                        temperature=CHEF_TEMPERATURE,
+                        response_format={"type": "json_object"},
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                    call["retries"] = raw.retries_taken
+                    stream = raw.parse()
+                    async for chunk in stream:
+                        # The final chunk carries usage and no choices
+                        if chunk.usage is not None:
+                            call["prompt_tokens"] = chunk.usage.prompt_tokens
+                            call["completion_tokens"] = chunk.usage.completion_tokens
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if not delta:
+                            continue
+                        parts.append(delta)
+                        yield _sse("delta", {"text": delta})
+                        for key, value in scanner.feed(delta):
+                            yield _sse("section", {"key": key, "value": value})
+
+            recipe = json.loads(_extract_json_from_text("".join(parts)))
+            yield _sse("done", {"recipe": recipe})
+        except HTTPException as e:
+            logger.warning(f"Recipe stream rejected: {e.detail}")
+            yield _sse("error", {"detail": e.detail, "status": e.status_code, "retry_after": (e.headers or {}).get("Retry-After")})
+        except Exception as e:
+            logger.error(f"Error streaming recipe: {str(e)}")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            if stream is not None:
+                await stream.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _chef_messages(prompt: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            "role": "system",
+            "content": "You are a professional chef and nutritionist. Always respond with valid JSON only.",
+        },
+        {"role": "user", "content": prompt},
+    ]
+
+
 # Include router
 app.include_router(api_router)
 
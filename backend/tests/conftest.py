@@ -0,0 +1,45 @@
+"""Unit tests for pure server.py logic; no database, OpenAI or network access needed.
+
+    cd backend && python -m pytest tests
+"""
+
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server  # noqa: E402
+
+
+def food_row(name: str, **overrides):
+    row = {
+        "id": uuid.uuid4(),
+        "name": name,
+        "category": "test",
+        "calories_per_100g": 100.0,
+        "protein_per_100g": 5.0,
+        "carbs_per_100g": 15.0,
+        "fat_per_100g": 3.0,
+        "is_vegetarian": True,
+    }
+    row.update(overrides)
+    return row
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    """A small ready FoodNameIndex installed as server.food_name_index, with an empty portion table."""
+    index = server.FoodNameIndex()
+    for name in (
+        "Roti", "Dal", "Rice", "Idli", "Sambar", "Curd", "Egg", "Mango",
+        "Bread and Butter", "Paneer Butter Masala", "Chicken Curry",
+    ):
+        index.upsert(food_row(name))
+    index.ready = True
+    monkeypatch.setattr(server, "food_name_index", index)
+    monkeypatch.setattr(server, "food_portion_table", server.FoodPortionTable())
+    monkeypatch.setattr(server, "VOICE_LOCAL_PARSE", True)
+    return index
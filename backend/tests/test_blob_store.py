@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from PIL import Image
+
+import server
+
+
+def image_bytes(fmt, size=(64, 32), color=(200, 80, 40)):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format=fmt)
+    return out.getvalue()
+
+
+def test_blobs_are_keyed_by_content_and_written_once(tmp_path):
+    store = server.LocalBlobStore(tmp_path)
+    data = b"meal photo bytes"
+
+    async def main():
+        first = await store.put(data)
+        second = await store.put(data)
+        return first, second
+
+    first, second = asyncio.run(main())
+    key = hashlib.sha256(data).hexdigest()
+    assert first == second == key
+    assert (tmp_path / key[:2] / key[2:4] / key).read_bytes() == data
+    assert not list(tmp_path.rglob(".tmp-*"))
+
+
+def test_variants_live_beside_their_blob(tmp_path):
+    store = server.LocalBlobStore(tmp_path)
+
+    async def main():
+        key = await store.put(b"full")
+        await store.put_variant(key, "thumb", b"small")
+        return key, await store.get(key), await store.get(key, "thumb"), await store.get("0" * 64)
+
+    key, full, thumb, missing = asyncio.run(main())
+    assert (full, thumb, missing) == (b"full", b"small", None)
+    assert (tmp_path / key[:2] / key[2:4] / f"{key}.thumb").exists()
+
+
+@pytest.mark.parametrize("key", ["../etc/passwd", "ABC", "a" * 63])
+def test_keys_that_are_not_sha256_hex_are_refused(tmp_path, key):
+    with pytest.raises(ValueError):
+        asyncio.run(server.LocalBlobStore(tmp_path).get(key))
+
+
+@pytest.mark.parametrize("fmt, mime", [("JPEG", "image/jpeg"), ("PNG", "image/png"), ("WEBP", "image/webp")])
+def test_image_mime_is_sniffed_from_magic_bytes(fmt, mime):
+    assert server._image_mime(image_bytes(fmt)) == mime
+
+
+def test_unknown_bytes_are_octet_stream():
+    assert server._image_mime(b"not an image") == "application/octet-stream"
+
+
+def test_thumbnail_fits_the_box_and_keeps_aspect_ratio():
+    thumb = server._thumbnail_sync(image_bytes("PNG", size=(800, 400)), 200)
+    assert server._image_mime(thumb) == "image/jpeg"
+    with Image.open(io.BytesIO(thumb)) as img:
+        assert img.size == (200, 100)
+
+
+def test_undecodable_image_has_no_thumbnail():
+    assert server._thumbnail_sync(b"\xff\xd8\xff truncated", 200) is None
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+
+
+def chunked_request(*chunks):
+    """A POST without Content-Length whose body arrives in `chunks`."""
+    messages = [
+        {"type": "http.request", "body": c, "more_body": i < len(chunks) - 1}
+        for i, c in enumerate(chunks)
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": [], "query_string": b""}
+    return Request(scope, receive)
+
+
+def test_body_within_the_limit_is_read_whole():
+    request = server._body_limited(chunked_request(b"abc", b"def"), 6, "too big")
+    assert asyncio.run(request.body()) == b"abcdef"
+
+
+def test_body_over_the_limit_is_cut_off_mid_stream():
+    received = []
+
+    async def main():
+        request = server._body_limited(chunked_request(b"abcd", b"efgh", b"ijkl"), 6, "too big")
+        async for chunk in request.stream():
+            received.append(chunk)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main())
+    assert exc.value.status_code == 413
+    assert exc.value.detail == "too big"
+    # The first chunk fit; the one that crossed the limit was never handed on
+    assert received == [b"abcd"]
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+
+from .conftest import food_row
+
+
+def build(*names):
+    index = server.FoodNameIndex()
+    rows = [food_row(n) for n in names]
+    for row in rows:
+        index.upsert(row)
+    return index, rows
+
+
+def test_exact_lookup_is_case_insensitive():
+    index, (dal,) = build("Dal")
+    assert index.exact("  DAL ")["id"] == str(dal["id"])
+    assert index.lookup("dal")["name"] == "Dal"
+
+
+def test_substring_returns_shortest_containing_name():
+    index, _ = build("Chicken Curry Rice Bowl", "Chicken Curry", "Butter Chicken")
+    asyncio.run(index.rebuild())
+    assert index.lookup("curry")["name"] == "Chicken Curry"
+    assert index.lookup("chicken")["name"] == "Chicken Curry"
+
+
+def test_delta_names_are_searched_before_rebuild():
+    index, _ = build("Chicken Curry Rice Bowl")
+    asyncio.run(index.rebuild())
+    index.upsert(food_row("Chicken Curry"))
+    assert index.lookup("curry")["name"] == "Chicken Curry"
+
+
+def test_duplicate_names_keep_the_first_food():
+    index, (first,) = build("Dal")
+    index.upsert(food_row("dal"))
+    assert index.exact("dal")["id"] == str(first["id"])
+    assert len(index) == 1
+
+
+def test_rename_drops_the_old_name():
+    index, (row,) = build("Daal")
+    asyncio.run(index.rebuild())
+    index.upsert({**row, "name": "Dal"})
+    assert index.exact("daal") is None
+    assert index.lookup("daal") is None
+    assert index.exact("dal")["id"] == str(row["id"])
+
+
+def test_removed_foods_are_skipped_in_the_packed_blob():
+    index, (short, long) = build("Curry", "Chicken Curry")
+    asyncio.run(index.rebuild())
+    index.remove(str(short["id"]))
+    assert index.lookup("curry")["id"] == str(long["id"])
+
+
+def test_empty_term_matches_nothing():
+    index, _ = build("Dal")
+    assert index.lookup("   ") is None
+
+
+class FoodsTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self.since = []
+
+    async def fetch(self, sql, *args):
+        if args:
+            self.since.append(args[0])
+            return [r for r in self.rows if r["updated_at"] >= args[0]]
+        return list(self.rows)
+
+
+def test_refresh_applies_rows_changed_since_the_watermark():
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    dal = food_row("Dal", updated_at=t0)
+    table = FoodsTable([dal])
+    index = server.FoodNameIndex()
+    assert asyncio.run(index.refresh(table)) == 1
+    assert index.ready
+
+    table.rows = [dal, food_row("Chicken Curry", updated_at=t0 + timedelta(minutes=5))]
+    assert asyncio.run(index.refresh(table)) == 2
+    # Re-reads a minute before the watermark so late-committing writers aren't missed
+    assert table.since == [t0 - timedelta(seconds=60)]
+    assert index.lookup("curry")["name"] == "Chicken Curry"
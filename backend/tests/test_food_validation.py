@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+import httpx
+import openai
+import pytest
+
+import server
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stand-in validation model; set `batch_error` to make the batch call raise."""
+    state = {"calls": [], "batch_error": None}
+
+    async def batch(queries):
+        state["calls"].append(("batch", len(queries)))
+        if state["batch_error"] is not None:
+            raise state["batch_error"]
+        # Answers only the first name, as a model that stops early would
+        return {server._estimate_cache_key(queries[0]): server._estimate_from_json({"is_food": True})}
+
+    async def one(query):
+        state["calls"].append(("one", query))
+        return server._estimate_from_json({"is_food": True, "reason": "single"})
+
+    monkeypatch.setattr(server, "_ai_validate_foods_batch", batch)
+    monkeypatch.setattr(server, "_ai_validate_food", one)
+    monkeypatch.setattr(server, "openai_client", object())
+    monkeypatch.setattr(server, "pg_pool", None)
+    monkeypatch.setattr(server, "FOOD_VALIDATION_BATCH_SIZE", 10)
+    server._estimate_lru.clear()
+    yield state
+    server._estimate_lru.clear()
+
+
+def validate(*names):
+    return asyncio.run(server._validate_foods_concurrently(list(names)))
+
+
+def test_names_the_batch_left_out_are_asked_one_by_one(model):
+    results = validate("poha", "upma", "vada")
+    assert model["calls"] == [("batch", 3), ("one", "upma"), ("one", "vada")]
+    assert [r["reason"] for r in results] == ["", "single", "single"]
+
+
+def test_malformed_batch_answer_falls_back_per_item(model):
+    model["batch_error"] = json.JSONDecodeError("Expecting value", "", 0)
+    results = validate("poha", "upma")
+    assert model["calls"] == [("batch", 2), ("one", "poha"), ("one", "upma")]
+    assert all(r["reason"] == "single" for r in results)
+
+
+@pytest.mark.parametrize("error", [
+    openai.RateLimitError("slow down", response=httpx.Response(429, request=httpx.Request("POST", "http://x")), body=None),
+    openai.APITimeoutError(request=httpx.Request("POST", "http://x")),
+])
+def test_upstream_failure_resolves_the_chunk_to_defaults_without_fanning_out(model, error):
+    model["batch_error"] = error
+    results = validate("poha", "upma")
+    assert model["calls"] == [("batch", 2)]
+    assert all(r["reason"] == "Error during validation" for r in results)
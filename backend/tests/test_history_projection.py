@@ -0,0 +1,90 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def test_views_only_use_known_fields():
+    for fields in server._HISTORY_VIEWS.values():
+        assert set(fields) <= set(server._HISTORY_FIELDS)
+
+
+def test_view_resolution():
+    assert server._history_fields("summary", None) == server._HISTORY_VIEWS["summary"]
+    assert server._history_fields("full", "") == server._HISTORY_VIEWS["full"]
+
+
+def test_fields_win_over_view_and_are_deduplicated_in_order():
+    assert server._history_fields("summary", " foods,timestamp ,foods") == ("foods", "timestamp")
+
+
+@pytest.mark.parametrize(
+    "view, fields",
+    [("summary", "foods,password"), ("summary", " , "), ("compact", None)],
+)
+def test_bad_projection_is_a_400(view, fields):
+    with pytest.raises(HTTPException) as exc:
+        server._history_fields(view, fields)
+    assert exc.value.status_code == 400
+
+
+def test_projected_meal_matches_full_formatting():
+    meal_id, sha = uuid.uuid4(), "ab" * 32
+    record = {
+        "id": meal_id,
+        "foods": json.dumps([{"name": "Dal"}]),
+        "image_sha256": sha,
+        "total_calories": 210.0,
+    }
+    out = server._history_meal(record, ("id", "foods", "thumbnail_url", "total_calories", "micros"))
+    assert out == {
+        "id": str(meal_id),
+        "foods": [{"name": "Dal"}],
+        "thumbnail_url": f"/api/meals/images/{sha}?variant=thumb",
+        "total_calories": 210.0,
+    }
+
+
+def test_image_urls_are_omitted_without_a_blob():
+    out = server._history_meal({"image_sha256": None}, ("image_url", "image_sha256"))
+    assert out == {}
+
+
+class MealsTable:
+    """Fake pool/connection recording the history query's SELECT list."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.sql = []
+
+    def acquire(self):
+        table = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return table
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+    async def fetch(self, sql, *args):
+        self.sql.append(" ".join(sql.split()))
+        return self.rows
+
+
+def test_summary_view_reads_only_its_columns(monkeypatch):
+    uid = str(uuid.uuid4())
+    table = MealsTable([{"id": uuid.uuid4(), "meal_type": "lunch", "timestamp": "t", "total_calories": 1.0,
+                         "total_protein": 2.0, "total_carbs": 3.0, "total_fat": 4.0}])
+    monkeypatch.setattr(server, "pg_pool", table)
+    out = asyncio.run(server.get_meal_history(uid, view="summary", uid=uid))
+    assert out["count"] == 1
+    assert set(out["meals"][0]) == set(server._HISTORY_VIEWS["summary"])
+    (sql,) = table.sql
+    assert sql.startswith("SELECT id, meal_type, timestamp, total_calories, total_protein, total_carbs, total_fat FROM meals")
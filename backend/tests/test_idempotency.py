@@ -0,0 +1,95 @@
+import asyncio
+import json
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+import server
+
+UID = str(uuid.uuid4())
+
+
+class KeyTable:
+    """Just enough of a connection for _idempotent: one idempotency_keys table in a dict."""
+
+    def __init__(self):
+        self.rows = {}
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetchval(self, sql, user_id, key, route, request_hash, ttl):
+        assert sql.strip().startswith("INSERT INTO idempotency_keys")
+        if (user_id, key) in self.rows:
+            return None
+        self.rows[(user_id, key)] = {"route": route, "request_hash": request_hash, "status_code": None, "response": None}
+        return True
+
+    async def fetchrow(self, sql, user_id, key):
+        return self.rows.get((user_id, key))
+
+    async def execute(self, sql, user_id, key, response):
+        self.rows[(user_id, key)].update(status_code=200, response=response)
+
+
+def run(conn, key, route, payload, result):
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return result
+
+    return asyncio.run(server._idempotent(conn, UID, key, route, payload, work)), calls
+
+
+def test_request_hash_ignores_key_order_and_encodes_models():
+    meal = server.MealLogCreate(user_id=UID, foods=[], meal_type="lunch", logging_method="voice")
+    assert server._idempotency_hash({"a": 1, "b": [2]}) == server._idempotency_hash({"b": [2], "a": 1})
+    assert server._idempotency_hash(meal) == server._idempotency_hash(json.loads(meal.model_dump_json()))
+    assert server._idempotency_hash({"a": 1}) != server._idempotency_hash({"a": 2})
+
+
+def test_without_a_key_work_just_runs():
+    conn = KeyTable()
+    result, calls = run(conn, None, "meals.log", {"a": 1}, {"id": 1})
+    assert (result, calls, conn.rows) == ({"id": 1}, [1], {})
+
+
+def test_retry_with_the_same_key_replays_the_stored_response():
+    conn = KeyTable()
+    first, calls = run(conn, "k1", "meals.log", {"a": 1}, {"id": 1})
+    assert (first, calls) == ({"id": 1}, [1])
+
+    replay, calls = run(conn, "k1", "meals.log", {"a": 1}, {"id": 2})
+    assert calls == []
+    assert isinstance(replay, JSONResponse)
+    assert json.loads(replay.body) == {"id": 1}
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.parametrize("route, payload", [("meals.log", {"a": 2}), ("meals.pending.finalize", {"a": 1})])
+def test_reusing_a_key_for_a_different_request_is_a_422(route, payload):
+    conn = KeyTable()
+    run(conn, "k1", "meals.log", {"a": 1}, {"id": 1})
+    with pytest.raises(HTTPException) as exc:
+        run(conn, "k1", route, payload, {"id": 2})
+    assert exc.value.status_code == 422
+
+
+def test_a_key_still_in_progress_is_a_409_with_retry_after():
+    conn = KeyTable()
+    asyncio.run(conn.fetchval("INSERT INTO idempotency_keys", server._uuid(UID), "k1", "meals.log", "h", 0))
+    with pytest.raises(HTTPException) as exc:
+        run(conn, "k1", "meals.log", {"a": 1}, {"id": 1})
+    assert exc.value.status_code == 409
+    assert exc.value.headers["Retry-After"] == "1"
+
+
+def test_overlong_key_is_a_400():
+    with pytest.raises(HTTPException) as exc:
+        run(KeyTable(), "k" * 256, "meals.log", {}, {})
+    assert exc.value.status_code == 400
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def bulkhead(total=1, limits=None, max_queue=None, queue_timeout=None):
+    return server.LLMBulkhead(
+        total=total,
+        limits=limits or {},
+        max_queue=max_queue or {},
+        queue_timeout=queue_timeout or {},
+    )
+
+
+def test_free_slot_is_taken_without_waiting():
+    async def main():
+        b = bulkhead(total=2)
+        assert await b.acquire("interactive") == 0.0
+        assert b.stats["interactive"]["admitted"] == 1
+        b.release("interactive")
+
+    asyncio.run(main())
+
+
+def test_unknown_class_is_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(bulkhead().acquire("batch"))
+
+
+def test_full_queue_sheds_with_retry_after():
+    async def main():
+        b = bulkhead(total=1, max_queue={"recipe": 0})
+        await b.acquire("recipe")
+        with pytest.raises(HTTPException) as exc:
+            await b.acquire("recipe")
+        assert exc.value.status_code == 503
+        assert int(exc.value.headers["Retry-After"]) >= 1
+        assert b.stats["recipe"]["rejected_queue_full"] == 1
+
+    asyncio.run(main())
+
+
+def test_queue_timeout_sheds_and_leaves_the_queue():
+    async def main():
+        b = bulkhead(total=1, queue_timeout={"validation": 0.01})
+        await b.acquire("interactive")
+        with pytest.raises(HTTPException) as exc:
+            await b.acquire("validation")
+        assert exc.value.status_code == 503
+        assert b.stats["validation"]["rejected_timeout"] == 1
+        assert not b._waiters["validation"]
+
+    asyncio.run(main())
+
+
+def test_freed_slot_goes_to_the_highest_priority_waiter():
+    async def main():
+        b = bulkhead(total=1)
+        await b.acquire("interactive")
+        order = []
+
+        async def wait(cls):
+            await b.acquire(cls)
+            order.append(cls)
+
+        recipe = asyncio.create_task(wait("recipe"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(wait("interactive"))
+        await asyncio.sleep(0)
+
+        b.release("interactive")
+        await interactive
+        assert order == ["interactive"]
+        assert not recipe.done()
+
+        b.release("interactive")
+        await recipe
+        assert order == ["interactive", "recipe"]
+
+    asyncio.run(main())
+
+
+def test_class_cap_applies_below_the_global_limit():
+    async def main():
+        b = bulkhead(total=3, limits={"recipe": 1}, queue_timeout={"recipe": 0.01})
+        await b.acquire("recipe")
+        with pytest.raises(HTTPException):
+            await b.acquire("recipe")
+        assert await b.acquire("interactive") == 0.0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    async def main():
+        b = bulkhead(total=1)
+        await b.acquire("interactive")
+        waiter = asyncio.create_task(b.acquire("validation"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not b._waiters["validation"]
+        b.release("interactive")
+        assert sum(b._running.values()) == 0
+
+    asyncio.run(main())
+
+
+def test_slot_releases_on_error():
+    async def main():
+        b = bulkhead(total=1)
+        with pytest.raises(RuntimeError):
+            async with b.slot("recipe"):
+                raise RuntimeError("boom")
+        assert b._running["recipe"] == 0
+
+    asyncio.run(main())
+
+
+def test_class_settings_parse_from_env_strings():
+    assert server._parse_class_setting("interactive=12, recipe=4,,bogus,validation=", int) == {
+        "interactive": 12,
+        "recipe": 4,
+    }
+    assert server._parse_class_setting("recipe=2.5", float) == {"recipe": 2.5}
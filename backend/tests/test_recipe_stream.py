@@ -0,0 +1,31 @@
+import server
+
+
+RECIPE = (
+    '{"title": "Dal Tadka", "ingredients": [{"name": "toor dal", "qty": "1 cup"}, "salt"],'
+    ' "steps": ["Rinse, then boil", "Say \\"done\\" {when} soft"], "servings": 2}'
+)
+
+
+def test_sections_are_emitted_as_soon_as_they_close():
+    scanner = server.JsonSectionScanner()
+    assert scanner.feed('{"title": "Dal Tadka", "ingredients": [{"name"') == [("title", "Dal Tadka")]
+    assert scanner.feed(': "toor dal"}], "serv') == [("ingredients", [{"name": "toor dal"}])]
+    assert scanner.feed('ings": 2}') == [("servings", 2)]
+
+
+def test_one_character_at_a_time_matches_a_full_parse():
+    scanner = server.JsonSectionScanner()
+    pairs = [pair for ch in RECIPE for pair in scanner.feed(ch)]
+    assert dict(pairs) == {
+        "title": "Dal Tadka",
+        "ingredients": [{"name": "toor dal", "qty": "1 cup"}, "salt"],
+        "steps": ["Rinse, then boil", 'Say "done" {when} soft'],
+        "servings": 2,
+    }
+    assert [k for k, _ in pairs] == ["title", "ingredients", "steps", "servings"]
+
+
+def test_malformed_section_is_skipped_without_losing_the_rest():
+    scanner = server.JsonSectionScanner()
+    assert scanner.feed('{"title": Dal, "servings": 2}') == [("servings", 2)]
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    calls = []
+
+    async def main():
+        flight = server.SingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            calls.append(1)
+            await release.wait()
+            return {"ok": True}
+
+        waiters = [asyncio.ensure_future(flight.do("k", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flight.snapshot() == {"calls": 1, "deduplicated": 2, "in_flight": 1}
+        release.set()
+        results = await asyncio.gather(*waiters)
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert calls == [1]
+    assert all(r is results[0] for r in results)
+    assert flight.snapshot()["in_flight"] == 0
+
+
+def test_finished_key_runs_again():
+    async def main():
+        flight = server.SingleFlight()
+        first = await flight.do("k", lambda: asyncio.sleep(0, result=1))
+        second = await flight.do("k", lambda: asyncio.sleep(0, result=2))
+        return first, second, flight.stats["calls"]
+
+    assert asyncio.run(main()) == (1, 2, 2)
+
+
+def test_errors_reach_every_waiter():
+    async def main():
+        flight = server.SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        return await asyncio.gather(flight.do("k", fn), flight.do("k", fn), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [str(r) for r in results] == ["upstream down", "upstream down"]
+
+
+def test_a_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def main():
+        flight = server.SingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "done"
+
+        leaving = asyncio.ensure_future(flight.do("k", fn))
+        staying = asyncio.ensure_future(flight.do("k", fn))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        release.set()
+        return await staying
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,71 @@
+import server
+
+
+def parsed(transcript):
+    items = server._local_parse_voice_meal(transcript)
+    return None if items is None else [(i.name, i.quantity_grams) for i in items]
+
+
+def test_counts_use_piece_weights(catalog):
+    assert parsed("2 rotis and dal") == [("Roti", 80.0), ("Dal", 150.0)]
+
+
+def test_lead_in_and_meal_trailer_are_stripped(catalog):
+    assert parsed("I had 3 idlis and a cup of curd for breakfast") == [("Idli", 120.0), ("Curd", 240.0)]
+
+
+def test_household_units(catalog):
+    assert parsed("one bowl of rice with sambar") == [("Rice", 150.0), ("Sambar", 150.0)]
+    assert parsed("half a bowl of dal") == [("Dal", 75.0)]
+
+
+def test_mass_units_are_taken_literally(catalog):
+    assert parsed("200 g paneer butter masala") == [("Paneer Butter Masala", 200.0)]
+
+
+def test_size_words_scale_the_portion(catalog):
+    assert parsed("2 large rotis") == [("Roti", 120.0)]
+
+
+def test_number_phrases_and_hard_separators(catalog):
+    assert parsed("a couple of eggs, curd.") == [("Egg", 100.0), ("Curd", 150.0)]
+
+
+def test_catalog_names_containing_and_stay_whole(catalog):
+    assert parsed("bread and butter") == [("Bread and Butter", 150.0)]
+
+
+def test_unknown_food_falls_back_to_llm(catalog):
+    assert parsed("pizza and dal") is None
+
+
+def test_count_without_piece_weight_falls_back_to_llm(catalog):
+    assert parsed("3 mangoes") is None
+
+
+def test_learned_portion_beats_default(catalog):
+    dal = catalog.exact("dal")
+    server.food_portion_table._grams[(dal["id"], "serving")] = (220.0, server.FOOD_PORTION_MIN_SAMPLES)
+    assert parsed("dal") == [("Dal", 220.0)]
+
+
+def test_learned_portion_needs_min_samples(catalog):
+    dal = catalog.exact("dal")
+    server.food_portion_table._grams[(dal["id"], "serving")] = (220.0, server.FOOD_PORTION_MIN_SAMPLES - 1)
+    assert parsed("dal") == [("Dal", 150.0)]
+
+
+def test_long_transcripts_go_to_llm(catalog):
+    assert parsed(" ".join(["dal"] * (server._VOICE_LOCAL_MAX_WORDS + 1))) is None
+
+
+def test_disabled_without_a_ready_index(catalog):
+    catalog.ready = False
+    assert parsed("2 rotis") is None
+
+
+def test_segment_confidence(catalog):
+    _, sure = server._local_parse_segment("100 g rice")
+    _, guessed = server._local_parse_segment("rice")
+    assert sure == 1.0
+    assert guessed < sure
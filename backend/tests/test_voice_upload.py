@@ -0,0 +1,55 @@
+import io
+import struct
+import tempfile
+import wave
+
+import pytest
+
+import server
+
+
+def wav(seconds, rate=8000):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\0\0" * int(seconds * rate))
+    return buf.getvalue()
+
+
+def box(kind, payload):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def m4a(seconds, timescale=1000, version=0):
+    if version == 1:
+        mvhd = b"\x01\0\0\0" + b"\0" * 16 + struct.pack(">IQ", timescale, int(seconds * timescale))
+    else:
+        mvhd = b"\0\0\0\0" + b"\0" * 8 + struct.pack(">II", timescale, int(seconds * timescale))
+    # Media data ahead of moov, as phone recorders write it
+    return box(b"ftyp", b"M4A \0\0\0\0") + box(b"mdat", b"\0" * 64) + box(b"moov", box(b"mvhd", mvhd + b"\0" * 80))
+
+
+@pytest.mark.parametrize("data, expected", [
+    (wav(1.5), 1.5),
+    (m4a(42.5), 42.5),
+    (m4a(130, version=1), 130.0),
+])
+def test_duration_is_read_from_the_container_header(data, expected):
+    f = io.BytesIO(data)
+    assert server._audio_duration_seconds(f, len(data)) == pytest.approx(expected)
+    assert f.tell() == 0
+
+
+@pytest.mark.parametrize("data", [b"", b"OggS" + b"\0" * 40, m4a(10)[:30]])
+def test_unknown_or_truncated_audio_has_no_duration(data):
+    assert server._audio_duration_seconds(io.BytesIO(data), len(data)) is None
+
+
+def test_spool_residency_is_read_off_the_file():
+    with tempfile.SpooledTemporaryFile(max_size=16) as f:
+        f.write(b"x" * 10)
+        assert server._spool_residency(f) == (False, 10)
+        f.write(b"x" * 10)
+        assert server._spool_residency(f) == (True, 0)
@@ -455,7 +455,9 @@ export default function AnalyticsScreen() {
       if (timeRange === 'month') days = 30;
       else if (timeRange === 'year') days = 365;
       
-      const history = await mealApi.getHistory(user.id, days);
+      const history = await mealApi.getHistory(user.id, days, {
+        fields: ['meal_type', 'foods', 'timestamp', 'total_calories', 'total_protein', 'total_carbs', 'total_fat', 'micros'],
+      });
       
       processWeeklyData(history.meals);
       processMacroDistribution(history.meals);
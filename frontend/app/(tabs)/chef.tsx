@@ -132,7 +132,7 @@ Format response as JSON with: name, description, prepTime, servings, calories, p
     setLoading(true);
     try {
       // Get today's nutrition data to identify gaps
-      const todayStats = await mealApi.getHistory(user?.id || '', 1);
+      const todayStats = await mealApi.getHistory(user?.id || '', 1, { view: 'summary' });
       const gaps = identifyNutritionalGaps(todayStats.meals[0]);
       
       const prompt = createChefPrompt({
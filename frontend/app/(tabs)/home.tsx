@@ -14,6 +14,7 @@ import {
 import { Colors } from '../../constants/Colors';
 import { useUser } from '../../context/UserContext';
 import { mealApi } from '../../utils/api';
+import { useMealQueueFlush } from '../../utils/mealQueue';
 import { Ionicons } from '@expo/vector-icons';
 import { format } from 'date-fns';
 import { BarChart, PieChart } from 'react-native-gifted-charts';
@@ -67,7 +68,7 @@ export default function HomeScreen() {
   const fetchWeeklyData = React.useCallback(async () => {
     if (!user) return;
     try {
-      const history = await mealApi.getHistory(user.id, 7);
+      const history = await mealApi.getHistory(user.id, 7, { view: 'summary' });
       const dayTotals: any = {};
       history.meals.forEach((meal: any) => {
         const day = format(new Date(meal.timestamp), 'EEE');
@@ -99,6 +100,12 @@ export default function HomeScreen() {
     }
   }, [user, fetchStats, fetchWeeklyData]);
 
+  // Meals saved offline are sent on launch and on return to the foreground
+  useMealQueueFlush(user?.id, () => {
+    fetchStats();
+    fetchWeeklyData();
+  });
+
   useEffect(() => {
     Animated.parallel([
       Animated.spring(bounceAnim, {
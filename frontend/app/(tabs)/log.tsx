@@ -16,10 +16,12 @@ import {
 import { Colors } from '../../constants/Colors';
 import { useUser } from '../../context/UserContext';
 import { mealApi } from '../../utils/api';
+import { enqueueMeal, isOfflineError } from '../../utils/mealQueue';
 import { Ionicons } from '@expo/vector-icons';
 import { useRouter } from 'expo-router';
 import PageHeader from '../../components/PageHeader';
 import * as Haptics from 'expo-haptics';
+import * as Crypto from 'expo-crypto';
 import * as ImagePicker from 'expo-image-picker';
 import { Audio } from 'expo-av';
 
@@ -31,6 +33,8 @@ export default function LogScreen() {
   const router = useRouter();
   const { user } = useUser();
   const searchInputRef = useRef<TextInput>(null);
+  // One key per draft meal, kept across save retries so a timed-out save isn't logged twice
+  const saveKeyRef = useRef<string | null>(null);
   const ENABLE_CAMERA_LOGGING = false;
   const [mealType, setMealType] = useState('breakfast');
   const [logMethod, setLogMethod] = useState<'photo' | 'manual' | null>(null);
@@ -247,6 +251,11 @@ export default function LogScreen() {
     setSelectedFoods(selectedFoods.filter((_, i) => i !== index));
   };
 
+  // Editing the draft makes it a different request, so it needs a fresh key
+  useEffect(() => {
+    saveKeyRef.current = null;
+  }, [selectedFoods, mealType, logMethod]);
+
   const saveMeal = async () => {
     if (selectedFoods.length === 0) {
       Alert.alert('No Foods', 'Please add at least one food item');
@@ -256,13 +265,23 @@ export default function LogScreen() {
     if (!user) return;
 
     setLoading(true);
+    saveKeyRef.current ??= Crypto.randomUUID();
+    const meal = {
+      user_id: user.id,
+      meal_type: mealType,
+      foods: selectedFoods,
+      logging_method: logMethod || 'manual',
+    };
     try {
-      await mealApi.logMeal({
-        user_id: user.id,
-        meal_type: mealType,
-        foods: selectedFoods,
-        logging_method: logMethod || 'manual',
-      });
+      try {
+        await mealApi.logMeal(meal, saveKeyRef.current);
+      } catch (error) {
+        if (!isOfflineError(error)) throw error;
+        // Logged with the next bulk flush; the save key doubles as the queue entry id
+        await enqueueMeal(user.id, meal, saveKeyRef.current);
+        Alert.alert('Saved Offline', "We'll log this meal as soon as you're back online");
+      }
+      saveKeyRef.current = null;
 
       const xp = (selectedFoods.length * 10) + 10;
       setEarnedXp(xp);
@@ -114,7 +114,7 @@ export default function CameraScreen() {
         return;
       }
 
-      const analysis = await mealApi.logPhoto(photo.base64, user.id);
+      const analysis = await mealApi.logPhotoFile(photo.uri, user.id);
 
       if (analysis.foods && analysis.foods.length > 0) {
         Alert.alert(
@@ -162,7 +162,9 @@ export default function WeeklyWrapScreen() {
   const fetchWeeklyStats = useCallback(async () => {
     if (!user) return;
     try {
-      const history = await mealApi.getHistory(user.id, 7);
+      const history = await mealApi.getHistory(user.id, 7, {
+        fields: ['meal_type', 'foods', 'total_calories', 'total_protein', 'total_carbs', 'total_fat'],
+      });
       
       let totalCalories = 0;
       let totalProtein = 0;
@@ -1,5 +1,6 @@
 import axios, { AxiosHeaders } from 'axios';
 import Constants from 'expo-constants';
+import * as Crypto from 'expo-crypto';
 import { router } from 'expo-router';
 import { supabase } from './supabase';
 
@@ -175,14 +176,55 @@ export const mealApi = {
     });
     return response.data;
   },
-  logMeal: async (mealData: any) => {
-    const response = await api.post('/meals/log', mealData);
+  logPhotoFile: async (imageUri: string, userId: string) => {
+    // Binary upload: avoids base64 inflation and JSON parsing of large photos
+    const form = new FormData();
+    form.append('user_id', userId);
+    form.append('image', {
+      uri: imageUri,
+      name: 'meal.jpg',
+      type: 'image/jpeg',
+    } as any);
+
+    const response = await api.post('/meals/log-photo/upload', form, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+      timeout: 60000,
+    });
     return response.data;
   },
-  getHistory: async (userId: string, days: number = 7) => {
+  // Reuse the same idempotencyKey when retrying a save so the server doesn't log it twice
+  logMeal: async (mealData: any, idempotencyKey: string = Crypto.randomUUID()) => {
+    const response = await api.post('/meals/log', mealData, {
+      headers: { 'Idempotency-Key': idempotencyKey },
+    });
+    return response.data;
+  },
+  // Push meals queued while offline; the response has one result per meal, in order.
+  // Each meal's client_id is its idempotency key, so re-sending one is replayed, not logged twice.
+  logMealsBulk: async (userId: string, meals: any[]) => {
+    const response = await api.post('/meals/log/bulk', { user_id: userId, meals }, {
+      timeout: 60000,
+    });
+    return response.data;
+  },
+  // view 'summary' returns only id, meal_type, timestamp and totals; fields picks exact columns
+  getHistory: async (
+    userId: string,
+    days: number = 7,
+    projection: { view?: 'summary' | 'full'; fields?: string[] } = {},
+  ) => {
     // Get timezone offset in minutes (e.g., IST = 330, EST = -300)
     const timezoneOffset = -new Date().getTimezoneOffset();
-    const response = await api.get(`/meals/history/${userId}?days=${days}&timezone_offset=${timezoneOffset}`);
+    const response = await api.get(`/meals/history/${userId}`, {
+      params: {
+        days,
+        timezone_offset: timezoneOffset,
+        view: projection.view,
+        fields: projection.fields?.join(','),
+      },
+    });
     return response.data;
   },
   getStats: async (userId: string, date?: string) => {
@@ -0,0 +1,109 @@
+import { useEffect, useRef } from 'react';
+import { AppState } from 'react-native';
+import AsyncStorage from '@react-native-async-storage/async-storage';
+import * as Crypto from 'expo-crypto';
+import { mealApi } from './api';
+
+// Meals saved while offline, flushed through /meals/log/bulk once the server is reachable again
+const QUEUE_KEY = 'ns_meal_queue';
+const FLUSH_BATCH_SIZE = 200; // server's MEALS_BULK_MAX_ITEMS
+
+type QueuedMeal = {
+  client_id: string;
+  user_id: string;
+  meal: any;
+};
+
+async function readQueue(): Promise<QueuedMeal[]> {
+  try {
+    const raw = await AsyncStorage.getItem(QUEUE_KEY);
+    return raw ? JSON.parse(raw) : [];
+  } catch {
+    return [];
+  }
+}
+
+async function writeQueue(queue: QueuedMeal[]) {
+  if (queue.length) {
+    await AsyncStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+  } else {
+    await AsyncStorage.removeItem(QUEUE_KEY);
+  }
+}
+
+// The request never got an HTTP response (no connection, DNS failure, timeout). A timed-out
+// save may still have been committed; queueing it is safe because the flush reuses its key.
+export function isOfflineError(error: any) {
+  return !!error && !error.response && (error.code === 'ERR_NETWORK' || error.code === 'ECONNABORTED');
+}
+
+// Queue a meal for the next flush. Pass the Idempotency-Key of the /meals/log save that failed
+// as clientId: the server treats it as the same key, so a save that did land is not logged twice.
+// Re-queueing the same clientId is a no-op.
+export async function enqueueMeal(userId: string, meal: any, clientId: string = Crypto.randomUUID()) {
+  const queue = await readQueue();
+  if (queue.some((q) => q.client_id === clientId)) return;
+  queue.push({
+    client_id: clientId,
+    user_id: userId,
+    // Keep when it was eaten, not when it finally reached the server
+    meal: { ...meal, client_id: clientId, timestamp: meal.timestamp ?? new Date().toISOString() },
+  });
+  await writeQueue(queue);
+}
+
+let flushing: Promise<number> | null = null;
+
+// Send this user's queued meals in one bulk request; resolves to how many were logged
+export function flushMealQueue(userId: string): Promise<number> {
+  flushing ??= flush(userId).finally(() => {
+    flushing = null;
+  });
+  return flushing;
+}
+
+async function flush(userId: string): Promise<number> {
+  const batch = (await readQueue()).filter((q) => q.user_id === userId).slice(0, FLUSH_BATCH_SIZE);
+  if (!batch.length) return 0;
+
+  let response: any;
+  try {
+    response = await mealApi.logMealsBulk(userId, batch.map((q) => q.meal));
+  } catch (error) {
+    console.warn('[MealQueue] Flush failed, keeping queued meals:', error);
+    return 0;
+  }
+
+  // Created and replayed meals are on the server; invalid ones won't succeed on retry either.
+  // Only "in_progress" (the original save hasn't finished) stays queued for the next flush.
+  const done = new Set<string>();
+  for (const result of response.results ?? []) {
+    if (result.status === 'in_progress') continue;
+    if (result.status === 'invalid') {
+      console.warn('[MealQueue] Dropped invalid queued meal:', result.client_id, result.error);
+    }
+    done.add(result.client_id);
+  }
+  await writeQueue((await readQueue()).filter((q) => !done.has(q.client_id)));
+  return (response.created ?? 0) + (response.replayed ?? 0);
+}
+
+// Flush on mount and whenever the app comes back to the foreground
+export function useMealQueueFlush(userId: string | undefined, onFlushed?: () => void) {
+  const onFlushedRef = useRef(onFlushed);
+  onFlushedRef.current = onFlushed;
+
+  useEffect(() => {
+    if (!userId) return;
+    const run = () => {
+      flushMealQueue(userId).then((created) => {
+        if (created > 0) onFlushedRef.current?.();
+      });
+    };
+    run();
+    const subscription = AppState.addEventListener('change', (state) => {
+      if (state === 'active') run();
+    });
+    return () => subscription.remove();
+  }, [userId]);
+}